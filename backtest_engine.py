@@ -0,0 +1,226 @@
+# backtest_engine.py
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from batch_projections import fetch_basket
+from data_utils import format_projections
+from instrumentation import instrumented
+from market_data import get_history
+from pattern_index import get_pattern_index
+from price_series import date_format_for
+from projection_engine import FORWARD_LENGTH, MIN_MATCHES, PATTERN_LENGTHS, select_matches
+
+
+def walk_forward(closes, cutoffs, future_points=5, num_lines=5, pattern_lengths=PATTERN_LENGTHS,
+                 forward_length=FORWARD_LENGTH, min_matches=MIN_MATCHES, index=None):
+    """
+    Evaluates the pattern projection at many historical cut-offs of one oldest-first close
+    array, using a single pattern index for every cut-off.
+
+    A cut-off c means only closes[:c] were known, so its projection equals
+    project_closes(closes[:c]). Cut-offs are bar counts between 1 and len(closes).
+
+    Returns a dict of arrays:
+        'cutoffs'       (N,) the cut-offs
+        'match_indices' (N, num_lines) oldest-first bar index of each match, -1 when missing
+        'predicted'     (N, num_lines, steps + 1) projected paths, NaN when missing
+        'actual'        (N, future_points + 1) closes[c - 1:c + future_points], NaN past the end
+    with steps = min(future_points, forward_length).
+    """
+    closes = np.ascontiguousarray(closes, dtype=np.float64)
+    cutoffs = np.asarray(cutoffs, dtype=np.intp)
+    n = len(closes)
+    if len(cutoffs) and (cutoffs.min() < 1 or cutoffs.max() > n):
+        raise ValueError(f"Cut-offs must be between 1 and {n}")
+    index = get_pattern_index(closes) if index is None else index
+    steps = min(future_points, forward_length)
+
+    # In the newest-first sequence of closes[:c] every position is shifted by n - c
+    rows, slots, positions = [], [], []
+    for row, cutoff in enumerate(cutoffs.tolist()):
+        start = n - cutoff
+        occurrences = ((length, index.occurrences_at(start, length, min_position=start) - start)
+                       for length in pattern_lengths)
+        found, _ = select_matches(occurrences, min_matches=min_matches, limit=num_lines)
+        rows.extend([row] * len(found))
+        slots.extend(range(len(found)))
+        positions.extend(found.tolist())
+    rows = np.array(rows, dtype=np.intp)
+    slots = np.array(slots, dtype=np.intp)
+    positions = np.array(positions, dtype=np.intp)
+
+    match_indices = np.full((len(cutoffs), num_lines), -1, dtype=np.intp)
+    predicted = np.full((len(cutoffs), num_lines, steps + 1), np.nan)
+    if len(rows):
+        cut = cutoffs[rows][:, None]
+        current = positions[:, None] - np.arange(steps)[None, :]
+        # Newest-first bar q of closes[:c] is closes[c - 1 - q]; negative q wraps like iloc
+        cur = closes[cut - 1 - current % cut]
+        nxt = closes[cut - 1 - (current - 1) % cut]
+        factors = np.empty((len(rows), steps + 1))
+        factors[:, 0] = closes[cutoffs[rows] - 1]
+        # Same operations as forward_percentage_differences and compound_paths (percent, then
+        # back to a fraction) rather than nxt / cur, so every path equals project_closes bit for bit
+        pct = (nxt - cur) / cur * 100
+        factors[:, 1:] = 1 + pct / 100
+        predicted[rows, slots] = np.multiply.accumulate(factors, axis=1)
+        match_indices[rows, slots] = cutoffs[rows] - 1 - positions
+
+    actual_index = (cutoffs - 1)[:, None] + np.arange(future_points + 1)[None, :]
+    actual = np.where(actual_index < n, closes[np.minimum(actual_index, n - 1)], np.nan)
+
+    return {
+        'cutoffs': cutoffs,
+        'match_indices': match_indices,
+        'predicted': predicted,
+        'actual': actual,
+    }
+
+
+def walk_forward_offsets(symbol, interval, offsets, future_points=5, num_lines=5):
+    """
+    Loads a symbol's history once and runs walk_forward with one cut-off per offset
+    (offset 0 is the current prediction, offset 5 a prediction made 5 bars ago, ...).
+    Returns (history DataFrame, walk_forward result).
+    """
+    history = get_history(symbol, interval).sort_index()
+    closes = history['Close'].to_numpy(dtype=np.float64)
+    cutoffs = len(closes) - np.asarray(offsets, dtype=np.intp)
+    return history, walk_forward(closes, cutoffs, future_points=future_points, num_lines=num_lines)
+
+
+@instrumented("run_backtest_for_offsets")
+def run_backtest_for_offsets(symbol, interval, offsets, future_points=5, num_lines=5):
+    """
+    Simulate past predictions for several offsets from a single download and pattern index.
+    offset=0 means current prediction; offset=5 means simulate prediction 5 periods ago; etc.
+
+    Returns a list with one (predicted_lines, actual_line) pair per offset:
+        predicted_lines: list of lists of dicts for each predicted future (using the prediction algorithm).
+        actual_line: list of dicts for the actual future data from the full history.
+    """
+    df_full, result = walk_forward_offsets(symbol, interval, offsets, future_points=future_points,
+                                           num_lines=num_lines)
+    date_format = date_format_for(interval)
+    dates = df_full.index
+
+    backtests = []
+    for row, cutoff in enumerate(result['cutoffs']):
+        # Convert this cut-off's projections into the same lines the prediction function returns
+        found = result['match_indices'][row] >= 0
+        predicted = format_projections(dates[:cutoff], interval, result['match_indices'][row][found],
+                                       result['predicted'][row][found])
+        predicted_lines = [pred['data'] for pred in predicted]
+
+        # The actual future data starts at the last known bar
+        actual_dates = dates[cutoff - 1:cutoff + future_points]
+        actual_line = [{'date': idx.strftime(date_format), 'close': close}
+                       for idx, close in zip(actual_dates, result['actual'][row])]
+        backtests.append((predicted_lines, actual_line))
+    return backtests
+
+
+def run_backtest_for_interval(symbol, interval, offset, future_points=5, num_lines=5):
+    """
+    Simulate a past prediction by truncating the historical data by 'offset' periods.
+    offset=0 means current prediction; offset=5 means simulate prediction 5 periods ago; etc.
+
+    Returns:
+        predicted_lines: list of lists of dicts for each predicted future (using the prediction algorithm).
+        actual_line: list of dicts for the actual future data from the full history.
+    """
+    return run_backtest_for_offsets(symbol, interval, [offset], future_points, num_lines)[0]
+
+
+def score_walk_forward(result):
+    """
+    Scores every cut-off of a walk_forward result in one pass over its arrays.
+
+    Returns a dict of (N,) arrays, with errors in percent of the price at the cut-off:
+        'matches'   number of projection lines
+        'hit_rate'  share of lines whose final move has the same direction as the actual move
+        'mae'       mean absolute error of the projected paths against the actual path
+        'rmse'      root mean squared error of the projected paths
+        'spread'    range of the lines' final projected prices
+    Cut-offs without projections or without any future bars get NaN scores.
+    """
+    predicted = result['predicted']
+    steps = predicted.shape[2] - 1
+    actual = result['actual'][:, :steps + 1]
+    base = actual[:, :1]
+
+    # Compare each line with the actual path over the horizon that both cover
+    errors = (predicted[:, :, 1:] - actual[:, None, 1:]) / base[:, :, None] * 100
+    valid = ~np.isnan(errors)
+    counts = valid.sum(axis=(1, 2))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mae = np.where(valid, np.abs(errors), 0).sum(axis=(1, 2)) / counts
+        rmse = np.sqrt(np.where(valid, errors ** 2, 0).sum(axis=(1, 2)) / counts)
+
+    # Direction at the last step where the actual path is known
+    available = (~np.isnan(actual[:, 1:])).sum(axis=1)
+    last = np.maximum(available, 1)
+    rows = np.arange(len(actual))
+    actual_move = np.sign(actual[rows, last] - actual[:, 0])
+    predicted_move = np.sign(predicted[rows, :, last] - predicted[:, :, 0])
+    lines = ~np.isnan(predicted[:, :, 0])
+    matches = lines.sum(axis=1)
+    hits = (predicted_move == actual_move[:, None]) & lines
+    with np.errstate(invalid='ignore', divide='ignore'):
+        hit_rate = np.where(available > 0, hits.sum(axis=1) / matches, np.nan)
+
+    final = np.where(lines, predicted[:, :, -1], np.nan)
+    with np.errstate(invalid='ignore'), warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        spread = (np.nanmax(final, axis=1) - np.nanmin(final, axis=1)) / base[:, 0] * 100
+
+    return {
+        'matches': matches,
+        'hit_rate': hit_rate,
+        'mae': mae,
+        'rmse': rmse,
+        'spread': spread,
+    }
+
+
+SCORE_COLUMNS = ['symbol', 'interval', 'offset', 'matches', 'hit_rate', 'mae', 'rmse', 'spread']
+
+
+def score_frame(symbol, interval, offsets, result):
+    """Scores a walk_forward result run at 'offsets' as a table with SCORE_COLUMNS."""
+    frame = pd.DataFrame(score_walk_forward(result))
+    frame.insert(0, 'offset', offsets)
+    frame.insert(0, 'interval', interval)
+    frame.insert(0, 'symbol', symbol)
+    return frame
+
+
+def backtest_summary(symbols, intervals, offsets, future_points=5, num_lines=5):
+    """
+    Backtests every symbol and interval at the given offsets and returns one row per
+    (symbol, interval, offset) with the scores of score_walk_forward. Histories are fetched
+    concurrently; symbols without data are left out.
+    """
+    frames = []
+    offsets = np.asarray(offsets, dtype=np.intp)
+    for interval in intervals:
+        histories, _ = fetch_basket(symbols, interval)
+        for symbol, history in histories.items():
+            closes = history.sort_index()['Close'].to_numpy(dtype=np.float64)
+            usable = offsets[offsets < len(closes)]
+            result = walk_forward(closes, len(closes) - usable, future_points=future_points,
+                                  num_lines=num_lines)
+            frames.append(score_frame(symbol, interval, usable, result))
+    if not frames:
+        return pd.DataFrame(columns=SCORE_COLUMNS)
+    return pd.concat(frames, ignore_index=True)
+
+
+def aggregate_scores(summary, by=('symbol', 'interval')):
+    """Averages a backtest_summary table per group and counts the scored cut-offs."""
+    grouped = summary.groupby(list(by), sort=False)
+    aggregated = grouped[['hit_rate', 'mae', 'rmse', 'spread']].mean()
+    aggregated.insert(0, 'cutoffs', grouped['hit_rate'].count())
+    return aggregated.round(3).reset_index()
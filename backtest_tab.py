@@ -1,78 +1,42 @@
 import streamlit as st
-import yfinance as yf
-import pandas as pd
-import re
-from datetime import datetime, timedelta
 import plotly.graph_objects as go
-from data_utils import generate_future_projections_pattern
-
-def run_backtest_for_interval(symbol, interval, offset, future_points=5, num_lines=5):
-    """
-    Simulate a past prediction by truncating the historical data by 'offset' periods.
-    offset=0 means current prediction; offset=5 means simulate prediction 5 periods ago; etc.
-    
-    Returns:
-        predicted_lines: list of lists of dicts for each predicted future (using the prediction algorithm).
-        actual_line: list of dicts for the actual future data from the full history.
-    """
-    period = "1y" if interval == "1h" else "5y" if interval == "1d" else "max"
-    instrument = yf.Ticker(symbol)
-    df_full = instrument.history(period=period, interval=interval, auto_adjust=False)
-    df_full = df_full.sort_index()  # Ensure ascending order
-    
-    # Truncate data to simulate a prediction made in the past
-    if offset > 0:
-        df_truncated = df_full.iloc[:-offset]
-    else:
-        df_truncated = df_full
-
-    # Use the prediction function with our truncated data.
-    # Set num_lines to the desired number (e.g., 5) to show all predictions.
-    predicted = generate_future_projections_pattern(symbol, interval, future_points=future_points, 
-                                                    num_lines=num_lines, data_override=df_truncated)
-    # 'predicted' is a list of dictionaries (one per prediction line)
-    # Each dict contains a 'label' and 'data' (list of dicts for the future prices)
-    predicted_lines = [pred['data'] for pred in predicted]
-    
-    # Extract the actual future data from the full DataFrame:
-    last_time = df_truncated.index[-1]
-    df_future = df_full[df_full.index >= last_time].iloc[:future_points+1]
-    date_format = '%d-%b-%Y %H:%M' if interval=="1h" else '%d-%b-%Y'
-    actual_line = [{'date': idx.strftime(date_format), 'close': row['Close']} 
-                   for idx, row in df_future.iterrows()]
-    
-    return predicted_lines, actual_line
+from chart_utils import line_points, line_trace, merged_lines
+from backtest_engine import run_backtest_for_offsets, backtest_summary, aggregate_scores
+from instrumentation import instrumented
+from market_data import bar_seconds, last_bar_stamps
+from price_series import date_format_for
 
+@instrumented("plot_backtest_chart")
 def plot_backtest_chart(predicted_lines, actual_line, interval):
     """
     Plots an overlay chart with:
-      - Each predicted future line (white dashed step-lines)
+      - The predicted future lines (white dashed step-lines, merged into one trace)
       - The actual future data (blue dashed step-line)
     """
-    date_format = '%d-%b-%Y %H:%M' if interval=="1h" else '%d-%b-%Y'
+    date_format = date_format_for(interval)
     # Convert actual future data
-    actual_dates = [datetime.strptime(item['date'], date_format) for item in actual_line]
-    actual_prices = [item['close'] for item in actual_line]
+    actual_dates, actual_prices = line_points(actual_line, date_format)
     
     fig = go.Figure()
     
-    # Plot each prediction line
-    for i, predicted_line in enumerate(predicted_lines):
-        predicted_dates = [datetime.strptime(item['date'], date_format) for item in predicted_line]
-        predicted_prices = [item['close'] for item in predicted_line]
-        fig.add_trace(go.Scatter(
-            x=predicted_dates,
-            y=predicted_prices,
-            mode='lines',
+    # Plot the prediction lines as one trace, broken between lines
+    if predicted_lines:
+        predicted_dates, predicted_prices, labels = merged_lines(
+            [line_points(predicted_line, date_format) for predicted_line in predicted_lines],
+            [f'Predicted {i+1}' for i in range(len(predicted_lines))])
+        fig.add_trace(line_trace(
+            predicted_dates,
+            predicted_prices,
             line=dict(dash='dot', color='white'),
-            name=f'Predicted {i+1}'
+            text=labels,
+            hovertemplate="%{text}<br>%{x}: %{y:.2f}<extra></extra>",
+            name=f'Predicted ({len(predicted_lines)})'
         ))
         
     # Plot the actual future data
-    fig.add_trace(go.Scatter(
-        x=actual_dates,
-        y=actual_prices,
-        mode='lines',
+    fig.add_trace(line_trace(
+        actual_dates,
+        actual_prices,
         line=dict(dash='dash', color='blue'),
         name='Actual'
     ))
@@ -87,6 +51,25 @@ def plot_backtest_chart(predicted_lines, actual_line, interval):
     )
     return fig
 
+@st.cache_data(ttl=bar_seconds("1h"), show_spinner="Scoring backtests...")
+def cached_backtest_summary(symbols, intervals, offsets, last_bars, future_points=5, num_lines=5):
+    """
+    backtest_summary memoized across reruns; 'last_bars' (see market_data.last_bar_stamps)
+    only keys the memo, so a new bar of any scored interval rescores.
+    """
+    return backtest_summary(symbols, intervals, offsets, future_points, num_lines)
+
+def backtest_scores(symbols, intervals, offsets, future_points=5, num_lines=5):
+    """
+    Returns the memoized backtest_summary of the current bars. A summary missing symbols
+    whose history failed to load is not kept, so the next rerun tries them again.
+    """
+    last_bars = tuple(last_bar_stamps(symbols, interval) for interval in intervals)
+    summary = cached_backtest_summary(symbols, intervals, offsets, last_bars, future_points, num_lines)
+    if any(stamp is None for stamps in last_bars for _, stamp in stamps):
+        cached_backtest_summary.clear(symbols, intervals, offsets, last_bars, future_points, num_lines)
+    return summary
+
 def render_backtest_tab():
     st.header("Backtest Prediction Evaluation (1wk)")
     from stock_options import stock_options
@@ -98,11 +81,29 @@ def render_backtest_tab():
         offsets = [0, 5, 10]  # 0 = current, 5 = 5 periods ago, 10 = 10 periods ago
         for interval in intervals:
             st.subheader(f"Interval: {interval}")
-            for offset in offsets:
+            # One download and one pattern index serve every offset of this interval
+            try:
+                backtests = run_backtest_for_offsets(symbol, interval, offsets, future_points=5, num_lines=5)
+            except Exception as e:
+                st.error(f"Error in backtest for interval {interval}: {e}")
+                continue
+            for offset, (predicted_lines, actual_line) in zip(offsets, backtests):
                 st.markdown(f"**Prediction simulated {offset} periods ago:**")
                 try:
-                    predicted_lines, actual_line = run_backtest_for_interval(symbol, interval, offset, future_points=5, num_lines=5)
                     fig = plot_backtest_chart(predicted_lines, actual_line, interval)
                     st.plotly_chart(fig)
                 except Exception as e:
                     st.error(f"Error in backtest for offset {offset}: {e}")
+
+        # Score many past cut-offs at once instead of eyeballing the three charted offsets
+        st.subheader("Backtest accuracy (last 100 cut-offs)")
+        score_offsets = range(5, 105)
+        summary = backtest_scores([symbol], intervals, score_offsets, future_points=5, num_lines=5)
+        st.dataframe(aggregate_scores(summary))
+
+        if st.button("Score all predefined instruments"):
+            summary = backtest_scores(list(stock_options.values()), intervals, score_offsets,
+                                      future_points=5, num_lines=5)
+            names = {value: key for key, value in stock_options.items()}
+            summary['symbol'] = summary['symbol'].map(names)
+            st.dataframe(aggregate_scores(summary))
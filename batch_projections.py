@@ -0,0 +1,137 @@
+# batch_projections.py
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from market_data import get_history, get_market_data
+from price_series import PriceSeries, build_projections
+from projection_cache import get_projection_cache, projection_key
+from projection_engine import project_closes
+
+# Upper bound on concurrent downloads for one basket
+MAX_FETCH_WORKERS = 8
+# Seconds a basket waits for any one symbol before reporting it as timed out
+SYMBOL_TIMEOUT = 30
+
+_process_pool = None
+
+
+def _get_process_pool():
+    global _process_pool
+    if _process_pool is None:
+        # Workers are started by a forkserver: forking the multi-threaded Streamlit server could
+        # copy a lock another thread holds (logging, the data layer) and deadlock the worker
+        _process_pool = ProcessPoolExecutor(max_workers=os.cpu_count() or 1,
+                                            mp_context=multiprocessing.get_context("forkserver"))
+    return _process_pool
+
+
+def _collect(futures, deadline):
+    """Waits for {symbol: future} until 'deadline' and splits them into results and errors."""
+    results = {}
+    errors = {}
+    for symbol, future in futures.items():
+        try:
+            results[symbol] = future.result(timeout=max(deadline - time.monotonic(), 0))
+        except TimeoutError:
+            future.cancel()
+            errors[symbol] = "Timed out"
+        except Exception as exc:
+            errors[symbol] = str(exc) or type(exc).__name__
+    return results, errors
+
+
+def fetch_basket(symbols, interval, period=None, auto_adjust=False, max_workers=MAX_FETCH_WORKERS,
+                 timeout=SYMBOL_TIMEOUT):
+    """
+    Fetches the histories of several symbols concurrently through the shared data layer.
+    Returns ({symbol: DataFrame}, {symbol: error message}); empty histories count as errors.
+    """
+    deadline = time.monotonic() + timeout
+    # Download what is not cached yet in multi-ticker batches; the reads below then hit the store
+    try:
+        get_market_data().prefetch(symbols, interval, period)
+    except Exception:
+        pass
+    executor = ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(symbols))))
+    try:
+        futures = {symbol: executor.submit(get_history, symbol, interval, period, auto_adjust)
+                   for symbol in dict.fromkeys(symbols)}
+        frames, errors = _collect(futures, deadline)
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    for symbol in [symbol for symbol, frame in frames.items() if frame.empty]:
+        del frames[symbol]
+        errors[symbol] = "No data found"
+    return frames, errors
+
+
+def project_basket(symbols, interval, future_points=10, num_lines=5, max_workers=MAX_FETCH_WORKERS,
+                   timeout=SYMBOL_TIMEOUT, use_processes=True):
+    """
+    Fetches and projects a whole basket in parallel: downloads run on a bounded thread pool
+    and the pattern matching on a process pool (or inline with use_processes=False).
+
+    Returns ({symbol: {'history': DataFrame, 'series': PriceSeries, 'projections': [Projection]}},
+    {symbol: error message}).
+    Symbols that fail or exceed their timeout are reported in the errors and left out of the
+    results, so the rest of the basket is still usable.
+    """
+    frames, errors = fetch_basket(symbols, interval, max_workers=max_workers, timeout=timeout)
+    series = {symbol: PriceSeries.from_frame(frame) for symbol, frame in frames.items()}
+
+    # Results already in the projection cache (e.g. precomputed after the bar close) are reused;
+    # the key must match the one data_utils.cached_projection builds for the exact matcher
+    cache = get_projection_cache()
+    keys = {symbol: projection_key(symbol, interval, frame, "projection", future_points=future_points,
+                                   num_lines=num_lines, match_mode="exact")
+            for symbol, frame in frames.items()}
+    cached = {}
+    for symbol, key in keys.items():
+        result = cache.get(key)
+        if result is not None:
+            cached[symbol] = (result['match_indices'], result['paths'])
+    closes = {symbol: values.closes for symbol, values in series.items() if symbol not in cached}
+
+    matches = None
+    if use_processes and len(closes) > 1:
+        try:
+            pool = _get_process_pool()
+            deadline = time.monotonic() + timeout
+            futures = {symbol: pool.submit(project_closes, values, future_points, num_lines)
+                       for symbol, values in closes.items()}
+            matches, match_errors = _collect(futures, deadline)
+            if any(future.done() and not future.cancelled() and isinstance(future.exception(), BrokenProcessPool)
+                   for future in futures.values()):
+                raise BrokenProcessPool("A worker process of the pool died")
+            errors.update(match_errors)
+        except BrokenProcessPool:
+            # Recreate the pool next time and fall back to matching in this process
+            global _process_pool
+            _process_pool = None
+            matches = None
+    if matches is None:
+        matches = {}
+        for symbol, values in closes.items():
+            try:
+                matches[symbol] = project_closes(values, future_points, num_lines)
+            except Exception as exc:
+                errors[symbol] = str(exc) or type(exc).__name__
+    for symbol, (match_indices, paths) in matches.items():
+        cache.put(keys[symbol], {'match_indices': match_indices, 'paths': paths})
+    matches.update(cached)
+
+    results = {}
+    for symbol in frames:
+        if symbol not in matches:
+            continue
+        match_indices, paths = matches[symbol]
+        results[symbol] = {
+            'history': frames[symbol],
+            'series': series[symbol],
+            'projections': build_projections(series[symbol], interval, match_indices, paths),
+        }
+    return results, errors
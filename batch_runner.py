@@ -0,0 +1,147 @@
+# batch_runner.py
+"""
+Headless batch runner: computes projections and backtest scores for every configured
+instrument without Streamlit and writes them to Parquet/JSON.
+
+    python batch_runner.py --intervals 1wk 1d --workers 4 --output-dir results
+"""
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+from backtest_engine import SCORE_COLUMNS, score_frame, walk_forward
+from data_providers import configure_from_env
+from data_utils import format_projections
+from etf_config import all_symbols
+from market_data import get_history
+from pattern_index import get_pattern_index
+from projection_engine import project_closes
+
+DEFAULT_INTERVALS = ["1wk", "1d", "1h"]
+DEFAULT_OFFSETS = range(5, 105)
+
+
+def run_symbol(symbol, intervals, future_points=10, num_lines=5, offsets=DEFAULT_OFFSETS):
+    """
+    Projects and backtests one symbol for every interval.
+    Returns (projections, scores, errors): projections maps interval to the {'label', 'data'}
+    list, scores is a list of per-interval score tables and errors maps interval to a message.
+    """
+    # Worker processes apply DATA_PROVIDER themselves
+    configure_from_env()
+    projections, scores, errors = {}, [], {}
+    offsets = np.asarray(offsets, dtype=np.intp)
+    for interval in intervals:
+        try:
+            history = get_history(symbol, interval).sort_index()
+            if history.empty:
+                errors[interval] = "No data found"
+                continue
+            closes = history['Close'].to_numpy(dtype=np.float64)
+            index = get_pattern_index(closes)
+            match_indices, paths = project_closes(closes, future_points, num_lines, index=index)
+            projections[interval] = format_projections(history.index, interval, match_indices, paths)
+
+            usable = offsets[offsets < len(closes)]
+            result = walk_forward(closes, len(closes) - usable, future_points=future_points,
+                                  num_lines=num_lines, index=index)
+            scores.append(score_frame(symbol, interval, usable, result))
+        except Exception as exc:
+            errors[interval] = str(exc) or type(exc).__name__
+    return projections, scores, errors
+
+
+def projection_rows(projections):
+    """Flattens {symbol: {interval: [{'label', 'data'}]}} into one row per projected point."""
+    rows = []
+    for symbol, by_interval in projections.items():
+        for interval, lines in by_interval.items():
+            for line_number, line in enumerate(lines):
+                for step, point in enumerate(line['data']):
+                    rows.append({'symbol': symbol, 'interval': interval, 'line': line_number,
+                                 'label': line['label'], 'step': step, 'date': point['date'],
+                                 'close': float(point['close'])})
+    return pd.DataFrame(rows, columns=['symbol', 'interval', 'line', 'label', 'step', 'date', 'close'])
+
+
+def run_batch(symbols, intervals, future_points=10, num_lines=5, offsets=DEFAULT_OFFSETS, workers=None,
+              output_dir="results"):
+    """
+    Runs run_symbol for every symbol on a process pool and writes to output_dir:
+        projections.json / projections.parquet  projected lines per symbol and interval
+        backtest.parquet                        per-offset backtest scores
+        run.json                                parameters, timing and errors
+    Returns the run metadata.
+    """
+    started = time.monotonic()
+    projections, scores, errors = {}, [], {}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(run_symbol, symbol, intervals, future_points, num_lines, list(offsets)): symbol
+                   for symbol in symbols}
+        for future in as_completed(futures):
+            symbol = futures[future]
+            try:
+                symbol_projections, symbol_scores, symbol_errors = future.result()
+            except Exception as exc:
+                errors[symbol] = {interval: str(exc) or type(exc).__name__ for interval in intervals}
+                continue
+            if symbol_projections:
+                projections[symbol] = symbol_projections
+            scores.extend(symbol_scores)
+            if symbol_errors:
+                errors[symbol] = symbol_errors
+
+    os.makedirs(output_dir, exist_ok=True)
+    with open(os.path.join(output_dir, "projections.json"), "w") as f:
+        json.dump(projections, f, default=float)
+    projection_rows(projections).to_parquet(os.path.join(output_dir, "projections.parquet"), index=False)
+    backtest = pd.concat(scores, ignore_index=True) if scores else pd.DataFrame(columns=SCORE_COLUMNS)
+    backtest.to_parquet(os.path.join(output_dir, "backtest.parquet"), index=False)
+    metadata = {
+        'generated_at': datetime.now(timezone.utc).isoformat(),
+        'seconds': round(time.monotonic() - started, 3),
+        'symbols': len(symbols),
+        'intervals': list(intervals),
+        'future_points': future_points,
+        'num_lines': num_lines,
+        'offsets': [int(offset) for offset in offsets],
+        'errors': errors,
+    }
+    with open(os.path.join(output_dir, "run.json"), "w") as f:
+        json.dump(metadata, f, indent=2)
+    return metadata
+
+
+def load_projections(output_dir="results"):
+    """Reads the projections written by run_batch as {symbol: {interval: [{'label', 'data'}]}}."""
+    with open(os.path.join(output_dir, "projections.json")) as f:
+        return json.load(f)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Precompute projections and backtests for all instruments.")
+    parser.add_argument("--symbols", nargs="+", help="Symbols to run (default: stock_options and ETF_CONFIG)")
+    parser.add_argument("--intervals", nargs="+", default=DEFAULT_INTERVALS)
+    parser.add_argument("--future-points", type=int, default=10)
+    parser.add_argument("--num-lines", type=int, default=5)
+    parser.add_argument("--max-offset", type=int, default=104, help="Backtest cut-offs from 5 to this many bars ago")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--output-dir", default="results")
+    args = parser.parse_args(argv)
+    configure_from_env()
+
+    metadata = run_batch(args.symbols or all_symbols(), args.intervals, args.future_points, args.num_lines,
+                         range(5, args.max_offset + 1), args.workers, args.output_dir)
+    failed = sum(len(errors) for errors in metadata['errors'].values())
+    print(f"Processed {metadata['symbols']} symbols x {len(args.intervals)} intervals in "
+          f"{metadata['seconds']}s ({failed} failures), results in {args.output_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+# benchmark.py
+"""
+Offline benchmarks for the projection and backtest hot paths on synthetic yfinance-shaped
+histories. Each stage is timed in isolation and reported with throughput and peak memory.
+The projection cache, the pattern index cache and the incremental projection states are
+emptied before every run, so stages that go through them measure the full computation
+rather than cache hits.
+
+    python benchmark.py --sizes 1000 10000 100000 --intervals 1d 1h --json bench.json
+"""
+import argparse
+import json
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+from backtest_engine import run_backtest_for_interval, walk_forward
+from change_table import DEFAULT_HORIZONS, change_table, style_changes
+from data_utils import generate_future_projections_pattern, get_stock_data, prepare_table, print_difference_data
+from incremental_projection import clear_states
+from market_data import MarketData, set_market_data
+from ohlc_store import OHLCStore
+from projection_cache import ProjectionCache, get_projection_cache, set_projection_cache
+from pattern_index import PatternIndex, clear_pattern_indexes
+from projection_engine import find_matches, project_closes, up_down_sequence
+from projection_ensemble import match_returns, simulate_ensemble
+from similarity_search import find_similar_matches
+from synthetic_data import make_ohlc_frame
+
+DEFAULT_SIZES = [1_000, 10_000, 100_000, 1_000_000]
+DEFAULT_INTERVALS = ["1h", "1d", "1wk"]
+SYMBOL = "SYNTH"
+
+
+def _stages():
+    """
+    Returns (name, max_bars, setup) triples. setup(frame, interval) returns the callable to
+    time; max_bars skips sizes a stage is too slow for (None means no limit).
+    """
+    def updown(frame, interval):
+        closes = frame['Close'].to_numpy()
+        return lambda: up_down_sequence(closes)
+
+    def match_scan(frame, interval):
+        rev_sequence = up_down_sequence(frame['Close'].to_numpy())[::-1]
+        return lambda: find_matches(rev_sequence, limit=5)
+
+    def index_build(frame, interval):
+        closes = frame['Close'].to_numpy()
+        return lambda: PatternIndex.from_closes(closes)
+
+    def match_index(frame, interval):
+        closes = frame['Close'].to_numpy()
+        index = PatternIndex.from_closes(closes)
+        return lambda: find_matches(index.sequence, limit=5, index=index)
+
+    def project(frame, interval):
+        closes = frame['Close'].to_numpy()
+        return lambda: project_closes(closes, 10, 5)
+
+    def similar(metric):
+        def setup(frame, interval):
+            closes = frame['Close'].to_numpy()
+            return lambda: find_similar_matches(closes, metric=metric, limit=5)
+        return setup
+
+    def ensemble(method):
+        def setup(frame, interval):
+            closes = frame['Close'].to_numpy()
+            _, returns = match_returns(closes, 10)
+            if not len(returns):
+                returns = closes[1:11][None, :] / closes[:10][None, :] - 1
+            return lambda: simulate_ensemble(closes[-1], returns, 100_000, method=method, seed=0)
+        return setup
+
+    def generate(frame, interval):
+        return lambda: generate_future_projections_pattern(SYMBOL, interval, 10, 5, data_override=frame)
+
+    def difference_data(frame, interval):
+        reversed_frame = frame.iloc[::-1]
+        return lambda: print_difference_data(reversed_frame, 20, 8, 13)
+
+    def stock_data(frame, interval):
+        return lambda: get_stock_data(SYMBOL, interval, data_override=frame)
+
+    def table(frame, interval):
+        data = get_stock_data(SYMBOL, interval, data_override=frame.iloc[-10:])
+        return lambda: prepare_table(data)
+
+    def heat_map(frame, interval):
+        # 500 instruments cut from the same history at different ends
+        closes = frame['Close'].to_numpy()
+        points = max(DEFAULT_HORIZONS) + 1
+        ends = np.linspace(points, len(closes), 500).astype(np.intp)
+        matrix = closes[ends[:, None] - points + np.arange(points)[None, :]]
+        symbols = [f"S{number}" for number in range(len(ends))]
+        return lambda: style_changes(change_table(matrix, symbols)).to_html()
+
+    def backtest(frame, interval):
+        return lambda: run_backtest_for_interval(SYMBOL, interval, 10)
+
+    def walk(frame, interval):
+        closes = frame['Close'].to_numpy()
+        cutoffs = np.arange(max(len(closes) - 1000, 1), len(closes) + 1)
+        return lambda: walk_forward(closes, cutoffs)
+
+    return [
+        ("up_down_sequence", None, updown),
+        ("find_matches (scan)", None, match_scan),
+        ("PatternIndex build", None, index_build),
+        ("find_matches (index)", None, match_index),
+        ("project_closes", None, project),
+        ("find_similar_matches (hamming, 50-8)", None, similar("hamming")),
+        ("find_similar_matches (returns, 50-8)", None, similar("returns")),
+        ("simulate_ensemble (path, 100k paths)", None, ensemble("path")),
+        ("simulate_ensemble (step, 100k paths)", None, ensemble("step")),
+        ("generate_future_projections_pattern", None, generate),
+        ("print_difference_data (1 match)", None, difference_data),
+        ("get_stock_data", 100_000, stock_data),
+        ("prepare_table", None, table),
+        ("change heat map (500 instruments, styled)", None, heat_map),
+        ("run_backtest_for_interval (app period)", None, backtest),
+        ("walk_forward (1000 cut-offs)", None, walk),
+    ]
+
+
+def clear_caches():
+    """Empties the in-process caches a repeated call would otherwise hit."""
+    get_projection_cache().clear()
+    clear_pattern_indexes()
+    clear_states()
+
+
+def time_call(func, repeat, reset=clear_caches):
+    """
+    Returns (best seconds over 'repeat' runs, peak traced bytes of one extra run). 'reset'
+    runs untimed before each run.
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        reset()
+        started = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - started)
+    reset()
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return best, peak
+
+
+def run_benchmarks(sizes=DEFAULT_SIZES, intervals=DEFAULT_INTERVALS, repeat=3, stages=None, seed=0):
+    """Runs every stage for every interval and size and returns a list of result dicts."""
+    results = []
+    with tempfile.TemporaryDirectory() as root:
+        store = OHLCStore(root, offline=True)
+        layer = MarketData(loader=store.history)
+        previous = set_market_data(layer)
+        # A memory-only cache, so PROJECTION_CACHE_DIR files are never read back as results
+        previous_cache = set_projection_cache(ProjectionCache(directory=None))
+        try:
+            for interval in intervals:
+                for size in sizes:
+                    try:
+                        frame = make_ohlc_frame(size, interval, seed=seed)
+                    except ValueError as exc:
+                        print(f"skipping {interval} x {size}: {exc}")
+                        continue
+                    store.write(SYMBOL, interval, frame)
+                    layer.invalidate(SYMBOL, interval)
+                    for name, max_bars, setup in _stages():
+                        if stages and not any(name.startswith(prefix) for prefix in stages):
+                            continue
+                        if max_bars is not None and size > max_bars:
+                            continue
+                        seconds, peak = time_call(setup(frame, interval), repeat)
+                        results.append({
+                            'stage': name,
+                            'interval': interval,
+                            'bars': size,
+                            'seconds': seconds,
+                            'bars_per_second': size / seconds if seconds else float("inf"),
+                            'peak_mb': peak / 2 ** 20,
+                        })
+                        print(f"{name:<40} {interval:>4} {size:>9,} bars  {seconds * 1000:>10.3f} ms  "
+                              f"{results[-1]['bars_per_second']:>14,.0f} bars/s  {results[-1]['peak_mb']:>8.2f} MB")
+        finally:
+            set_market_data(previous)
+            set_projection_cache(previous_cache)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the projection and backtest hot paths offline.")
+    parser.add_argument("--sizes", nargs="+", type=int, default=DEFAULT_SIZES)
+    parser.add_argument("--intervals", nargs="+", default=DEFAULT_INTERVALS)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--stages", nargs="+", help="Only run stages whose name starts with one of these")
+    parser.add_argument("--json", help="Write the results to this JSON file")
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.sizes, args.intervals, args.repeat, args.stages)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
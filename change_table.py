@@ -0,0 +1,97 @@
+# change_table.py
+import numpy as np
+import pandas as pd
+
+from batch_projections import fetch_basket
+
+# Horizons, in bars, of the heat map columns
+DEFAULT_HORIZONS = (1, 2, 3, 5, 10, 20)
+# Changes of this many percent or more get the strongest color
+COLOR_SCALE = 5.0
+
+
+def close_matrix(histories, symbols, points):
+    """
+    Stacks the last 'points' closes of each symbol's history into a (symbols, points) float64
+    matrix, oldest first. Rows are right-aligned so the last column holds every symbol's
+    latest bar; shorter or missing histories are padded with NaN.
+    """
+    matrix = np.full((len(symbols), points), np.nan)
+    for row, symbol in enumerate(symbols):
+        frame = histories.get(symbol)
+        if frame is None or frame.empty:
+            continue
+        closes = frame['Close'].to_numpy(dtype=np.float64)[-points:]
+        matrix[row, points - len(closes):] = closes
+    return matrix
+
+
+def percentage_changes(closes, horizons=DEFAULT_HORIZONS):
+    """
+    Returns the (symbols, len(horizons)) percentage changes of the latest close over each
+    horizon of a close matrix, from one gather of the base closes: column j is
+    closes[:, -1] / closes[:, -1 - horizons[j]] - 1. Horizons longer than the matrix and
+    missing closes give NaN.
+    """
+    closes = np.asarray(closes, dtype=np.float64)
+    horizons = np.asarray(horizons, dtype=np.intp)
+    points = closes.shape[1]
+    usable = horizons < points
+    base = np.full((closes.shape[0], len(horizons)), np.nan)
+    base[:, usable] = closes[:, points - 1 - horizons[usable]]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return (closes[:, -1:] / base - 1) * 100
+
+
+def step_changes(closes):
+    """
+    Returns the bar-to-bar percentage changes of a close matrix, (symbols, points - 1): the
+    same next / previous - 1 division as pandas' pct_change, times 100. Missing closes are
+    not forward-filled, so they give NaN.
+    """
+    closes = np.asarray(closes, dtype=np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return (closes[:, 1:] / closes[:, :-1] - 1) * 100
+
+
+def change_colors(values, scale=COLOR_SCALE):
+    """
+    Returns the CSS background of each percentage change in an array, built for the whole
+    array at once: green for gains and red otherwise, with an opacity of |change| / scale
+    written like a Python float (shortest repr, so 0.0 and 1.0 keep their decimal) and 1
+    once it is capped. NaN cells get no style.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    intensity = np.abs(values) / scale
+    # numpy's float64 to str conversion is the shortest round-trip repr, like f'{float}'
+    intensity = np.where(intensity > 1, "1", intensity.astype(str))
+    css = np.char.add(np.char.add(np.where(values > 0, "background-color: rgba(0, 255, 0, ",
+                                           "background-color: rgba(255, 0, 0, "), intensity), ")")
+    return np.where(np.isnan(values), "", css)
+
+
+def style_changes(table, scale=COLOR_SCALE):
+    """Colors a DataFrame of percentage changes column by column with change_colors."""
+    return table.style.apply(lambda column: change_colors(column.to_numpy(dtype=np.float64), scale), axis=0)
+
+
+def change_table(closes, symbols, horizons=DEFAULT_HORIZONS, labels=None):
+    """
+    Returns a DataFrame of percentage_changes rounded to 2 decimals, with one row per symbol
+    (named by labels[symbol] when given) and one column per horizon ('1 bar', '5 bars', ...).
+    """
+    changes = percentage_changes(closes, horizons).round(2)
+    index = [labels.get(symbol, symbol) if labels else symbol for symbol in symbols]
+    columns = [f"{horizon} bar" if horizon == 1 else f"{horizon} bars" for horizon in horizons]
+    return pd.DataFrame(changes, index=pd.Index(index, name='instrument'), columns=columns)
+
+
+def basket_change_table(symbols, interval, horizons=DEFAULT_HORIZONS, labels=None):
+    """
+    Fetches the histories of a basket concurrently (see batch_projections.fetch_basket) and
+    returns (change_table, {symbol: error message}); symbols without data are left out.
+    """
+    histories, errors = fetch_basket(symbols, interval)
+    symbols = [symbol for symbol in dict.fromkeys(symbols) if symbol in histories]
+    closes = close_matrix(histories, symbols, max(horizons) + 1)
+    return change_table(closes, symbols, horizons, labels), errors
@@ -1,38 +1,151 @@
 # chart_utils.py
+import numpy as np
+import pandas as pd
 import plotly.graph_objects as go
 from datetime import datetime
 
-def plot_stock_chart(stock_data, future_projections, date_format):
+from price_series import PriceSeries, Projection
+from instrumentation import instrumented
+
+# Longer lines are downsampled (see lttb_indices) before they are sent to the browser
+MAX_CHART_POINTS = 2000
+# Lines with more points are drawn with WebGL. Short lines stay SVG: browsers only allow a
+# few WebGL contexts per page, and the ETF section alone shows more than 30 small charts.
+WEBGL_MIN_POINTS = 1000
+# Decimals kept in the prices sent to the browser; full float64 reprs double the payload
+CHART_DECIMALS = 4
+
+
+def lttb_indices(x, y, threshold=MAX_CHART_POINTS):
+    """
+    Largest-Triangle-Three-Buckets downsampling: returns the indices of 'threshold' points
+    that keep the visual shape of the line (x, y), always including the first and last point.
+    x may be numeric or datetime64.
+    """
+    n = len(y)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    x = np.asarray(x)
+    x = x.astype("datetime64[ns]").astype(np.float64) if np.issubdtype(x.dtype, np.datetime64) \
+        else x.astype(np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    # threshold - 2 buckets between the fixed first and last points
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.intp)
+    sizes = np.diff(np.append(edges, n))
+    mean_x = np.add.reduceat(x, edges) / sizes
+    mean_y = np.add.reduceat(y, edges) / sizes
+    indices = np.empty(threshold, dtype=np.intp)
+    indices[0], indices[-1] = 0, n - 1
+    a = 0
+    for bucket in range(threshold - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        # Triangle areas (doubled) between the last kept point and the next bucket's average
+        area = np.abs((x[a] - mean_x[bucket + 1]) * (y[start:end] - y[a])
+                      - (x[a] - x[start:end]) * (mean_y[bucket + 1] - y[a]))
+        a = start + int(np.argmax(area))
+        indices[bucket + 1] = a
+    return indices
+
+
+def downsample(x, y, threshold=MAX_CHART_POINTS):
+    """Returns (x, y) as arrays, reduced to 'threshold' points with LTTB when longer."""
+    x, y = np.asarray(x), np.asarray(y, dtype=np.float64)
+    if len(y) <= threshold:
+        return x, y
+    indices = lttb_indices(x, y, threshold)
+    return x[indices], y[indices]
+
+
+def merged_lines(lines, labels=None):
+    """
+    Concatenates several (x, y) lines into a single line broken by gaps (a NaN close at the
+    previous line's last x), so they can be drawn as one trace.
+    Returns (x, y, text): 'text' repeats each line's label for every point, or is None.
+    """
+    xs, ys, texts = [], [], []
+    for number, (x, y) in enumerate(lines):
+        x, y = np.asarray(x), np.asarray(y, dtype=np.float64)
+        if xs:
+            xs.append(xs[-1][-1:])
+            ys.append(np.array([np.nan]))
+            texts.append([""])
+        xs.append(x)
+        ys.append(y)
+        if labels is not None:
+            texts.append([labels[number]] * len(y))
+    if not xs:
+        return np.empty(0), np.empty(0), None
+    return (np.concatenate(xs), np.concatenate(ys),
+            np.concatenate(texts).tolist() if labels is not None else None)
+
+
+def line_trace(x, y, **kwargs):
+    """
+    Returns a line trace for arrays x/y, drawn with WebGL (Scattergl) once it is long enough.
+    datetime64 x values are sent as minute-precision strings, about half the length of the
+    nanosecond timestamps Plotly would write, and y is rounded to CHART_DECIMALS.
+    """
+    x = np.asarray(x)
+    if np.issubdtype(x.dtype, np.datetime64):
+        x = np.datetime_as_string(x, unit='m')
+    y = np.round(np.asarray(y, dtype=np.float64), CHART_DECIMALS)
+    trace_type = go.Scattergl if len(y) > WEBGL_MIN_POINTS else go.Scatter
+    return trace_type(x=x, y=y, mode='lines', **kwargs)
+
+
+def line_points(line, date_format):
+    """
+    Returns the (dates, closes) of a PriceSeries, a Projection, or a legacy list of
+    {'date', 'close'} dictionaries whose date strings are parsed with date_format.
+    """
+    if isinstance(line, (PriceSeries, Projection)):
+        return line.dates, line.closes
+    return ([datetime.strptime(data['date'], date_format) for data in line],
+            [data['close'] for data in line])
+
+
+@instrumented("plot_stock_chart")
+def plot_stock_chart(stock_data, future_projections, date_format, history_points=8):
     """
-    Plots a step line chart for the actual stock prices (last 8 data points)
-    and overlays the future projection lines (from historical pattern logic).
-    The predictions remain unchanged.
+    Plots a step line chart for the actual stock prices (last 'history_points' data points,
+    or the whole history downsampled to MAX_CHART_POINTS when None) and overlays the future
+    projection lines (from historical pattern logic) as one dotted trace, with each line's
+    label in its hover text. The predictions remain unchanged. Accepts PriceSeries/Projection
+    objects or the legacy lists of {'date', 'close'} dictionaries.
     """
-    # Show only the last 8 actual prices
-    dates_actual = [datetime.strptime(data['date'], date_format) for data in stock_data[-8:]]
-    prices_actual = [data['close'] for data in stock_data[-8:]]
-    
+    # Show only the last 8 actual prices by default
+    if history_points is not None:
+        stock_data = stock_data.tail(history_points) if isinstance(stock_data, PriceSeries) \
+            else stock_data[-history_points:]
+    dates_actual, prices_actual = downsample(*line_points(stock_data, date_format))
+
     fig = go.Figure()
-    fig.add_trace(go.Scatter(
-        x=dates_actual,
-        y=prices_actual,
-        mode='lines',
+    fig.add_trace(line_trace(
+        dates_actual,
+        prices_actual,
         line_shape='hv',
         name='Stock Prices',
         marker=dict(color='blue')
     ))
 
+    lines, labels = [], []
     for proj in future_projections:
-        future_line = proj['data']
-        future_dates = [datetime.strptime(item['date'], date_format) for item in future_line]
-        future_prices = [item['close'] for item in future_line]
+        if isinstance(proj, Projection):
+            lines.append(line_points(proj, date_format))
+            labels.append(f"Match: {pd.Timestamp(proj.match_date).strftime(date_format)}")
+        else:
+            lines.append(line_points(proj['data'], date_format))
+            labels.append(proj['label'])
 
-        fig.add_trace(go.Scatter(
-            x=future_dates,
-            y=future_prices,
-            mode='lines',
+    if lines:
+        future_dates, future_prices, texts = merged_lines(lines, labels)
+        fig.add_trace(line_trace(
+            future_dates,
+            future_prices,
             line_shape='hv',
-            name=proj['label'],
+            name=f"Future Projections ({len(labels)})",
+            text=texts,
+            hovertemplate="%{text}<br>%{x}: %{y:.2f}<extra></extra>",
             line=dict(dash='dot')
         ))
 
@@ -45,3 +158,42 @@ def plot_stock_chart(stock_data, future_projections, date_format):
     )
 
     return fig
+
+
+@instrumented("add_projection_bands")
+def add_projection_bands(fig, bands):
+    """
+    Overlays the percentile bands of a data_utils.generate_projection_bands result: the
+    outer percentiles pairwise as shaded areas and the median as a dashed line.
+    """
+    percentiles = bands['percentiles']
+    values = bands['bands']
+    count = len(percentiles)
+    for low in range(count // 2):
+        high = count - 1 - low
+        fig.add_trace(go.Scatter(
+            x=bands['dates'],
+            y=values[high],
+            mode='lines',
+            line=dict(width=0),
+            showlegend=False,
+            hoverinfo='skip'
+        ))
+        fig.add_trace(go.Scatter(
+            x=bands['dates'],
+            y=values[low],
+            mode='lines',
+            line=dict(width=0),
+            fill='tonexty',
+            fillcolor='rgba(255, 165, 0, 0.15)',
+            name=f"P{percentiles[low]:g}-P{percentiles[high]:g} ({len(bands['match_indices'])} matches)"
+        ))
+    if count % 2:
+        fig.add_trace(go.Scatter(
+            x=bands['dates'],
+            y=values[count // 2],
+            mode='lines',
+            line=dict(color='orange', dash='dash'),
+            name=f"Median (P{percentiles[count // 2]:g})"
+        ))
+    return fig
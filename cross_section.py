@@ -0,0 +1,150 @@
+# cross_section.py
+import hashlib
+import threading
+
+import numpy as np
+import pandas as pd
+
+from batch_projections import fetch_basket
+from pattern_index import PatternIndex
+from projection_engine import (FORWARD_LENGTH, MIN_MATCHES, PATTERN_LENGTHS, compound_paths, non_overlapping,
+                               up_down_sequence)
+
+# Value placed between the symbols' U/D sequences; no pattern of 0/1 values can match across it
+SEPARATOR = 2
+
+
+class CrossSectionIndex:
+    """
+    One PatternIndex over the newest-first U/D sequences of many symbols, so the current
+    pattern of any symbol can be looked up in every other symbol's history at once.
+
+    The per-symbol sequences are laid out back to back with a SEPARATOR between them and the
+    closes are kept in one float64 array; block offsets map a position of the combined index
+    back to (symbol, bar).
+    """
+
+    def __init__(self, closes_by_symbol):
+        self.symbols = list(closes_by_symbol)
+        closes = [np.ascontiguousarray(closes_by_symbol[symbol], dtype=np.float64) for symbol in self.symbols]
+        self.sizes = np.array([len(values) for values in closes], dtype=np.intp)
+        self.close_offsets = np.concatenate(([0], np.cumsum(self.sizes)[:-1])).astype(np.intp)
+        self.closes = np.concatenate(closes) if closes else np.empty(0)
+
+        # Symbol i's newest-first sequence has sizes[i] - 1 entries followed by one separator
+        block_sizes = np.maximum(self.sizes - 1, 0)
+        self.offsets = np.concatenate(([0], np.cumsum(block_sizes + 1)[:-1])).astype(np.intp)
+        sequence = np.full(int((block_sizes + 1).sum()), SEPARATOR, dtype=np.uint8)
+        for values, offset, size in zip(closes, self.offsets.tolist(), block_sizes.tolist()):
+            if size:
+                sequence[offset:offset + size] = up_down_sequence(values)[::-1]
+        self.block_sizes = block_sizes
+        self.index = PatternIndex(sequence)
+
+    def __len__(self):
+        return len(self.symbols)
+
+    def locate(self, positions):
+        """Maps combined-index positions to (symbol numbers, newest-first bar positions)."""
+        positions = np.asarray(positions, dtype=np.intp)
+        owners = np.searchsorted(self.offsets, positions, side="right") - 1
+        return owners, positions - self.offsets[owners]
+
+    def scan(self, symbol, future_points=10, pattern_lengths=PATTERN_LENGTHS, forward_length=FORWARD_LENGTH,
+             min_matches=MIN_MATCHES, include_self=True, limit=None):
+        """
+        Finds the current pattern of 'symbol' in every indexed history and returns the pooled
+        forward paths of the matches, longest pattern first like select_matches: a length is
+        used if it occurs at least min_matches times across all symbols, and a bar keeps the
+        first length it matched. The pattern itself and matches without 'steps' bars after
+        them are left out, with steps = min(future_points, forward_length).
+
+        Returns a dict of arrays, one row per match:
+            'symbols'       symbol of each match
+            'match_indices' oldest-first bar index of each match in its own history
+            'lengths'       pattern length that matched
+            'returns'       (matches, steps) fractional forward moves
+            'paths'         (matches, steps + 1) those moves compounded from symbol's last close
+        """
+        number = self.symbols.index(symbol)
+        start = int(self.offsets[number])
+        steps = min(future_points, forward_length)
+
+        positions, lengths, seen = [], [], set()
+        for length in pattern_lengths:
+            if length > self.block_sizes[number]:
+                continue
+            found = non_overlapping(self.index.occurrences_at(start, length), length)
+            if len(found) < min_matches:
+                continue
+            for position in found.tolist():
+                if position != start and position not in seen:
+                    seen.add(position)
+                    positions.append(position)
+                    lengths.append(length)
+        positions = np.array(positions, dtype=np.intp)
+        lengths = np.array(lengths, dtype=np.intp)
+
+        owners, bars = self.locate(positions)
+        keep = bars >= steps
+        if not include_self:
+            keep &= owners != number
+        owners, bars, lengths = owners[keep][:limit], bars[keep][:limit], lengths[keep][:limit]
+
+        # Newest-first bar q of symbol i is its oldest-first bar sizes[i] - 1 - q
+        match_indices = self.sizes[owners] - 1 - bars
+        window = (self.close_offsets[owners] + match_indices)[:, None] + np.arange(steps + 1)[None, :]
+        prices = self.closes[window]
+        returns = prices[:, 1:] / prices[:, :-1] - 1
+        last_close = self.closes[self.close_offsets[number] + self.sizes[number] - 1]
+        return {
+            'symbols': np.array(self.symbols, dtype=object)[owners],
+            'match_indices': match_indices,
+            'lengths': lengths,
+            'returns': returns,
+            'paths': compound_paths(last_close, returns),
+        }
+
+
+# The most recently built index per interval, with the fingerprint of the closes it holds
+_cross_sections = {}
+_cross_sections_lock = threading.Lock()
+
+
+def _fingerprint(closes_by_symbol):
+    digest = hashlib.blake2b(digest_size=16)
+    for symbol, closes in closes_by_symbol.items():
+        digest.update(symbol.encode())
+        digest.update(np.ascontiguousarray(closes, dtype=np.float64).tobytes())
+    return digest.digest()
+
+
+def get_cross_section(symbols, interval):
+    """
+    Returns (CrossSectionIndex, errors) over the histories of 'symbols', fetched concurrently
+    through the shared data layer. The index is rebuilt only when the closes change.
+    """
+    frames, errors = fetch_basket(symbols, interval)
+    closes_by_symbol = {symbol: frames[symbol].sort_index()['Close'].to_numpy(dtype=np.float64)
+                        for symbol in dict.fromkeys(symbols) if symbol in frames}
+    key = _fingerprint(closes_by_symbol)
+    with _cross_sections_lock:
+        cached = _cross_sections.get(interval)
+        if cached is not None and cached[0] == key:
+            return cached[1], errors
+    index = CrossSectionIndex(closes_by_symbol)
+    with _cross_sections_lock:
+        _cross_sections[interval] = (key, index)
+    return index, errors
+
+
+def scan_summary(result):
+    """
+    Groups the matches of CrossSectionIndex.scan per symbol: number of matches, mean final
+    move and share of matches that ended up, in percent, most matches first.
+    """
+    final = result['paths'][:, -1] / result['paths'][:, 0] - 1
+    frame = pd.DataFrame({'symbol': result['symbols'], 'final_move': final * 100, 'up': (final > 0) * 100.0})
+    summary = frame.groupby('symbol').agg(matches=('final_move', 'size'), mean_move=('final_move', 'mean'),
+                                          up_share=('up', 'mean'))
+    return summary.sort_values('matches', ascending=False).round(2).reset_index()
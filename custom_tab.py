@@ -1,8 +1,6 @@
 import streamlit as st
-from data_utils import get_stock_data, generate_future_projections_pattern, prepare_table
-from chart_utils import plot_stock_chart
+from similarity_search import MATCH_MODES
 from datetime import datetime
-import pandas as pd
 
 def render_custom_tab():
     """
@@ -17,32 +15,51 @@ def render_custom_tab():
         selected_symbol = custom_stock
         stock_label = custom_stock
 
+    match_mode = st.selectbox("Pattern matching", list(MATCH_MODES), format_func=MATCH_MODES.get,
+                              key="custom_match_mode")
+    show_bands = st.checkbox("Show ensemble bands (bootstrap over all matches)", key="custom_bands")
+    full_history = st.checkbox("Show the full history (downsampled)", key="custom_full_history")
+
     # Analysis button for custom tab
     if st.button("Analyze (Custom)"):
         if not selected_symbol:
             st.error("Please enter a stock ticker symbol.")
         else:
+            # The analysis modules (pandas, yfinance, plotly charts) are imported on the first
+            # analysis, so opening the section does not wait for them
+            from data_utils import get_price_series, generate_projection_series, generate_projection_bands, prepare_table
+            from chart_utils import plot_stock_chart, add_projection_bands
+            from price_series import date_format_for, format_dates
+
             st.info(f"Analyzing: {stock_label}")
             # Intervals ordered as: weekly, daily, hourly.
             intervals = ["1wk", "1d", "1h"]
             for interval in intervals:
                 st.subheader(f"Interval: {interval}")
                 # Choose correct date format based on interval
-                date_format = '%d-%b-%Y %H:%M' if interval == "1h" else '%d-%b-%Y'
+                date_format = date_format_for(interval)
                 
                 # Get stock data and projections for this interval
-                stock_data = get_stock_data(selected_symbol, interval)
-                future_projections = generate_future_projections_pattern(selected_symbol, interval)
+                stock_data = get_price_series(selected_symbol, interval)
+                future_projections = generate_projection_series(selected_symbol, interval,
+                                                                data_override=stock_data, match_mode=match_mode)
                 
                 # Display current time and latest data timestamp for this interval
                 current_time = datetime.now().strftime(date_format)
-                latest_time = stock_data[-1]['date']
+                latest_time = format_dates(stock_data.dates[-1:], date_format)[0]
                 st.write(f"Current Time: {current_time} | Latest Data Time: {latest_time}")
                 
                 # Plot and display the chart
-                fig = plot_stock_chart(stock_data, future_projections, date_format)
+                fig = plot_stock_chart(stock_data, future_projections, date_format,
+                                       history_points=None if full_history else 8)
+                if show_bands:
+                    bands = generate_projection_bands(selected_symbol, interval, data_override=stock_data)
+                    if len(bands['mean']):
+                        add_projection_bands(fig, bands)
+                        st.write(f"Probability of closing above the last price after {len(bands['mean']) - 1} bars: "
+                                 f"{bands['prob_above'][0, -1]:.0%} ({len(bands['match_indices'])} matches)")
                 st.plotly_chart(fig)
                 
                 # Display the styled percentage change table (for the last 10 data points)
-                styled_table = prepare_table(stock_data)
+                styled_table = prepare_table(stock_data, date_format)
                 st.dataframe(styled_table)
@@ -0,0 +1,166 @@
+# data_providers.py
+import os
+import re
+import zlib
+
+import pandas as pd
+import pyarrow.parquet as pq
+
+from fetch_client import FetchClient, empty_history, set_fetch_client, yfinance_download, yfinance_history
+from market_data import MarketData, set_market_data
+from ohlc_store import default_period, prefetch_histories, slice_period
+from synthetic_data import make_ohlc_frame
+
+# Bars a synthetic history has per interval (about 7 years of hourly, 10 of daily, 20 of weekly bars)
+SYNTHETIC_BARS = {"1h": 12_000, "1d": 2_520, "1wk": 1_040}
+
+
+def _select(df, period=None, start=None):
+    """Applies a provider request's period or start to a full history."""
+    if df.empty:
+        return df
+    if start is not None:
+        return df[df.index >= pd.Timestamp(start)]
+    return slice_period(df, period or "max")
+
+
+class YFinanceProvider:
+    """Downloads from Yahoo Finance through yfinance."""
+
+    name = "yfinance"
+    local = False
+
+    def history(self, symbol, interval, period=None, start=None, auto_adjust=False, timeout=None):
+        return yfinance_history(symbol, interval, period=period, start=start, auto_adjust=auto_adjust,
+                                timeout=timeout)
+
+    def download(self, symbols, interval, period=None, start=None, auto_adjust=False, timeout=None):
+        return yfinance_download(symbols, interval, period=period, start=start, auto_adjust=auto_adjust,
+                                 timeout=timeout)
+
+
+class LocalFileProvider:
+    """
+    Serves pre-downloaded histories from a directory laid out as <root>/<interval>/<symbol>
+    with a .parquet, .raw.parquet (an OHLC store directory) or .csv suffix. Parquet files are
+    read memory-mapped, so thousands of histories can be served without loading them upfront.
+    CSV files need the timestamps in the first column; timestamps with UTC offsets are
+    converted to 'tz'.
+    """
+
+    name = "local"
+    local = True
+    SUFFIXES = (".parquet", ".raw.parquet", ".csv")
+
+    def __init__(self, root, tz="America/New_York"):
+        self.root = root
+        self.tz = tz
+
+    def path(self, symbol, interval):
+        """Returns the file holding a symbol's history, or None if there is none."""
+        safe_symbol = re.sub(r"[^A-Za-z0-9._=-]", "_", symbol)
+        for suffix in self.SUFFIXES:
+            path = os.path.join(self.root, interval, safe_symbol + suffix)
+            if os.path.exists(path):
+                return path
+        return None
+
+    def read(self, symbol, interval):
+        """Returns the full stored history of a symbol (empty if there is no file)."""
+        path = self.path(symbol, interval)
+        if path is None:
+            return empty_history()
+        if path.endswith(".csv"):
+            df = pd.read_csv(path, index_col=0)
+            stamps = df.index.astype(str)
+            if stamps.str.contains(r"[+-]\d\d:\d\d$").any():
+                df.index = pd.to_datetime(stamps, utc=True).tz_convert(self.tz)
+            else:
+                df.index = pd.to_datetime(stamps)
+        else:
+            df = pq.read_table(path, memory_map=True).to_pandas()
+        return df.sort_index()
+
+    def history(self, symbol, interval, period=None, start=None, auto_adjust=False, timeout=None):
+        return _select(self.read(symbol, interval), period, start)
+
+    def download(self, symbols, interval, period=None, start=None, auto_adjust=False, timeout=None):
+        frames = {symbol: self.history(symbol, interval, period, start) for symbol in symbols}
+        return {symbol: frame for symbol, frame in frames.items() if not frame.empty}
+
+
+class SyntheticProvider:
+    """
+    Generates deterministic random-walk histories (see synthetic_data.make_ohlc_frame) for
+    any symbol: the same symbol and interval always give the same bars.
+    """
+
+    name = "synthetic"
+    local = True
+
+    def __init__(self, bars=None, end="2024-12-31"):
+        self.bars = dict(SYNTHETIC_BARS, **(bars or {}))
+        self.end = end
+
+    def read(self, symbol, interval):
+        seed = zlib.crc32(f"{symbol}|{interval}".encode())
+        return make_ohlc_frame(self.bars.get(interval, SYNTHETIC_BARS["1d"]), interval, seed=seed, end=self.end)
+
+    def history(self, symbol, interval, period=None, start=None, auto_adjust=False, timeout=None):
+        return _select(self.read(symbol, interval), period, start)
+
+    def download(self, symbols, interval, period=None, start=None, auto_adjust=False, timeout=None):
+        return {symbol: self.history(symbol, interval, period, start) for symbol in symbols}
+
+
+def provider_from_spec(spec):
+    """
+    Builds a provider from a spec string: "yfinance", "local:<directory>" or
+    "synthetic" (optionally "synthetic:<end date>").
+    """
+    name, _, argument = spec.partition(":")
+    if name == "yfinance":
+        return YFinanceProvider()
+    if name == "local":
+        if not argument:
+            raise ValueError("The local provider needs a directory, e.g. local:/data/histories")
+        return LocalFileProvider(argument)
+    if name == "synthetic":
+        return SyntheticProvider(end=argument) if argument else SyntheticProvider()
+    raise ValueError(f"Unknown data provider {spec!r}")
+
+
+def provider_loader(provider):
+    """Returns a MarketData loader reading straight from a local provider, without the OHLC store."""
+    def load(symbol, interval, period=None, auto_adjust=False):
+        df = provider.history(symbol, interval, period=default_period(interval) if period is None else period)
+        return df if not df.empty else empty_history()
+    return load
+
+
+def use_provider(provider):
+    """
+    Makes every tab, the batch runner and the benchmarks read from 'provider'. Network
+    providers go through the fetch client and the OHLC store; local ones are read directly.
+    """
+    set_fetch_client(FetchClient(history=provider.history, download=provider.download))
+    if provider.local:
+        set_market_data(MarketData(loader=provider_loader(provider)))
+    else:
+        set_market_data(MarketData(prefetcher=prefetch_histories))
+    return provider
+
+
+_env_provider = None
+
+
+def configure_from_env():
+    """
+    Applies the DATA_PROVIDER environment variable (see provider_from_spec) once per process
+    and returns the provider, or None when it is not set.
+    """
+    global _env_provider
+    spec = os.environ.get("DATA_PROVIDER")
+    if spec and _env_provider is None:
+        _env_provider = use_provider(provider_from_spec(spec))
+    return _env_provider
@@ -1,22 +1,62 @@
 # data_utils.py
-import yfinance as yf
-from datetime import datetime, timedelta
+import time
 import numpy as np
 import pandas as pd
-import re
-
-def get_stock_data(stock_symbol, interval):
-    """Fetches stock data from yfinance and returns a list of dictionaries (date, close)."""
-    period = "1y" if interval == "1h" else "5y" if interval == "1d" else "max"
-    instrument = yf.Ticker(stock_symbol)
-    array_data = instrument.history(period=period, interval=interval, auto_adjust=False)
-    date_format = '%d-%b-%Y %H:%M' if interval == "1h" else '%d-%b-%Y'
-    stock_data = [{
-        'date': array_data.index[i].strftime(date_format),
-        'close': array_data.iloc[i]['Close']
-    } for i in range(len(array_data))]
-    return stock_data
+from projection_engine import project_closes, interval_step
+from market_data import bar_seconds, get_history
+from pattern_index import get_pattern_index
+from price_series import PriceSeries, build_projections, date_format_for
+from projection_ensemble import ensemble_projection
+from similarity_search import project_similar
+from change_table import step_changes, style_changes
+from history_archive import get_archive
+from incremental_projection import incremental_projection
+from projection_cache import get_projection_cache, projection_key
+from instrumentation import count, instrumented, timed
 
+# Intervals whose exact projections are kept up to date bar by bar instead of rebuilding the index
+INCREMENTAL_INTERVALS = ("1h",)
+
+@instrumented("get_stock_data")
+def get_stock_data(stock_symbol, interval, data_override=None):
+    """
+    Fetches stock data through the shared data layer and returns a list of dictionaries (date, close).
+    If data_override is provided, it will use that DataFrame instead of fetching new data.
+    """
+    date_format = date_format_for(interval)
+    return get_price_series(stock_symbol, interval, data_override).to_records(date_format)
+
+def archive_is_current(archive, stock_symbol, interval, now=None):
+    """
+    Returns True when an archived history can stand in for live data: the archive was written
+    within the last bar (the precompute scheduler keeps rewriting it), or the history's last
+    bar closed less than one bar ago.
+    """
+    now = time.time() if now is None else now
+    bar = bar_seconds(interval)
+    if archive.written is not None and now - archive.written <= bar:
+        return True
+    last_bar = archive.last_bar_time(stock_symbol, interval)
+    return last_bar is not None and now - (last_bar + bar) <= bar
+
+def get_price_series(stock_symbol, interval, data_override=None):
+    """
+    Fetches stock data as a PriceSeries (datetime64/float64 arrays): zero-copy views of the
+    history archive when one is configured, holds the symbol and is current (see
+    archive_is_current), else through the shared data layer. If data_override is provided
+    (a DataFrame or PriceSeries), it will use that instead of fetching new data.
+    """
+    if isinstance(data_override, PriceSeries):
+        return data_override
+    if data_override is None:
+        archive = get_archive()
+        if (archive is not None and (stock_symbol, interval) in archive
+                and archive_is_current(archive, stock_symbol, interval)):
+            return archive.series(stock_symbol, interval)
+        data_override = get_history(stock_symbol, interval)
+    return PriceSeries.from_frame(data_override)
+
+@instrumented("print_difference_data")
 def print_difference_data(arg_array, index, matched_length, forward_length):
     """
     Mimics the original logic: given a starting index and a matched pattern length,
@@ -39,6 +79,7 @@ def print_difference_data(arg_array, index, matched_length, forward_length):
     future_average = sum(item['percentage_difference'] for item in indices) / len(indices)
     return indices, matched, future_average
 
+@instrumented("generate_future_projections_pattern")
 def generate_future_projections_pattern(stock_symbol, interval, future_points=10, num_lines=5, data_override=None):
     """
     Uses historical pattern matching logic to extract a series of future percentage changes
@@ -46,90 +87,124 @@ def generate_future_projections_pattern(stock_symbol, interval, future_points=10
     Each projection is labeled with the date where the matching pattern was found.
     If data_override is provided, it will use that DataFrame instead of fetching new data.
     """
-    if data_override is None:
-        period = "1y" if interval == "1h" else "5y" if interval == "1d" else "max"
-        instrument = yf.Ticker(stock_symbol)
-        array_data = instrument.history(period=period, interval=interval, auto_adjust=False)
-    else:
-        array_data = data_override
+    series = get_price_series(stock_symbol, interval, data_override)
+    match_indices, paths = cached_projection(stock_symbol, interval, series, future_points, num_lines)
+    return format_projections(pd.DatetimeIndex(series.dates), interval, match_indices, paths)
+
+def cached_projection(stock_symbol, interval, array_data, future_points=10, num_lines=5, match_mode="exact"):
+    """
+    Returns project_closes(...) for a history DataFrame or PriceSeries through the projection
+    cache, so an unchanged last bar never triggers the pattern matching again. The arrays are
+    read-only. match_mode "hamming" or "returns" uses similarity_search.project_similar instead.
+    On a miss, exact projections of INCREMENTAL_INTERVALS update the symbol's
+    incremental_projection state with the new bars instead of indexing the whole history.
+    """
+    key = projection_key(stock_symbol, interval, array_data, "projection", future_points=future_points,
+                         num_lines=num_lines, match_mode=match_mode)
+
+    def compute():
+        # Run the pattern matching on a contiguous array of closes (oldest first)
+        if isinstance(array_data, PriceSeries):
+            closes = array_data.closes
+        else:
+            closes = array_data['Close'].to_numpy(dtype=np.float64)
+        if match_mode == "exact" and interval in INCREMENTAL_INTERVALS:
+            series = array_data if isinstance(array_data, PriceSeries) else PriceSeries.from_frame(array_data)
+            with timed("incremental_match"):
+                match_indices, paths = incremental_projection(stock_symbol, interval, series, future_points,
+                                                              num_lines)
+            count("matches_found", len(match_indices))
+            return {'match_indices': match_indices, 'paths': paths}
+        if match_mode != "exact":
+            with timed("similarity_match"):
+                match_indices, paths = project_similar(closes, future_points=future_points, num_lines=num_lines,
+                                                       metric=match_mode)
+            count("matches_found", len(match_indices))
+            return {'match_indices': match_indices, 'paths': paths}
+        with timed("pattern_index"):
+            index = get_pattern_index(closes)
+        with timed("pattern_match"):
+            match_indices, paths = project_closes(closes, future_points=future_points, num_lines=num_lines,
+                                                  index=index)
+        count("bars_matched", len(closes))
+        count("matches_found", len(match_indices))
+        return {'match_indices': match_indices, 'paths': paths}
+
+    result = get_projection_cache().get_or_compute(key, compute)
+    return result['match_indices'], result['paths']
+
+def format_projections(dates, interval, match_indices, paths):
+    """
+    Turns projected price paths (see projection_engine.project_closes) into the list of
+    {'label', 'data'} dictionaries used by the charts. 'dates' holds the timestamps of the
+    bars the paths were projected from, oldest first.
+    """
+    date_format = date_format_for(interval)
+    last_close = paths[0, 0] if len(paths) else None
+    last_date = dates[-1]
+    step = interval_step(interval)
 
-    date_format = '%d-%b-%Y %H:%M' if interval == "1h" else '%d-%b-%Y'
-    
-    # Create a string of 'U' and 'D' representing Up/Down movements
-    result_string = ''.join(['U' if array_data.iloc[i]['Close'] >= array_data.iloc[i-1]['Close'] else 'D'
-                             for i in range(1, len(array_data))])
-    # Reverse the data to mimic the original ordering
-    array_data = array_data.iloc[::-1]
-    result_string = result_string[::-1]
-    
-    index_dict = {}
-    # Try pattern lengths from 8 down to 6
-    for iteration in range(8, 5, -1):
-        string_to_match = result_string[0:iteration]
-        matches = [match.start() for match in re.finditer(string_to_match, result_string)]
-        if len(matches) > 2:
-            for matched_index in matches[1:]:
-                if matched_index not in index_dict:
-                    index_dict[matched_index] = len(string_to_match)
-                    
-    # For each pattern match, extract future percentage changes using print_difference_data
-    data_dic = {}
-    for key, value in index_dict.items():
-        indices, matched, future_average = print_difference_data(array_data, key, value, 13)
-        data_dic[key] = (value, indices, matched, future_average)
-    
-    # Get the last actual price and date from the raw data (data is reversed)
-    last_row = array_data.iloc[0]
-    last_close = last_row['Close']
-    last_date = array_data.index[0]
-    
     future_projections = []
-    # Use the first num_lines patterns from data_dic
-    for key in list(data_dic.keys())[:num_lines]:
-        _, indices, matched, future_average = data_dic[key]
-        # Extract future percentage returns from the first 'future_points' entries in indices
-        future_returns = [item['percentage_difference'] / 100 for item in indices[:future_points]]
-        future_prices = [last_close]
-        for r in future_returns:
-            future_prices.append(future_prices[-1] * (1 + r))
+    for match_index, path in zip(match_indices, paths):
         # Build a future line with dates starting from last_date (duplicate last date to avoid a gap)
-        future_line = []
-        current_date = last_date
-        future_line.append({'date': current_date.strftime(date_format), 'close': last_close})
-        for price in future_prices[1:]:
-            if interval == "1h":
-                current_date += timedelta(hours=1)
-            elif interval == "1wk":
-                current_date += timedelta(weeks=1)
-            else:  # 1d
-                current_date += timedelta(days=1)
-            future_line.append({'date': current_date.strftime(date_format), 'close': price})
-        
+        future_line = [{'date': last_date.strftime(date_format), 'close': last_close}]
+        future_line.extend({'date': (last_date + step * i).strftime(date_format), 'close': price}
+                           for i, price in enumerate(path[1:], start=1))
+
         # Label the projection with the date where the pattern was found
-        match_date = array_data.index[key]
+        match_date = dates[match_index]
         label = f"Future Projection (Match Date: {match_date.strftime(date_format)})"
-        
+
         future_projections.append({'label': label, 'data': future_line})
-    
+
     return future_projections
 
-def highlight_cells(val):
-    """Returns a CSS style string for cell background based on the value."""
-    intensity = min(abs(val) / 5, 1)
-    if val > 0:
-        return f'background-color: rgba(0, 255, 0, {intensity})'
-    else:
-        return f'background-color: rgba(255, 0, 0, {intensity})'
+@instrumented("generate_projection_series")
+def generate_projection_series(stock_symbol, interval, future_points=10, num_lines=5, data_override=None,
+                               match_mode="exact"):
+    """
+    Same projections as generate_future_projections_pattern, returned as Projection objects
+    holding datetime64/float64 arrays instead of lists of date-string dictionaries.
+    match_mode selects exact or similarity matching (see similarity_search.MATCH_MODES).
+    """
+    series = get_price_series(stock_symbol, interval, data_override)
+    match_indices, paths = cached_projection(stock_symbol, interval, series, future_points, num_lines, match_mode)
+    return build_projections(series, interval, match_indices, paths)
+
+@instrumented("generate_projection_bands")
+def generate_projection_bands(stock_symbol, interval, future_points=10, n_paths=100_000, method="path",
+                              data_override=None):
+    """
+    Bootstraps the forward paths of all historical pattern matches (see
+    projection_ensemble.ensemble_projection) and adds the 'dates' of the band columns,
+    starting with the last actual bar. Results are cached like the projections.
+    """
+    series = get_price_series(stock_symbol, interval, data_override)
+    key = projection_key(stock_symbol, interval, series, "bands", future_points=future_points,
+                         n_paths=n_paths, method=method)
+
+    def compute():
+        bands = ensemble_projection(series.closes, future_points=future_points, n_paths=n_paths, method=method,
+                                    index=get_pattern_index(series.closes))
+        bands['dates'] = series.dates[-1] + np.timedelta64(interval_step(interval)) * np.arange(bands['mean'].shape[0])
+        return bands
+
+    return dict(get_projection_cache().get_or_compute(key, compute))
 
-def prepare_table(stock_data):
+@instrumented("prepare_table")
+def prepare_table(stock_data, date_format='%d-%b-%Y'):
     """
     Prepares and styles a DataFrame for the last 10 actual data points.
     Calculates the percentage change (from previous close) and applies color coding.
+    Accepts a PriceSeries or a list of {'date', 'close'} dictionaries; a PriceSeries only has
+    its last 10 dates formatted, using date_format.
     """
-    df = pd.DataFrame(stock_data[-10:])
-    df['percentage_change'] = df['close'].pct_change() * 100
-    df['percentage_change'] = df['percentage_change'].round(2)
-    df = df.iloc[1:]
-    df = df[['date', 'percentage_change']].set_index('date')
-    styled_df = df.T.style.applymap(highlight_cells)
+    if isinstance(stock_data, PriceSeries):
+        stock_data = stock_data.tail(10).to_records(date_format)
+    recent = stock_data[-10:]
+    closes = np.array([[item['close'] for item in recent]], dtype=np.float64)
+    changes = step_changes(closes).round(2)
+    dates = pd.Index([item['date'] for item in recent[1:]], name='date')
+    df = pd.DataFrame(changes, index=['percentage_change'], columns=dates)
+    styled_df = style_changes(df)
     return styled_df
@@ -1,3 +1,5 @@
+from stock_options import stock_options
+
 ETF_CONFIG = {
     "SOXX": [
         {"id": "AVGO", "label": "Broadcom"},
@@ -109,3 +111,11 @@ ETF_CONFIG = {
         {"id": "6618.HK", "label": "JDHealth"}
     ]
 }
+
+
+def all_symbols():
+    """Returns every symbol of stock_options and ETF_CONFIG, without duplicates."""
+    symbols = list(stock_options.values())
+    for stocks in ETF_CONFIG.values():
+        symbols.extend(stock["id"] for stock in stocks)
+    return list(dict.fromkeys(symbols))
@@ -0,0 +1,65 @@
+import streamlit as st
+from etf_config import ETF_CONFIG
+from chart_utils import plot_stock_chart
+from batch_projections import project_basket
+from market_data import bar_seconds, last_bar_stamps
+from three_d_predictions_tab import plot_3d_predictions
+
+@st.cache_data(ttl=bar_seconds("1d"), show_spinner="Projecting basket...")
+def build_basket_charts(etf_name, last_bars):
+    """
+    Fetches and projects one ETF basket and builds its 3D chart and the 2D chart of every
+    instrument. Memoized across reruns and sessions; 'last_bars' (see
+    market_data.last_bar_stamps) only keys the memo, so a new bar rebuilds the charts.
+    Returns (fig_3d, [(stock, label, fig_2d)], {stock: error message}).
+    """
+    stocks_with_labels = ETF_CONFIG[etf_name]  # Format: [{"id": ..., "label": ...}]
+
+    # Fetch and project the whole basket in parallel, then reuse it for every chart
+    basket, basket_errors = project_basket([stock["id"] for stock in stocks_with_labels], "1d",
+                                           future_points=5, num_lines=5)
+    fig_3d = plot_3d_predictions(
+        stocks_with_labels,
+        period="1y",
+        interval="1d",
+        actual_points=10,
+        pred_points=5,
+        num_pred_lines=5,
+        basket=basket
+    )
+
+    charts = []
+    for stock_data in stocks_with_labels:
+        stock = stock_data["id"]
+        if stock not in basket:
+            continue
+        # Historical data and projections were loaded with the basket
+        fig_2d = plot_stock_chart(basket[stock]["series"], basket[stock]["projections"], date_format="%d-%b-%Y")
+        charts.append((stock, stock_data["label"], fig_2d))
+    return fig_3d, charts, basket_errors
+
+def render_etf_tab():
+    """
+    Renders the ETF 3D predictions and projections. Only the selected basket is computed.
+    """
+    st.header("ETF 3D Predictions & Projections")
+    if not ETF_CONFIG:
+        st.info("No ETF baskets configured.")
+        return
+
+    etf_name = st.radio("ETF basket", list(ETF_CONFIG.keys()), horizontal=True, key="etf_basket")
+    st.subheader(f"3D Predictions for {etf_name}")
+    last_bars = last_bar_stamps([stock["id"] for stock in ETF_CONFIG[etf_name]], "1d")
+    fig_3d, charts, basket_errors = build_basket_charts(etf_name, last_bars)
+    if any(error != "No data found" for error in basket_errors.values()):
+        # Failed or timed-out fetches are retried on the next rerun instead of sticking for a day
+        build_basket_charts.clear(etf_name, last_bars)
+    for stock, error in basket_errors.items():
+        st.warning(f"Skipping {stock}: {error}")
+    st.plotly_chart(fig_3d, key=f"{etf_name}_3d_chart")
+
+    # Normal projection charts for each instrument
+    for index, (stock, label, fig_2d) in enumerate(charts):
+        st.subheader(f"Projections for {label} ({stock})")
+        # Add a unique key using stock ID + index to avoid duplicates
+        st.plotly_chart(fig_2d, key=f"{stock}_projection_{index}")
@@ -0,0 +1,190 @@
+# fetch_client.py
+import random
+import threading
+import time
+
+import pandas as pd
+
+from instrumentation import count, timed
+
+# Provider requests running at the same time, across all threads of the process
+MAX_CONCURRENCY = 4
+# Attempts per request after the first one fails
+RETRIES = 3
+# Backoff before retry n is a random delay up to min(MAX_DELAY, BASE_DELAY * 2 ** n) seconds
+BASE_DELAY = 0.5
+MAX_DELAY = 8.0
+# Seconds a request may take in total, including waiting for a slot and retries
+DEADLINE_SECONDS = 30.0
+# Symbols per multi-ticker download
+BATCH_SIZE = 20
+
+
+class FetchError(Exception):
+    """A request failed on every attempt or ran out of time."""
+
+
+def empty_history():
+    """Returns the empty frame used for symbols without data."""
+    return pd.DataFrame(columns=["Open", "High", "Low", "Close", "Volume"])
+
+
+def yfinance_history(symbol, interval, period=None, start=None, auto_adjust=False, timeout=None):
+    """
+    One symbol's history from yfinance, either for a period or from a start timestamp.
+    Network and rate-limit errors are raised so they can be retried; unknown symbols and
+    ranges without prices return an empty frame.
+    """
+    # yfinance (with requests, bs4 and lxml) is imported on the first download, not at startup
+    import yfinance as yf
+    from yfinance.exceptions import YFPricesMissingError, YFTickerMissingError
+
+    instrument = yf.Ticker(symbol)
+    try:
+        if start is not None:
+            return instrument.history(start=start, interval=interval, auto_adjust=auto_adjust, timeout=timeout,
+                                      raise_errors=True)
+        return instrument.history(period=period, interval=interval, auto_adjust=auto_adjust, timeout=timeout,
+                                  raise_errors=True)
+    except (YFPricesMissingError, YFTickerMissingError):
+        return empty_history()
+
+
+def exchange_timezone(symbol):
+    """
+    Returns the exchange timezone name of a symbol from yfinance's timezone cache, or None
+    when it is unknown. yfinance records the timezone of every symbol it downloads, so this
+    never goes to the network.
+    """
+    from yfinance.cache import get_tz_cache
+
+    return get_tz_cache().lookup(symbol) or None
+
+
+def yfinance_download(symbols, interval, period=None, start=None, auto_adjust=False, timeout=None):
+    """
+    Several symbols' histories from one yfinance multi-ticker download, shaped like
+    yfinance_history. Returns {symbol: DataFrame}; symbols without data are left out.
+    The download combines symbols of different exchanges on one UTC index, so each frame is
+    converted back to the exchange timezone the download recorded for it; frames whose
+    timezone is unknown keep the download's index.
+    """
+    import yfinance as yf
+
+    data = yf.download(list(symbols), period=None if start is not None else period, start=start,
+                       interval=interval, auto_adjust=auto_adjust, actions=True, group_by="ticker",
+                       ignore_tz=False, threads=False, progress=False, timeout=timeout)
+    frames = {}
+    if data.empty:
+        return frames
+    for symbol in symbols:
+        if symbol not in data.columns.get_level_values(0):
+            continue
+        frame = data[symbol].dropna(how="all")
+        if not frame.empty:
+            frame.columns.name = None
+            timezone = exchange_timezone(symbol)
+            if timezone and frame.index.tz is not None:
+                frame.index = frame.index.tz_convert(timezone)
+            frames[symbol] = frame
+    return frames
+
+
+class FetchClient:
+    """
+    Wraps a history provider with a process-wide concurrency limit, retries with jittered
+    exponential backoff and a deadline per request. 'history' and 'download' have the
+    signatures of yfinance_history and yfinance_download, so a local stand-in provider can
+    replace yfinance.
+    """
+
+    def __init__(self, history=yfinance_history, download=yfinance_download, max_concurrency=MAX_CONCURRENCY,
+                 retries=RETRIES, base_delay=BASE_DELAY, max_delay=MAX_DELAY, deadline=DEADLINE_SECONDS,
+                 batch_size=BATCH_SIZE, sleep=time.sleep, clock=time.monotonic, jitter=random.random):
+        self.provider_history = history
+        self.provider_download = download
+        self.retries = retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+        self.batch_size = batch_size
+        self.sleep = sleep
+        self.clock = clock
+        self.jitter = jitter
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+
+    def backoff(self, attempt):
+        """Returns the delay before retry 'attempt' (0-based): full jitter over an exponential cap."""
+        return self.jitter() * min(self.max_delay, self.base_delay * 2 ** attempt)
+
+    def _call(self, func, args, kwargs, deadline):
+        """Calls func(*args, timeout=..., **kwargs) with retries until it succeeds or 'deadline' passes."""
+        ends = self.clock() + (self.deadline if deadline is None else deadline)
+        attempt = 0
+        while True:
+            remaining = ends - self.clock()
+            if remaining <= 0 or not self._slots.acquire(timeout=remaining):
+                count("fetch_timeouts")
+                raise FetchError(f"Timed out after {attempt} attempts")
+            try:
+                count("fetch_requests")
+                return func(*args, timeout=max(ends - self.clock(), 0.1), **kwargs)
+            except Exception as exc:
+                error = exc
+            finally:
+                self._slots.release()
+
+            delay = self.backoff(attempt)
+            if attempt >= self.retries or self.clock() + delay >= ends:
+                count("fetch_failures")
+                raise FetchError(str(error) or type(error).__name__) from error
+            count("fetch_retries")
+            self.sleep(delay)
+            attempt += 1
+
+    def history(self, symbol, interval, period=None, start=None, auto_adjust=False, deadline=None):
+        """Returns one symbol's history; raises FetchError when every attempt fails."""
+        with timed("fetch_history"):
+            return self._call(self.provider_history, (symbol, interval),
+                              {'period': period, 'start': start, 'auto_adjust': auto_adjust}, deadline)
+
+    def history_many(self, symbols, interval, period=None, start=None, auto_adjust=False, deadline=None):
+        """
+        Returns ({symbol: DataFrame}, {symbol: error message}) for several symbols, fetched
+        BATCH_SIZE at a time through multi-ticker downloads. Symbols a batch does not return
+        are retried one by one; symbols without any data get an empty frame.
+        """
+        symbols = list(dict.fromkeys(symbols))
+        frames, errors = {}, {}
+        with timed("fetch_many"):
+            for first in range(0, len(symbols), self.batch_size):
+                batch = symbols[first:first + self.batch_size]
+                try:
+                    frames.update(self._call(self.provider_download, (batch, interval),
+                                             {'period': period, 'start': start, 'auto_adjust': auto_adjust},
+                                             deadline))
+                except FetchError:
+                    pass
+                for symbol in batch:
+                    if symbol in frames:
+                        continue
+                    try:
+                        frames[symbol] = self.history(symbol, interval, period, start, auto_adjust, deadline)
+                    except FetchError as exc:
+                        errors[symbol] = str(exc)
+        return frames, errors
+
+
+_fetch_client = FetchClient()
+
+
+def get_fetch_client():
+    """Returns the process-wide fetch client."""
+    return _fetch_client
+
+
+def set_fetch_client(client):
+    """Replaces the process-wide fetch client (e.g. with a local stand-in provider) and returns the old one."""
+    global _fetch_client
+    previous, _fetch_client = _fetch_client, client
+    return previous
@@ -0,0 +1,51 @@
+import streamlit as st
+from stock_options import stock_options
+from etf_config import ETF_CONFIG, all_symbols
+from change_table import basket_change_table, style_changes
+from market_data import bar_seconds, last_bar_stamps
+
+ALL_INSTRUMENTS = "Every instrument"
+PREDEFINED = "Predefined instruments"
+
+def universe_symbols(universe):
+    """Returns the symbols of a heat map universe and {symbol: label}."""
+    labels = {symbol: name for name, symbol in stock_options.items()}
+    for stocks in ETF_CONFIG.values():
+        for stock in stocks:
+            labels.setdefault(stock["id"], stock["label"])
+    if universe == PREDEFINED:
+        symbols = list(stock_options.values())
+    elif universe == ALL_INSTRUMENTS:
+        symbols = all_symbols()
+    else:
+        symbols = [stock["id"] for stock in ETF_CONFIG[universe]]
+    return symbols, labels
+
+@st.cache_data(ttl=bar_seconds("1h"), show_spinner="Loading closes...")
+def cached_change_table(universe, interval, last_bars):
+    """
+    Percentage-change table of a universe, memoized across reruns; 'last_bars' (see
+    market_data.last_bar_stamps) only keys the memo, so a new bar recomputes it.
+    """
+    symbols, labels = universe_symbols(universe)
+    return basket_change_table(symbols, interval, labels=labels)
+
+def render_heatmap_tab():
+    """
+    Renders the percentage changes of many instruments over several horizons as one
+    colored table.
+    """
+    st.header("Percentage Change Heat Map")
+    universe = st.selectbox("Instruments", [PREDEFINED, ALL_INSTRUMENTS] + list(ETF_CONFIG.keys()),
+                            key="heatmap_universe")
+    interval = st.radio("Interval", ["1wk", "1d", "1h"], index=1, horizontal=True, key="heatmap_interval")
+
+    last_bars = last_bar_stamps(universe_symbols(universe)[0], interval)
+    table, errors = cached_change_table(universe, interval, last_bars)
+    if any(error != "No data found" for error in errors.values()):
+        # Failed or timed-out fetches are retried on the next rerun
+        cached_change_table.clear(universe, interval, last_bars)
+    if errors:
+        st.warning(f"No data for {len(errors)} instruments: {', '.join(sorted(errors))}")
+    st.write(f"Change of the last close over each horizon in %, {len(table)} instruments")
+    st.dataframe(style_changes(table), height=min(35 * (len(table) + 1) + 3, 800))
@@ -0,0 +1,209 @@
+# history_archive.py
+"""
+Single-file archive of many instruments' close histories, read through memory maps.
+
+All timestamps (int64 nanoseconds, exchange wall time) and closes (float64) are stored as
+two contiguous blocks, with an offset index in a JSON header:
+
+    b"HISTARC1" | header length (uint64) | header JSON | padding | timestamps | closes
+
+The header also records when the archive was written and the UTC time of each history's
+last bar, so readers can tell a stale archive from a current one.
+
+Readers get zero-copy NumPy views into the mapped file, so every session and worker process
+opened on the same archive shares one physical copy in the page cache. Writers replace the
+file atomically; readers that still map the previous version keep a valid mapping and pick
+up the new file on their next get_archive() call.
+
+    python history_archive.py --output histories.arc --intervals 1h 1d 1wk
+"""
+import argparse
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+from instrumentation import count
+from price_series import PriceSeries
+
+MAGIC = b"HISTARC1"
+# Data blocks start on a 64-byte boundary so the mapped arrays are cache-line aligned
+ALIGNMENT = 64
+# Path of the archive the app reads histories from; unset means no archive
+ARCHIVE_PATH = os.environ.get("HISTORY_ARCHIVE") or None
+
+
+def _data_start(header_length):
+    end = len(MAGIC) + 8 + header_length
+    return -(-end // ALIGNMENT) * ALIGNMENT
+
+
+def write_archive(path, histories):
+    """
+    Writes an archive from an iterable of ((symbol, interval), history) pairs, where a
+    history is a DataFrame with a 'Close' column or a PriceSeries. The file is written
+    next to 'path' and moved into place, so readers never see a partial archive. The header
+    records when the archive was written and, for DataFrames with a timezone-aware index, the
+    UTC time of each history's last bar.
+    Returns the number of bars written.
+    """
+    entries = []
+    dates = []
+    closes = []
+    bars = 0
+    for (symbol, interval), history in histories:
+        series = history if isinstance(history, PriceSeries) else PriceSeries.from_frame(history)
+        last_bar = None
+        if not isinstance(history, PriceSeries) and len(history) and getattr(history.index, "tz", None) is not None:
+            last_bar = history.index[-1].timestamp()
+        entries.append([symbol, interval, bars, len(series), last_bar])
+        dates.append(series.dates.astype("datetime64[ns]").view(np.int64))
+        closes.append(series.closes)
+        bars += len(series)
+
+    header = json.dumps({'version': 2, 'written': time.time(), 'bars': bars, 'entries': entries}).encode()
+    data_start = _data_start(len(header))
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(MAGIC)
+        f.write(len(header).to_bytes(8, "little"))
+        f.write(header)
+        f.write(b"\0" * (data_start - f.tell()))
+        for block, dtype in ((dates, "<i8"), (closes, "<f8")):
+            for part in block:
+                f.write(np.ascontiguousarray(part, dtype=dtype).tobytes())
+    os.replace(tmp_path, path)
+    return bars
+
+
+class HistoryArchive:
+    """
+    Read-only view of an archive file. closes()/dates()/series() return zero-copy views of the
+    memory-mapped blocks; reversed_closes() is the newest-first view used by the matcher.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{path} is not a history archive")
+            header_length = int.from_bytes(f.read(8), "little")
+            header = json.loads(f.read(header_length))
+        self.bars = header['bars']
+        # Version 1 archives record neither the write time nor the last bars
+        self.written = header.get('written')
+        self._index = {(entry[0], entry[1]): (entry[2], entry[3]) for entry in header['entries']}
+        self._last_bars = {(entry[0], entry[1]): entry[4] for entry in header['entries'] if len(entry) > 4}
+        data_start = _data_start(header_length)
+        if self.bars:
+            self._dates = np.memmap(path, dtype="<i8", mode="r", offset=data_start, shape=(self.bars,))
+            self._closes = np.memmap(path, dtype="<f8", mode="r", offset=data_start + 8 * self.bars,
+                                     shape=(self.bars,))
+        else:
+            self._dates = np.empty(0, dtype="<i8")
+            self._closes = np.empty(0, dtype="<f8")
+
+    def __contains__(self, key):
+        return key in self._index
+
+    def __len__(self):
+        return len(self._index)
+
+    def last_bar_time(self, symbol, interval):
+        """Returns the UTC start of a history's last bar in epoch seconds, or None when unknown."""
+        return self._last_bars.get((symbol, interval))
+
+    def symbols(self, interval=None):
+        """Returns the archived symbols, optionally only those with a history for 'interval'."""
+        return list(dict.fromkeys(symbol for symbol, stored in self._index if interval in (None, stored)))
+
+    def _span(self, symbol, interval):
+        try:
+            offset, length = self._index[(symbol, interval)]
+        except KeyError:
+            raise KeyError(f"{symbol} {interval} is not in {self.path}") from None
+        return slice(offset, offset + length)
+
+    def closes(self, symbol, interval):
+        """Returns the closes of one history, oldest first, as a read-only view."""
+        return np.asarray(self._closes[self._span(symbol, interval)])
+
+    def reversed_closes(self, symbol, interval):
+        """Returns the closes newest first: a negative-stride view, not a copy."""
+        return self.closes(symbol, interval)[::-1]
+
+    def dates(self, symbol, interval):
+        """Returns the timestamps of one history as a read-only datetime64[ns] view."""
+        return np.asarray(self._dates[self._span(symbol, interval)]).view("datetime64[ns]")
+
+    def series(self, symbol, interval):
+        """Returns one history as a PriceSeries backed by the mapped file."""
+        count("archive_reads")
+        return PriceSeries(self.dates(symbol, interval), self.closes(symbol, interval))
+
+
+_archive = None
+_archive_stamp = None
+_archive_lock = threading.Lock()
+
+
+def get_archive(path=None):
+    """
+    Returns the process-wide HistoryArchive of 'path' (default HISTORY_ARCHIVE), or None when
+    no archive is configured or the file does not exist. The file is mapped once per process
+    and mapped again after it has been replaced.
+    """
+    global _archive, _archive_stamp
+    path = path or ARCHIVE_PATH
+    if path is None:
+        return None
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    stamp = (path, stat.st_ino, stat.st_mtime_ns)
+    with _archive_lock:
+        if stamp != _archive_stamp:
+            _archive = HistoryArchive(path)
+            _archive_stamp = stamp
+        return _archive
+
+
+def archive_histories(path, symbols, intervals):
+    """
+    Loads the default-period histories of 'symbols' through the data layer and writes them
+    to an archive. Returns (bars written, {(symbol, interval): error message}).
+    """
+    from batch_projections import fetch_basket
+
+    histories = []
+    errors = {}
+    for interval in intervals:
+        frames, failed = fetch_basket(symbols, interval)
+        histories.extend(((symbol, interval), frames[symbol]) for symbol in symbols if symbol in frames)
+        errors.update({(symbol, interval): error for symbol, error in failed.items()})
+    return write_archive(path, histories), errors
+
+
+def main(argv=None):
+    from etf_config import all_symbols
+    from data_providers import configure_from_env
+
+    parser = argparse.ArgumentParser(description="Write the histories of many instruments to one archive file.")
+    parser.add_argument("--output", default=ARCHIVE_PATH, required=ARCHIVE_PATH is None,
+                        help="Archive path (default: HISTORY_ARCHIVE)")
+    parser.add_argument("--symbols", nargs="+", help="Symbols to archive (default: stock_options and ETF_CONFIG)")
+    parser.add_argument("--intervals", nargs="+", default=["1h", "1d", "1wk"])
+    args = parser.parse_args(argv)
+    configure_from_env()
+
+    bars, errors = archive_histories(args.output, args.symbols or all_symbols(), args.intervals)
+    for (symbol, interval), error in sorted(errors.items()):
+        print(f"skipped {symbol} {interval}: {error}")
+    print(f"wrote {bars:,} bars to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+# incremental_projection.py
+import threading
+from array import array
+from collections import OrderedDict
+
+import numpy as np
+
+from projection_engine import (FORWARD_LENGTH, MIN_MATCHES, PATTERN_LENGTHS, compound_paths,
+                               forward_percentage_differences, select_matches, up_down_sequence)
+
+
+class IncrementalProjection:
+    """
+    Projection state for one series that is updated bar by bar.
+
+    For every pattern length it keeps a map from the bit-packed U/D window ending at each bar
+    to the list of bars where that window ended. Appending or replacing the last bar updates
+    those maps in O(pattern length), and a projection only touches the occurrences of the
+    current pattern, so refreshing after a new bar never rescans the full history. The results
+    are identical to projection_engine.project_closes on the same closes.
+
+    Bars that drop out of the front of the window are not removed from the maps: the state
+    keeps the index of its first bar and ignores windows that start before it, and compacts
+    itself once more than half of its buffer has dropped out.
+    """
+
+    def __init__(self, closes=(), dates=(), pattern_lengths=PATTERN_LENGTHS, forward_length=FORWARD_LENGTH,
+                 min_matches=MIN_MATCHES):
+        self.pattern_lengths = tuple(pattern_lengths)
+        self.forward_length = forward_length
+        self.min_matches = min_matches
+        closes = np.asarray(closes, dtype=np.float64)
+        self._reset(closes, list(dates) if len(dates) else [None] * len(closes))
+
+    def __len__(self):
+        return self._size - self._first
+
+    @property
+    def closes(self):
+        """Oldest-first closes as a view of the internal buffer."""
+        return self._closes[self._first:self._size]
+
+    @property
+    def dates(self):
+        return self._dates[self._first:]
+
+    def _reset(self, closes, dates):
+        self._first = 0
+        self._closes = np.empty(max(len(closes) * 2, 64), dtype=np.float64)
+        self._closes[:len(closes)] = closes
+        self._size = len(closes)
+        self._dates = dates
+        self._signs = bytearray(up_down_sequence(closes).tobytes())
+        self._windows = {length: {} for length in self.pattern_lengths}
+
+        # Bulk-build the window maps with one vectorized pass per pattern length
+        signs = np.frombuffer(bytes(self._signs), dtype=np.uint8).astype(np.int64)
+        for length in self.pattern_lengths:
+            if len(signs) < length:
+                continue
+            weights = np.left_shift(1, np.arange(length - 1, -1, -1, dtype=np.int64))
+            codes = np.lib.stride_tricks.sliding_window_view(signs, length) @ weights
+            order = np.argsort(codes, kind="stable")
+            sorted_codes = codes[order]
+            bounds = np.flatnonzero(np.diff(sorted_codes)) + 1
+            ends = order + length - 1
+            windows = self._windows[length]
+            for group in np.split(np.arange(len(order)), bounds):
+                windows[int(sorted_codes[group[0]])] = array("q", ends[group].tolist())
+
+    def _window_code(self, length):
+        """Bit-packed window of the last 'length' signs, newest sign in the lowest bit."""
+        code = 0
+        for shift, sign in enumerate(reversed(self._signs[-length:])):
+            code |= sign << shift
+        return code
+
+    def append(self, close, date=None):
+        """Adds a new bar."""
+        if self._size == len(self._closes):
+            grown = np.empty(len(self._closes) * 2, dtype=np.float64)
+            grown[:self._size] = self._closes[:self._size]
+            self._closes = grown
+        self._closes[self._size] = close
+        self._size += 1
+        self._dates.append(date)
+        if self._size < 2:
+            return
+        self._signs.append(1 if close >= self._closes[self._size - 2] else 0)
+        end = len(self._signs) - 1
+        for length in self.pattern_lengths:
+            if len(self._signs) >= length:
+                self._windows[length].setdefault(self._window_code(length), array("q")).append(end)
+
+    def replace_last(self, close, date=None):
+        """Replaces the last bar, e.g. when a bar that was still forming has closed."""
+        if len(self) == 0:
+            raise IndexError("replace_last on an empty projection state")
+        if self._size >= 2:
+            for length in self.pattern_lengths:
+                if len(self._signs) >= length:
+                    code = self._window_code(length)
+                    ends = self._windows[length][code]
+                    ends.pop()
+                    if not ends:
+                        del self._windows[length][code]
+            self._signs.pop()
+        self._size -= 1
+        last_date = self._dates.pop()
+        self.append(close, last_date if date is None else date)
+
+    def drop_before(self, first):
+        """Drops the bars before logical index 'first' from the front of the window."""
+        self._first += first
+        if self._first > len(self._dates) // 2:
+            self._reset(self.closes.copy(), self.dates)
+
+    def sync(self, series):
+        """
+        Brings the state up to date with a PriceSeries (or any object with aligned oldest-first
+        'dates' and 'closes'): bars that left the front of the series are dropped, the current
+        last bar is refreshed and newer bars are appended. The state is rebuilt when the series
+        does not continue it, e.g. when it starts earlier or its first close changed (a split).
+        """
+        dates = np.asarray(series.dates)
+        closes = np.asarray(series.closes, dtype=np.float64)
+        if len(self) == 0 or len(dates) == 0:
+            self._reset(closes, list(dates))
+            return
+        position = int(np.searchsorted(dates, self._dates[-1]))
+        if position == len(dates) or dates[position] != self._dates[-1]:
+            self._reset(closes, list(dates))
+            return
+        # The series' first bar is this many bars into the current window
+        first = len(self) - 1 - position
+        if first < 0 or self._dates[self._first + first] != dates[0] or self.closes[first] != closes[0]:
+            self._reset(closes, list(dates))
+            return
+        if first:
+            self.drop_before(first)
+        if closes[position] != self._closes[self._size - 1]:
+            self.replace_last(closes[position], dates[position])
+        for date, close in zip(dates[position + 1:], closes[position + 1:]):
+            self.append(close, date)
+
+    def occurrences(self, length):
+        """Newest-first positions of the current pattern of the given length (see pattern_occurrences)."""
+        if len(self._signs) - self._first < length:
+            return np.empty(0, dtype=np.intp)
+        ends = np.array(self._windows[length].get(self._window_code(length), ()), dtype=np.intp)
+        # Windows starting before the first bar of the window belong to dropped bars
+        ends = ends[ends >= self._first + length - 1]
+        return len(self._signs) - 1 - ends[::-1]
+
+    def project(self, future_points=10, num_lines=5):
+        """Returns (match_indices, paths) like projection_engine.project_closes."""
+        occurrences = ((length, self.occurrences(length)) for length in self.pattern_lengths)
+        positions, _ = select_matches(occurrences, min_matches=self.min_matches, limit=num_lines)
+        rev_closes = self.closes[::-1]
+        steps = min(future_points, self.forward_length)
+        pct = forward_percentage_differences(rev_closes, positions, self.forward_length)[:, :steps]
+        paths = compound_paths(rev_closes[0], pct / 100)
+        return len(self) - 1 - positions, paths
+
+
+# Series kept up to date bar by bar, least recently used first
+MAX_STATES = 256
+_states = OrderedDict()
+_states_lock = threading.Lock()
+
+
+def incremental_projection(symbol, interval, series, future_points=10, num_lines=5):
+    """
+    Returns project_closes(series.closes, future_points, num_lines) from the incremental state
+    of a symbol, syncing the state with 'series' (a PriceSeries) first. Only bars that changed
+    since the last call are processed, so refreshing after each hourly bar stays cheap.
+    """
+    with _states_lock:
+        entry = _states.get((symbol, interval))
+        if entry is None:
+            entry = _states[(symbol, interval)] = (IncrementalProjection(), threading.Lock())
+        _states.move_to_end((symbol, interval))
+        while len(_states) > MAX_STATES:
+            _states.popitem(last=False)
+    state, lock = entry
+    with lock:
+        state.sync(series)
+        return state.project(future_points, num_lines)
+
+
+def clear_states():
+    """Drops every incremental state (e.g. before timing a cold projection)."""
+    with _states_lock:
+        _states.clear()
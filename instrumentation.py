@@ -0,0 +1,141 @@
+# instrumentation.py
+import functools
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Collection is off unless PIPELINE_METRICS is set; set_enabled() switches it at runtime
+_enabled = os.environ.get("PIPELINE_METRICS", "") not in ("", "0", "false", "False")
+_lock = threading.Lock()
+_timers = {}
+_counters = {}
+
+
+class _NullTimer:
+    """Returned by timed() while collection is off."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class _Timer:
+    __slots__ = ("stage", "started")
+
+    def __init__(self, stage):
+        self.stage = stage
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        record_time(self.stage, time.perf_counter() - self.started)
+        return False
+
+
+def enabled():
+    return _enabled
+
+
+def set_enabled(flag):
+    """Turns collection on or off and returns the previous setting."""
+    global _enabled
+    previous = _enabled
+    _enabled = bool(flag)
+    return previous
+
+
+def record_time(stage, seconds):
+    """Adds one timed call of 'stage'."""
+    with _lock:
+        stats = _timers.get(stage)
+        if stats is None:
+            _timers[stage] = [1, seconds, seconds, seconds]
+        else:
+            stats[0] += 1
+            stats[1] += seconds
+            stats[2] = max(stats[2], seconds)
+            stats[3] = seconds
+
+
+def timed(stage):
+    """
+    Context manager timing a block as 'stage':
+
+        with timed("download"):
+            ...
+
+    While collection is off it returns a shared no-op object, so disabled timers cost one
+    function call and a flag check.
+    """
+    return _Timer(stage) if _enabled else _NULL_TIMER
+
+
+def instrumented(stage):
+    """Decorator timing every call of a function as 'stage' (see timed)."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                record_time(stage, time.perf_counter() - started)
+        return wrapper
+    return decorator
+
+
+def count(name, value=1):
+    """Adds 'value' to a counter such as bars or bytes fetched; a no-op while collection is off."""
+    if not _enabled:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+
+def snapshot():
+    """
+    Returns the collected metrics as
+        {'timers': {stage: {'calls', 'total', 'mean', 'max', 'last'}}, 'counters': {name: value}}
+    with times in seconds.
+    """
+    with _lock:
+        timers = {
+            stage: {'calls': calls, 'total': total, 'mean': total / calls, 'max': longest, 'last': last}
+            for stage, (calls, total, longest, last) in _timers.items()
+        }
+        return {'timers': timers, 'counters': dict(_counters)}
+
+
+def reset():
+    """Drops every collected timer and counter."""
+    with _lock:
+        _timers.clear()
+        _counters.clear()
+
+
+def dump(path=None):
+    """
+    Returns the snapshot as one JSON line, logs it at INFO level on this module's logger and,
+    when 'path' is given, appends it to that file.
+    """
+    metrics = snapshot()
+    metrics['time'] = time.time()
+    line = json.dumps(metrics, sort_keys=True)
+    logger.info(line)
+    if path is not None:
+        with open(path, "a") as f:
+            f.write(line + "\n")
+    return line
@@ -0,0 +1,234 @@
+# market_data.py
+import threading
+import time
+from concurrent.futures import Future
+
+from ohlc_store import default_period, load_history, period_start, prefetch_histories, slice_period
+
+# Cached histories live for one bar of their interval
+BAR_SECONDS = {
+    "1m": 60,
+    "2m": 120,
+    "5m": 300,
+    "15m": 900,
+    "30m": 1800,
+    "60m": 3600,
+    "90m": 5400,
+    "1h": 3600,
+    "1d": 86400,
+    "5d": 5 * 86400,
+    "1wk": 7 * 86400,
+    "1mo": 30 * 86400,
+    "3mo": 90 * 86400,
+}
+
+
+def bar_seconds(interval):
+    """Returns the length of one bar of an interval in seconds."""
+    return BAR_SECONDS.get(interval, 86400)
+
+
+def adjust_prices(df):
+    """
+    Returns a copy of an unadjusted history with Open/High/Low/Close scaled by the
+    'Adj Close' ratio, which is what yfinance's auto_adjust=True produces.
+    """
+    if "Adj Close" not in df.columns:
+        return df.copy()
+    ratio = df["Adj Close"] / df["Close"]
+    adjusted = df.drop(columns=["Adj Close"])
+    for column in ("Open", "High", "Low", "Close"):
+        if column in adjusted.columns:
+            adjusted[column] = df[column] * ratio
+    return adjusted
+
+
+class _Entry:
+    __slots__ = ("frame", "period", "expires")
+
+    def __init__(self, frame, period, expires):
+        self.frame = frame
+        self.period = period
+        self.expires = expires
+
+
+class MarketData:
+    """
+    In-process data layer shared by every tab.
+
+    Each (symbol, interval) history is loaded once from the OHLC store and kept for one bar
+    of its interval. Concurrent callers asking for the same history share a single in-flight
+    load, and adjusted prices are derived from the same unadjusted download.
+    """
+
+    def __init__(self, loader=load_history, clock=time.monotonic, prefetcher=None):
+        self.loader = loader
+        self.clock = clock
+        self.prefetcher = prefetcher
+        self._entries = {}
+        self._inflight = {}
+        self._lock = threading.Lock()
+        # Bumped whenever a cached history is replaced or dropped; keys the last-bar memo
+        self._generation = 0
+        self._stamps = {}
+
+    def history(self, symbol, interval, period=None, auto_adjust=False):
+        """Returns the history of a symbol for 'period' (defaults to the app's period)."""
+        period = default_period(interval) if period is None else period
+        frame = self._load(symbol, interval, period)
+        frame = slice_period(frame, period)
+        return adjust_prices(frame) if auto_adjust else frame.copy(deep=False)
+
+    def invalidate(self, symbol=None, interval=None):
+        """Drops cached histories, optionally only those of one symbol and/or interval."""
+        with self._lock:
+            for key in list(self._entries):
+                if (symbol is None or key[0] == symbol) and (interval is None or key[1] == interval):
+                    del self._entries[key]
+            self._generation += 1
+
+    def prefetch(self, symbols, interval, period=None):
+        """
+        Lets the prefetcher (e.g. ohlc_store.prefetch_histories) batch-download the histories
+        of 'symbols' that are not cached yet, so the following history() calls read them
+        from the store. Returns {symbol: error message}.
+        """
+        if self.prefetcher is None:
+            return {}
+        period = default_period(interval) if period is None else period
+        now = self.clock()
+        missing = []
+        with self._lock:
+            for symbol in dict.fromkeys(symbols):
+                entry = self._entries.get((symbol, interval))
+                if entry is None or entry.expires <= now or not _covers(entry, period):
+                    missing.append(symbol)
+        if not missing:
+            return {}
+        return self.prefetcher(missing, interval, period=_longer_period(period, default_period(interval)))
+
+    def refresh(self, symbol, interval):
+        """
+        Reloads a history from the store and replaces the cached one. Readers keep getting the
+        previous history until the new one is in place, so a refresh never blocks them.
+        Returns the reloaded frame.
+        """
+        key = (symbol, interval)
+        with self._lock:
+            entry = self._entries.get(key)
+        load_period = default_period(interval)
+        if entry is not None:
+            load_period = _longer_period(load_period, entry.period)
+        frame = self.loader(symbol, interval, period=load_period)
+        if not frame.empty:
+            with self._lock:
+                self._entries[key] = _Entry(frame, load_period, self.clock() + bar_seconds(interval))
+                self._generation += 1
+        return frame
+
+    def last_bar_stamps(self, symbols, interval, period=None):
+        """
+        Returns ((symbol, last bar timestamp), ...) of the histories of 'symbols', to key
+        memoized views on (an empty history gives '' and a failed load None). The stamps are
+        kept for one bar, until a cached history is replaced (e.g. by the precompute
+        scheduler) or dropped, so reruns do not walk every history again.
+        """
+        symbols = tuple(dict.fromkeys(symbols))
+        key = (symbols, interval, period)
+        with self._lock:
+            memo = self._stamps.get(key)
+            generation = self._generation
+            if memo is not None and memo[0] == generation and memo[1] > self.clock():
+                return memo[2]
+        self.prefetch(symbols, interval, period)
+        stamps = []
+        for symbol in symbols:
+            try:
+                frame = self.history(symbol, interval, period=period)
+            except Exception:
+                stamps.append((symbol, None))
+                continue
+            stamps.append((symbol, str(frame.index[-1]) if len(frame) else ""))
+        stamps = tuple(stamps)
+        # A failed load is retried on the next call. The loads made here bumped the generation,
+        # so the first memo is only trusted once a second walk found every history cached
+        if all(stamp is not None for _, stamp in stamps):
+            with self._lock:
+                self._stamps[key] = (generation, self.clock() + bar_seconds(interval), stamps)
+        return stamps
+
+    def _load(self, symbol, interval, period):
+        key = (symbol, interval)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires > self.clock() and _covers(entry, period):
+                return entry.frame
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._inflight[key] = future
+        if not owner:
+            return future.result()
+
+        try:
+            # Load at least the app's default period so shorter requests never trigger a second download
+            load_period = _longer_period(period, default_period(interval))
+            if entry is not None:
+                load_period = _longer_period(load_period, entry.period)
+            frame = self.loader(symbol, interval, period=load_period)
+            if not frame.empty:
+                with self._lock:
+                    self._entries[key] = _Entry(frame, load_period, self.clock() + bar_seconds(interval))
+                    self._generation += 1
+            future.set_result(frame)
+            return frame
+        except BaseException as exc:
+            future.set_exception(exc)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+
+def _covers(entry, period):
+    if entry.frame.empty:
+        return False
+    last = entry.frame.index[-1]
+    cached_start = period_start(entry.period, now=last)
+    if cached_start is None:
+        return True
+    requested_start = period_start(period, now=last)
+    return requested_start is not None and requested_start >= cached_start
+
+
+def _longer_period(first, second):
+    first_start, second_start = period_start(first), period_start(second)
+    if first_start is None or (second_start is not None and first_start <= second_start):
+        return first
+    return second
+
+
+_market_data = MarketData(prefetcher=prefetch_histories)
+
+
+def get_market_data():
+    """Returns the process-wide data layer."""
+    return _market_data
+
+
+def set_market_data(market_data):
+    """Replaces the process-wide data layer (e.g. with one reading a seeded store) and returns the old one."""
+    global _market_data
+    previous, _market_data = _market_data, market_data
+    return previous
+
+
+def get_history(symbol, interval, period=None, auto_adjust=False):
+    """Returns the history of a symbol through the process-wide data layer."""
+    return _market_data.history(symbol, interval, period=period, auto_adjust=auto_adjust)
+
+
+def last_bar_stamps(symbols, interval, period=None):
+    """Returns MarketData.last_bar_stamps of the process-wide data layer."""
+    return _market_data.last_bar_stamps(symbols, interval, period)
@@ -0,0 +1,286 @@
+# ohlc_store.py
+import json
+import logging
+import os
+import re
+import threading
+import time
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from fetch_client import get_fetch_client
+from instrumentation import count, timed
+
+STORE_DIR = os.environ.get("OHLC_STORE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".ohlc_store"))
+# When set, the store never goes to the network and only serves what is already on disk
+OFFLINE = os.environ.get("OHLC_STORE_OFFLINE", "") not in ("", "0", "false", "False")
+# Seconds after a successful fetch during which a history is served without asking for newer bars
+MIN_REFRESH_SECONDS = 60
+
+_METADATA_KEY = b"ohlc_store"
+
+logger = logging.getLogger(__name__)
+
+
+def default_period(interval):
+    """Returns the history length the app uses for an interval."""
+    return "1y" if interval == "1h" else "5y" if interval == "1d" else "max"
+
+
+def period_start(period, now=None):
+    """
+    Returns the first timestamp covered by a yfinance-style period string ('5d', '6mo',
+    '1y', 'ytd', ...) relative to 'now', or None for 'max'.
+    """
+    now = pd.Timestamp.now(tz="UTC") if now is None else now
+    if period == "max":
+        return None
+    if period == "ytd":
+        return pd.Timestamp(year=now.year, month=1, day=1, tz=now.tz)
+    match = re.fullmatch(r"(\d+)(d|wk|mo|y)", period)
+    if not match:
+        raise ValueError(f"Unsupported period: {period}")
+    count, unit = int(match.group(1)), match.group(2)
+    if unit == "d":
+        return now - pd.DateOffset(days=count)
+    if unit == "wk":
+        return now - pd.DateOffset(weeks=count)
+    if unit == "mo":
+        return now - pd.DateOffset(months=count)
+    return now - pd.DateOffset(years=count)
+
+
+def download_history(symbol, interval, period=None, start=None, auto_adjust=False):
+    """
+    Downloads OHLC history through the process-wide fetch client (yfinance with retries and
+    a concurrency limit), either for a period or from a start timestamp.
+    """
+    with timed("download"):
+        df = get_fetch_client().history(symbol, interval, period=period, start=start, auto_adjust=auto_adjust)
+    count("downloads")
+    count("bars_fetched", len(df))
+    count("bytes_fetched", int(df.memory_usage(index=True).sum()))
+    return df
+
+
+def download_histories(symbols, interval, period=None, start=None, auto_adjust=False):
+    """
+    Downloads several histories through the fetch client's multi-ticker batches.
+    Returns ({symbol: DataFrame}, {symbol: error message}).
+    """
+    frames, errors = get_fetch_client().history_many(symbols, interval, period=period, start=start,
+                                                     auto_adjust=auto_adjust)
+    count("downloads", len(frames))
+    count("bars_fetched", sum(len(df) for df in frames.values()))
+    count("bytes_fetched", sum(int(df.memory_usage(index=True).sum()) for df in frames.values()))
+    return frames, errors
+
+
+class OHLCStore:
+    """
+    On-disk Parquet store of OHLC histories keyed by symbol, interval and adjustment.
+
+    Each history is fetched in full once; later reads only download the bars from the last
+    stored timestamp onwards (the last bar may still have been forming) and merge them in.
+    With offline=True the store only serves what is on disk, so a pre-seeded store works
+    without network access.
+    """
+
+    def __init__(self, root=STORE_DIR, offline=OFFLINE, fetch=download_history, fetch_many=download_histories,
+                 min_refresh=MIN_REFRESH_SECONDS, clock=time.monotonic):
+        self.root = root
+        self.offline = offline
+        self.fetch = fetch
+        self.fetch_many = fetch_many
+        self.min_refresh = min_refresh
+        self.clock = clock
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+        self._fetched = {}
+
+    def _recently_fetched(self, path):
+        fetched = self._fetched.get(path)
+        return fetched is not None and self.clock() - fetched < self.min_refresh
+
+    def path(self, symbol, interval, auto_adjust=False):
+        """Returns the Parquet file used for a symbol/interval."""
+        safe_symbol = re.sub(r"[^A-Za-z0-9._=-]", "_", symbol)
+        suffix = "adj" if auto_adjust else "raw"
+        return os.path.join(self.root, interval, f"{safe_symbol}.{suffix}.parquet")
+
+    def _lock(self, key):
+        with self._locks_guard:
+            return self._locks.setdefault(key, threading.Lock())
+
+    def read(self, symbol, interval, auto_adjust=False):
+        """Returns (DataFrame, metadata) for a stored history, or (None, None) if it is missing."""
+        path = self.path(symbol, interval, auto_adjust)
+        if not os.path.exists(path):
+            return None, None
+        table = pq.read_table(path, memory_map=True)
+        metadata = json.loads((table.schema.metadata or {}).get(_METADATA_KEY, b"{}"))
+        return table.to_pandas(), metadata
+
+    def write(self, symbol, interval, df, auto_adjust=False, start=None):
+        """
+        Stores a history. 'start' is the earliest timestamp the history is known to cover
+        (None means the full available history); it decides whether a longer period must
+        be downloaded again later.
+        """
+        path = self.path(symbol, interval, auto_adjust)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        table = pa.Table.from_pandas(df)
+        metadata = dict(table.schema.metadata or {})
+        metadata[_METADATA_KEY] = json.dumps({"start": None if start is None else start.isoformat()}).encode()
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        pq.write_table(table.replace_schema_metadata(metadata), tmp_path)
+        os.replace(tmp_path, path)
+
+    def _store_fetched(self, symbol, interval, auto_adjust, fresh, start):
+        self.write(symbol, interval, fresh, auto_adjust, start)
+        self._fetched[self.path(symbol, interval, auto_adjust)] = self.clock()
+        return fresh
+
+    def history(self, symbol, interval, period=None, auto_adjust=False):
+        """
+        Returns the history of a symbol for 'period' (defaults to the app's period for the
+        interval), refreshing the stored copy incrementally first.
+        """
+        period = default_period(interval) if period is None else period
+        with self._lock(self.path(symbol, interval, auto_adjust)):
+            df, metadata = self.read(symbol, interval, auto_adjust)
+            if not self.offline:
+                df = self._refresh(symbol, interval, period, auto_adjust, df, metadata)
+        if df is None:
+            return pd.DataFrame(columns=["Open", "High", "Low", "Close", "Volume"])
+        return slice_period(df, period)
+
+    def _refresh(self, symbol, interval, period, auto_adjust, df, metadata):
+        requested_start = period_start(period)
+        if df is None or df.empty or not _covers(metadata, requested_start):
+            try:
+                fresh = self.fetch(symbol, interval, period=period, auto_adjust=auto_adjust)
+            except Exception:
+                if df is None or df.empty:
+                    raise
+                # Serve the shorter stored copy rather than nothing
+                logger.warning("Fetching %s %s failed, serving the stored history", symbol, interval, exc_info=True)
+                return df
+            if fresh.empty:
+                return df
+            return self._store_fetched(symbol, interval, auto_adjust, fresh, requested_start)
+
+        if self._recently_fetched(self.path(symbol, interval, auto_adjust)):
+            return df
+        try:
+            newer = self.fetch(symbol, interval, start=df.index[-1], auto_adjust=auto_adjust)
+        except Exception:
+            # Serve the stored copy when the incremental refresh fails
+            logger.warning("Refreshing %s %s failed, serving the stored history", symbol, interval, exc_info=True)
+            return df
+        if newer.empty:
+            return df
+        return self._store_fetched(symbol, interval, auto_adjust, _merge(df, newer), _stored_start(metadata))
+
+    def prefetch(self, symbols, interval, period=None, auto_adjust=False):
+        """
+        Brings several stored histories up to date with multi-ticker downloads: one batch for
+        the symbols that need a full history and one, starting at the oldest last bar, for
+        those that only need newer bars. Histories fetched within min_refresh seconds are
+        skipped. Returns {symbol: error message} for symbols that could not be fetched.
+        """
+        if self.offline:
+            return {}
+        period = default_period(interval) if period is None else period
+        requested_start = period_start(period)
+        full, stored = [], {}
+        for symbol in dict.fromkeys(symbols):
+            if self._recently_fetched(self.path(symbol, interval, auto_adjust)):
+                continue
+            df, metadata = self.read(symbol, interval, auto_adjust)
+            if df is None or df.empty or not _covers(metadata, requested_start):
+                full.append(symbol)
+            else:
+                stored[symbol] = (df, metadata)
+
+        errors = {}
+        if full:
+            frames, batch_errors = self.fetch_many(full, interval, period=period, auto_adjust=auto_adjust)
+            errors.update(batch_errors)
+            for symbol, fresh in frames.items():
+                if not fresh.empty:
+                    with self._lock(self.path(symbol, interval, auto_adjust)):
+                        self._store_fetched(symbol, interval, auto_adjust, fresh, requested_start)
+        if stored:
+            start = min(df.index[-1] for df, _ in stored.values())
+            frames, batch_errors = self.fetch_many(list(stored), interval, start=start, auto_adjust=auto_adjust)
+            errors.update(batch_errors)
+            for symbol, newer in frames.items():
+                df, metadata = stored[symbol]
+                with self._lock(self.path(symbol, interval, auto_adjust)):
+                    if newer.empty:
+                        self._fetched[self.path(symbol, interval, auto_adjust)] = self.clock()
+                    else:
+                        self._store_fetched(symbol, interval, auto_adjust, _merge(df, newer),
+                                           _stored_start(metadata))
+        return errors
+
+
+def _merge(df, newer):
+    """
+    Replaces the stored bars from the first newer bar onwards (the last one may have been
+    forming). The stored bars are converted to the timezone of the newer ones, so a history
+    never mixes timezones.
+    """
+    if df.index.tz is not None and newer.index.tz is not None and str(df.index.tz) != str(newer.index.tz):
+        df = df.tz_convert(newer.index.tz)
+    merged = pd.concat([df[df.index < newer.index[0]], newer])
+    return merged[~merged.index.duplicated(keep="last")]
+
+
+def _stored_start(metadata):
+    start = (metadata or {}).get("start")
+    return None if start is None else pd.Timestamp(start)
+
+
+def _covers(metadata, requested_start):
+    if metadata is None:
+        return False
+    stored_start = _stored_start(metadata)
+    if stored_start is None:
+        return True
+    return requested_start is not None and requested_start >= stored_start
+
+
+def slice_period(df, period):
+    """
+    Returns the rows of a history that fall within 'period'. Periods are measured back from
+    the last bar rather than from now, so pre-seeded stores slice sensibly.
+    """
+    if df.empty:
+        return df
+    start = period_start(period, now=df.index[-1])
+    return df if start is None else df[df.index >= start]
+
+
+_default_store = None
+
+
+def get_store():
+    """Returns the process-wide store."""
+    global _default_store
+    if _default_store is None:
+        _default_store = OHLCStore()
+    return _default_store
+
+
+def load_history(symbol, interval, period=None, auto_adjust=False):
+    """Returns the history of a symbol from the process-wide store."""
+    return get_store().history(symbol, interval, period=period, auto_adjust=auto_adjust)
+
+
+def prefetch_histories(symbols, interval, period=None, auto_adjust=False):
+    """Batch-refreshes several histories of the process-wide store (see OHLCStore.prefetch)."""
+    return get_store().prefetch(symbols, interval, period=period, auto_adjust=auto_adjust)
@@ -0,0 +1,226 @@
+# parameter_sweep.py
+"""
+Backtests a grid of model parameters (pattern lengths, forward window, future_points and
+num_lines) over many symbols and intervals on a process pool and ranks the grid points.
+
+    python parameter_sweep.py --intervals 1wk 1d --pattern-lengths 8,7,6 10,9,8 --num-lines 3 5 10
+
+Each worker loads a symbol's history and builds its pattern index once per interval. For
+every set of pattern lengths it runs one walk-forward with the largest num_lines and
+horizon of the grid; smaller settings are prefixes of that run (matches are kept in order
+and paths compound step by step), so the other grid points are sliced from it and scored
+without searching again. Projections only cover min(future_points, forward_length) steps,
+so grid points with the same value score alike.
+"""
+import argparse
+import itertools
+import json
+import os
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+from backtest_engine import score_walk_forward, walk_forward
+from batch_runner import DEFAULT_OFFSETS
+from data_providers import configure_from_env
+from data_utils import get_price_series
+from etf_config import all_symbols
+from pattern_index import get_pattern_index
+from projection_engine import FORWARD_LENGTH, PATTERN_LENGTHS
+
+DEFAULT_PATTERN_SETS = (PATTERN_LENGTHS, (7, 6, 5), (6, 5, 4), (10, 9, 8), (12, 10, 8))
+DEFAULT_FORWARD_LENGTHS = (5, FORWARD_LENGTH)
+DEFAULT_FUTURE_POINTS = (5, 10)
+DEFAULT_NUM_LINES = (3, 5, 10)
+GRID_COLUMNS = ['pattern_lengths', 'forward_length', 'future_points', 'num_lines']
+SCORE_COLUMNS = ['cutoffs', 'coverage', 'hit_rate', 'mae', 'rmse', 'spread']
+# Ranking metric -> True when higher is better
+RANK_METRICS = {'hit_rate': True, 'mae': False, 'rmse': False, 'coverage': True}
+
+
+def parameter_grid(pattern_sets=DEFAULT_PATTERN_SETS, forward_lengths=DEFAULT_FORWARD_LENGTHS,
+                   future_points=DEFAULT_FUTURE_POINTS, num_lines=DEFAULT_NUM_LINES):
+    """Returns every combination of the parameters as dicts with GRID_COLUMNS keys."""
+    return [dict(zip(GRID_COLUMNS, (tuple(lengths), forward, points, lines)))
+            for lengths, forward, points, lines in itertools.product(pattern_sets, forward_lengths,
+                                                                     future_points, num_lines)]
+
+
+def slice_result(result, forward_length, future_points, num_lines):
+    """
+    Cuts the walk_forward result of a larger forward window, horizon and num_lines down to
+    one grid point; equal to running walk_forward with these parameters.
+    """
+    steps = min(future_points, forward_length)
+    return {
+        'cutoffs': result['cutoffs'],
+        'match_indices': result['match_indices'][:, :num_lines],
+        'predicted': result['predicted'][:, :num_lines, :steps + 1],
+        'actual': result['actual'][:, :future_points + 1],
+    }
+
+
+def summarize_scores(scores):
+    """Averages the per-cut-off arrays of score_walk_forward into one row of SCORE_COLUMNS."""
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        return {
+            'cutoffs': int(np.count_nonzero(~np.isnan(scores['hit_rate']))),
+            'coverage': float(np.mean(scores['matches'] > 0)) if len(scores['matches']) else np.nan,
+            'hit_rate': float(np.nanmean(scores['hit_rate'])),
+            'mae': float(np.nanmean(scores['mae'])),
+            'rmse': float(np.nanmean(scores['rmse'])),
+            'spread': float(np.nanmean(scores['spread'])),
+        }
+
+
+def sweep_series(closes, grid, offsets=DEFAULT_OFFSETS, index=None):
+    """
+    Scores every grid point on one oldest-first close array, backtested at 'offsets'.
+    Returns one dict per grid point with GRID_COLUMNS and SCORE_COLUMNS.
+    """
+    closes = np.ascontiguousarray(closes, dtype=np.float64)
+    offsets = np.asarray(offsets, dtype=np.intp)
+    cutoffs = len(closes) - offsets[offsets < len(closes)]
+    index = get_pattern_index(closes) if index is None else index
+    rows = []
+    for lengths, points in itertools.groupby(sorted(grid, key=lambda point: point['pattern_lengths']),
+                                             key=lambda point: point['pattern_lengths']):
+        points = list(points)
+        result = walk_forward(closes, cutoffs, future_points=max(point['future_points'] for point in points),
+                              num_lines=max(point['num_lines'] for point in points), pattern_lengths=lengths,
+                              forward_length=max(point['forward_length'] for point in points), index=index)
+        for point in points:
+            scores = score_walk_forward(slice_result(result, point['forward_length'], point['future_points'],
+                                                     point['num_lines']))
+            rows.append({**point, **summarize_scores(scores)})
+    return rows
+
+
+def sweep_symbol(symbol, intervals, grid, offsets=DEFAULT_OFFSETS):
+    """
+    Loads one symbol's history per interval and sweeps the grid on it.
+    Returns (rows, errors): rows carry 'symbol' and 'interval', errors maps interval to a message.
+    """
+    # Worker processes apply DATA_PROVIDER themselves
+    configure_from_env()
+    rows, errors = [], {}
+    for interval in intervals:
+        try:
+            closes = get_price_series(symbol, interval).closes
+            if not len(closes):
+                errors[interval] = "No data found"
+                continue
+            rows.extend({'symbol': symbol, 'interval': interval, **row}
+                        for row in sweep_series(closes, grid, offsets))
+        except Exception as exc:
+            errors[interval] = str(exc) or type(exc).__name__
+    return rows, errors
+
+
+def rank_parameters(results, by='hit_rate'):
+    """
+    Averages the per-series rows of a sweep per grid point and ranks the grid points by
+    'by' (see RANK_METRICS), breaking ties by the mean absolute error.
+    """
+    grouped = results.groupby(GRID_COLUMNS, sort=False)
+    ranking = grouped[['coverage', 'hit_rate', 'mae', 'rmse', 'spread']].mean()
+    ranking.insert(0, 'cutoffs', grouped['cutoffs'].sum())
+    ranking.insert(0, 'series', grouped['symbol'].count())
+    ranking = ranking.reset_index()
+    keys = list(dict.fromkeys([by, 'mae']))
+    ranking = ranking.sort_values(keys, ascending=[not RANK_METRICS[key] for key in keys], na_position='last',
+                                  kind='stable', ignore_index=True)
+    ranking.insert(0, 'rank', np.arange(1, len(ranking) + 1))
+    return ranking.round(3)
+
+
+def run_sweep(symbols, intervals, grid, offsets=DEFAULT_OFFSETS, workers=None, rank_by='hit_rate',
+              output_dir=None):
+    """
+    Runs sweep_symbol for every symbol on a process pool. Returns (ranking, results, metadata);
+    with output_dir, writes sweep.parquet (per-series rows), ranking.csv and sweep.json.
+    """
+    started = time.monotonic()
+    rows, errors = [], {}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(sweep_symbol, symbol, intervals, grid, list(offsets)): symbol
+                   for symbol in symbols}
+        for future in as_completed(futures):
+            symbol = futures[future]
+            try:
+                symbol_rows, symbol_errors = future.result()
+            except Exception as exc:
+                errors[symbol] = {interval: str(exc) or type(exc).__name__ for interval in intervals}
+                continue
+            rows.extend(symbol_rows)
+            if symbol_errors:
+                errors[symbol] = symbol_errors
+
+    results = pd.DataFrame(rows, columns=['symbol', 'interval'] + GRID_COLUMNS + SCORE_COLUMNS)
+    ranking = rank_parameters(results, rank_by)
+    metadata = {
+        'generated_at': datetime.now(timezone.utc).isoformat(),
+        'seconds': round(time.monotonic() - started, 3),
+        'symbols': len(symbols),
+        'intervals': list(intervals),
+        'grid_points': len(grid),
+        'offsets': [int(offset) for offset in offsets],
+        'rank_by': rank_by,
+        'errors': errors,
+    }
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+        stored = results.assign(pattern_lengths=results['pattern_lengths'].map(_format_lengths))
+        stored.to_parquet(os.path.join(output_dir, "sweep.parquet"), index=False)
+        ranking.assign(pattern_lengths=ranking['pattern_lengths'].map(_format_lengths)).to_csv(
+            os.path.join(output_dir, "ranking.csv"), index=False)
+        with open(os.path.join(output_dir, "sweep.json"), "w") as f:
+            json.dump(metadata, f, indent=2)
+    return ranking, results, metadata
+
+
+def _format_lengths(lengths):
+    return ",".join(str(length) for length in lengths)
+
+
+def _parse_lengths(text):
+    lengths = tuple(int(part) for part in text.split(",") if part)
+    if not lengths or min(lengths) < 1:
+        raise argparse.ArgumentTypeError(f"expected comma-separated positive lengths, got {text!r}")
+    return lengths
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Backtest a grid of projection parameters and rank them.")
+    parser.add_argument("--symbols", nargs="+", help="Symbols to run (default: stock_options and ETF_CONFIG)")
+    parser.add_argument("--intervals", nargs="+", default=["1wk", "1d"])
+    parser.add_argument("--pattern-lengths", nargs="+", type=_parse_lengths, default=list(DEFAULT_PATTERN_SETS),
+                        help="Pattern length sets to try, longest first, e.g. 8,7,6 10,9,8")
+    parser.add_argument("--forward-lengths", nargs="+", type=int, default=list(DEFAULT_FORWARD_LENGTHS))
+    parser.add_argument("--future-points", nargs="+", type=int, default=list(DEFAULT_FUTURE_POINTS))
+    parser.add_argument("--num-lines", nargs="+", type=int, default=list(DEFAULT_NUM_LINES))
+    parser.add_argument("--max-offset", type=int, default=104, help="Backtest cut-offs from 5 to this many bars ago")
+    parser.add_argument("--rank-by", choices=list(RANK_METRICS), default='hit_rate')
+    parser.add_argument("--top", type=int, default=20, help="Grid points to print")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--output-dir", help="Write sweep.parquet, ranking.csv and sweep.json here")
+    args = parser.parse_args(argv)
+    configure_from_env()
+
+    grid = parameter_grid(args.pattern_lengths, args.forward_lengths, args.future_points, args.num_lines)
+    symbols = args.symbols or all_symbols()
+    ranking, _, metadata = run_sweep(symbols, args.intervals, grid, range(5, args.max_offset + 1), args.workers,
+                                     args.rank_by, args.output_dir)
+    failed = sum(len(errors) for errors in metadata['errors'].values())
+    print(f"Swept {len(grid)} grid points over {len(symbols)} symbols x {len(args.intervals)} intervals in "
+          f"{metadata['seconds']}s ({failed} failures)")
+    print(ranking.head(args.top).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+# pattern_index.py
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from projection_engine import up_down_sequence
+
+
+def _suffix_array(sequence):
+    """
+    Builds the suffix array of a small-integer sequence by prefix doubling.
+    Returns (sa, levels) where levels[L][i] ranks the 2**L-long prefix of suffix i.
+    """
+    n = len(sequence)
+    rank = sequence.astype(np.int32)
+    levels = [rank]
+    sa = np.argsort(rank, kind="stable")
+    step = 1
+    while n > 1:
+        second = np.full(n, -1, dtype=np.int32)
+        second[:n - step] = rank[step:]
+        sa = np.lexsort((second, rank))
+        first_sorted, second_sorted = rank[sa], second[sa]
+        changed = (first_sorted[1:] != first_sorted[:-1]) | (second_sorted[1:] != second_sorted[:-1])
+        rank = np.empty(n, dtype=np.int32)
+        rank[sa] = np.concatenate(([0], np.cumsum(changed, dtype=np.int32)))
+        levels.append(rank)
+        if rank[sa[-1]] == n - 1 or step >= n:
+            break
+        step *= 2
+    return sa.astype(np.intp), levels
+
+
+def _adjacent_lcp(sa, levels, n):
+    """Longest common prefix of each pair of neighbouring suffixes, by binary lifting over levels."""
+    lcp = np.zeros(n, dtype=np.intp)
+    if n < 2:
+        return lcp
+    left, right = sa[:-1], sa[1:]
+    common = np.zeros(n - 1, dtype=np.intp)
+    for level in range(len(levels) - 1, -1, -1):
+        ranks = levels[level]
+        a, b = left + common, right + common
+        ok = (a < n) & (b < n)
+        ok[ok] = ranks[a[ok]] == ranks[b[ok]]
+        common[ok] += 1 << level
+    lcp[1:] = common
+    return lcp
+
+
+class PatternIndex:
+    """
+    Suffix array over a U/D sequence, built once and queried for any pattern length.
+
+    Positions refer to the sequence the index was built on; PatternIndex.from_closes indexes
+    the newest-first sequence used by the projection engine, so position 0 is the current
+    pattern. Occurrences of any k-long substring form one contiguous block of the suffix
+    array, found from the LCP array in time proportional to the number of occurrences.
+    """
+
+    def __init__(self, sequence):
+        self.sequence = np.ascontiguousarray(sequence, dtype=np.uint8)
+        self.sa, levels = _suffix_array(self.sequence)
+        self.rank = levels[-1]
+        self.lcp = _adjacent_lcp(self.sa, levels, len(self.sequence))
+
+    @classmethod
+    def from_closes(cls, closes):
+        """Indexes the newest-first U/D sequence of an oldest-first close array."""
+        return cls(up_down_sequence(closes)[::-1])
+
+    def __len__(self):
+        return len(self.sequence)
+
+    def _block(self, row, length):
+        """Returns the [lo, hi) suffix array rows sharing their first 'length' entries with 'row'."""
+        lcp = self.lcp
+        n = len(lcp)
+        hi = row + 1
+        step = 64
+        while hi < n:
+            short = np.flatnonzero(lcp[hi:hi + step] < length)
+            if len(short):
+                hi += int(short[0])
+                break
+            hi += step
+            step *= 2
+        hi = min(hi, n)
+        lo = row
+        step = 64
+        while lo > 0:
+            chunk = lcp[max(lo - step + 1, 1):lo + 1][::-1]
+            short = np.flatnonzero(chunk < length)
+            if len(short):
+                lo -= int(short[0])
+                break
+            lo = max(lo - step, 0)
+            step *= 2
+        return lo, hi
+
+    def occurrences_at(self, start, length, min_position=0):
+        """
+        Returns the sorted positions >= min_position where the 'length' entries starting at
+        'start' occur (overlapping occurrences included).
+        """
+        if length <= 0 or start + length > len(self.sequence):
+            return np.empty(0, dtype=np.intp)
+        lo, hi = self._block(int(self.rank[start]), length)
+        positions = np.sort(self.sa[lo:hi])
+        return positions[np.searchsorted(positions, min_position):]
+
+    def occurrences(self, length):
+        """Returns the sorted positions of the current pattern of the given length."""
+        return self.occurrences_at(0, length)
+
+    def find(self, pattern):
+        """Returns the sorted positions of an arbitrary pattern (a sequence of 0/1 values)."""
+        pattern = np.asarray(pattern, dtype=np.uint8)
+        length = len(pattern)
+        if length == 0 or length > len(self.sequence):
+            return np.empty(0, dtype=np.intp)
+        data = self.sequence.tobytes()
+        key = pattern.tobytes()
+        sa = self.sa
+        lo, hi = 0, len(sa)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if data[sa[mid]:sa[mid] + length] < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo == len(sa) or data[sa[lo]:sa[lo] + length] != key:
+            return np.empty(0, dtype=np.intp)
+        first, last = self._block(lo, length)
+        return np.sort(sa[first:last])
+
+
+# Indexes of recently projected series, keyed by a fingerprint of their closes
+MAX_CACHED_INDEXES = 64
+_index_cache = OrderedDict()
+_index_cache_lock = threading.Lock()
+
+
+def get_pattern_index(closes):
+    """
+    Returns the PatternIndex of an oldest-first close array, reusing the one built for an
+    identical series earlier in the process.
+    """
+    closes = np.ascontiguousarray(closes, dtype=np.float64)
+    # Hashes the array's buffer in place; tobytes() would copy a memory-mapped history
+    key = hashlib.blake2b(closes.data, digest_size=16).digest()
+    with _index_cache_lock:
+        index = _index_cache.get(key)
+        if index is not None:
+            _index_cache.move_to_end(key)
+            return index
+    index = PatternIndex.from_closes(closes)
+    with _index_cache_lock:
+        _index_cache[key] = index
+        while len(_index_cache) > MAX_CACHED_INDEXES:
+            _index_cache.popitem(last=False)
+    return index
+
+
+def clear_pattern_indexes():
+    """Drops every cached PatternIndex (e.g. before timing a cold projection)."""
+    with _index_cache_lock:
+        _index_cache.clear()
@@ -0,0 +1,283 @@
+# precompute_scheduler.py
+"""
+Background precompute: refreshes histories and projections of every configured instrument
+right after each interval's bar closes on the instrument's market and publishes them to the data layer and the
+projection cache, so user requests only read.
+
+Runs inside the app (PRECOMPUTE_SCHEDULER=1) or as a standalone worker that shares the
+OHLC store, the projection cache's disk tier (PROJECTION_CACHE_DIR) and the history
+archive (HISTORY_ARCHIVE, rewritten after every refresh) with the app:
+
+    python precompute_scheduler.py --intervals 1h 1d 1wk
+"""
+import argparse
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+from batch_projections import MAX_FETCH_WORKERS, _collect
+from data_providers import configure_from_env
+from data_utils import cached_projection
+from etf_config import all_symbols
+from history_archive import ARCHIVE_PATH, archive_histories
+from instrumentation import count, timed
+from market_data import get_market_data
+
+logger = logging.getLogger(__name__)
+
+# Trading sessions in exchange local time. Hourly bars start at the open, so they close on the
+# open's minute each hour and the last one at the close; (0, 0)-(24, 0) is a 24-hour market.
+# Lunch breaks and exchange holidays are not modelled: a refresh that finds no new bar only
+# costs a request.
+WEEKDAYS = (0, 1, 2, 3, 4)
+MARKETS = {
+    "US": {"timezone": "America/New_York", "open": (9, 30), "close": (16, 0), "days": WEEKDAYS},
+    "Toronto": {"timezone": "America/Toronto", "open": (9, 30), "close": (16, 0), "days": WEEKDAYS},
+    "Mexico": {"timezone": "America/Mexico_City", "open": (8, 30), "close": (15, 0), "days": WEEKDAYS},
+    "Sao Paulo": {"timezone": "America/Sao_Paulo", "open": (10, 0), "close": (17, 0), "days": WEEKDAYS},
+    "London": {"timezone": "Europe/London", "open": (8, 0), "close": (16, 30), "days": WEEKDAYS},
+    "Europe": {"timezone": "Europe/Berlin", "open": (9, 0), "close": (17, 30), "days": WEEKDAYS},
+    "India": {"timezone": "Asia/Kolkata", "open": (9, 15), "close": (15, 30), "days": WEEKDAYS},
+    "Tokyo": {"timezone": "Asia/Tokyo", "open": (9, 0), "close": (15, 30), "days": WEEKDAYS},
+    "Hong Kong": {"timezone": "Asia/Hong_Kong", "open": (9, 30), "close": (16, 0), "days": WEEKDAYS},
+    "Sydney": {"timezone": "Australia/Sydney", "open": (10, 0), "close": (16, 0), "days": WEEKDAYS},
+    "FX": {"timezone": "Europe/London", "open": (0, 0), "close": (24, 0), "days": WEEKDAYS},
+    "Crypto": {"timezone": "UTC", "open": (0, 0), "close": (24, 0), "days": (0, 1, 2, 3, 4, 5, 6)},
+}
+DEFAULT_MARKET = "US"
+# Markets of the indices in stock_options and ETF_CONFIG, then of symbol suffixes; everything else
+# trades in the US
+SYMBOL_MARKETS = {
+    "^AXJO": "Sydney", "^N225": "Tokyo", "^HSI": "Hong Kong", "^FTSE": "London", "^GDAXI": "Europe",
+    "^FCHI": "Europe", "^IBEX": "Europe", "^AEX": "Europe", "^FTSEMIB": "Europe", "^GSPTSE": "Toronto",
+    "^NSEI": "India", "^BSESN": "India", "^BVSP": "Sao Paulo", "^MEXBOL": "Mexico",
+}
+SUFFIX_MARKETS = {
+    ".AX": "Sydney", ".T": "Tokyo", ".HK": "Hong Kong", ".L": "London", ".DE": "Europe", ".PA": "Europe",
+    ".AS": "Europe", ".MC": "Europe", ".MI": "Europe", ".TO": "Toronto", ".NS": "India", ".BO": "India",
+    ".SA": "Sao Paulo", ".MX": "Mexico", "=X": "FX", "-USD": "Crypto",
+}
+# Seconds to wait after a bar close before the provider reliably serves the new bar
+SETTLE_SECONDS = 120
+# (future_points, num_lines) projections the app requests: the analysis tabs and the ETF baskets
+DEFAULT_JOBS = ((10, 5), (5, 5))
+DEFAULT_INTERVALS = ("1h", "1d", "1wk")
+# Seconds one refresh may spend fetching a single symbol
+REFRESH_TIMEOUT = 120
+
+
+def market_of(symbol):
+    """Returns the MARKETS entry a symbol trades on, from SYMBOL_MARKETS or its suffix."""
+    if symbol in SYMBOL_MARKETS:
+        return SYMBOL_MARKETS[symbol]
+    for suffix, market in SUFFIX_MARKETS.items():
+        if symbol.endswith(suffix):
+            return market
+    return DEFAULT_MARKET
+
+
+def session_closes(interval, market=DEFAULT_MARKET):
+    """Returns the bar closes of one trading day, in minutes after local midnight."""
+    spec = MARKETS[market]
+    open_minute = spec["open"][0] * 60 + spec["open"][1]
+    close_minute = spec["close"][0] * 60 + spec["close"][1]
+    if interval != "1h":
+        return [close_minute]
+    return list(range(open_minute + 60, close_minute, 60)) + [close_minute]
+
+
+def next_bar_close(interval, now=None, market=DEFAULT_MARKET):
+    """
+    Returns the first bar close of an interval after 'now' (UTC-aware datetime) on a market's
+    session (see MARKETS): hourly bars through the session, daily bars at the close of each
+    trading day and weekly bars at the close of the last trading day of the week.
+    """
+    now = datetime.now(timezone.utc) if now is None else now
+    spec = MARKETS[market]
+    exchange_tz = ZoneInfo(spec["timezone"])
+    local = now.astimezone(exchange_tz)
+    closes = session_closes(interval, market)
+    for days in range(9):
+        day = local.date() + timedelta(days=days)
+        if day.weekday() not in spec["days"] or (interval == "1wk" and day.weekday() != max(spec["days"])):
+            continue
+        midnight = datetime(day.year, day.month, day.day, tzinfo=exchange_tz)
+        for minute in closes:
+            # Wall-clock arithmetic, so closes stay at their local time across DST changes
+            close = midnight + timedelta(minutes=minute)
+            if close > local:
+                return close.astimezone(timezone.utc)
+    raise ValueError(f"No bar close found for interval {interval} on {market}")
+
+
+def refresh_interval(symbols, interval, jobs=DEFAULT_JOBS, max_workers=MAX_FETCH_WORKERS, timeout=REFRESH_TIMEOUT):
+    """
+    Reloads the histories of 'symbols' through the data layer (the store fetches only the new
+    bars) and computes every job's projection into the projection cache.
+    Returns {'interval', 'symbols', 'errors', 'seconds'}.
+    """
+    started = time.monotonic()
+    market_data = get_market_data()
+    with timed("precompute_fetch"):
+        executor = ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(symbols))))
+        try:
+            futures = {symbol: executor.submit(market_data.refresh, symbol, interval)
+                       for symbol in dict.fromkeys(symbols)}
+            frames, errors = _collect(futures, time.monotonic() + timeout)
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    with timed("precompute_projections"):
+        for symbol, frame in frames.items():
+            if frame.empty:
+                errors[symbol] = "No data found"
+                continue
+            history = market_data.history(symbol, interval)
+            try:
+                for future_points, num_lines in jobs:
+                    cached_projection(symbol, interval, history, future_points, num_lines)
+            except Exception as exc:
+                errors[symbol] = str(exc) or type(exc).__name__
+    count("precompute_runs")
+    return {
+        'interval': interval,
+        'symbols': len([symbol for symbol in frames if symbol not in errors]),
+        'errors': errors,
+        'seconds': round(time.monotonic() - started, 3),
+    }
+
+
+class PrecomputeScheduler:
+    """
+    Worker thread that runs refresh_interval for the symbols of each market SETTLE_SECONDS
+    after an interval's bar closes on that market (see market_of). 'last_runs' holds the
+    latest refresh_interval result per (market, interval); the warm-up run at start is
+    stored under market None.
+    """
+
+    def __init__(self, symbols=None, intervals=DEFAULT_INTERVALS, jobs=DEFAULT_JOBS, settle=SETTLE_SECONDS,
+                 warm=True, now=None):
+        self.symbols = list(symbols) if symbols is not None else all_symbols()
+        self.intervals = list(intervals)
+        self.markets = {}
+        for symbol in self.symbols:
+            self.markets.setdefault(market_of(symbol), []).append(symbol)
+        self.jobs = jobs
+        self.settle = settle
+        self.warm = warm
+        self.now = now or (lambda: datetime.now(timezone.utc))
+        self.last_runs = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def next_refresh(self, interval, after, market=DEFAULT_MARKET):
+        """Returns the first refresh time of an interval after 'after': a bar close plus the settle delay."""
+        settle = timedelta(seconds=self.settle)
+        return next_bar_close(interval, after - settle, market) + settle
+
+    def due_times(self):
+        """Returns {(market, interval): UTC datetime of its next refresh}."""
+        now = self.now()
+        return {(market, interval): self.next_refresh(interval, now, market)
+                for market in self.markets for interval in self.intervals}
+
+    def run_once(self, interval, market=None):
+        """Refreshes one interval for the symbols of 'market', or for every symbol when None."""
+        symbols = self.symbols if market is None else self.markets[market]
+        try:
+            result = refresh_interval(symbols, interval, self.jobs)
+        except Exception:
+            logger.exception("Precompute of %s %s failed", market or "all markets", interval)
+            return None
+        self.last_runs[(market, interval)] = result
+        logger.info("Precomputed %s %s: %d symbols in %.1fs, %d errors", market or "all markets", interval,
+                    result['symbols'], result['seconds'], len(result['errors']))
+        if ARCHIVE_PATH is not None:
+            self.publish_archive()
+        return result
+
+    def publish_archive(self):
+        """Rewrites the HISTORY_ARCHIVE file from the refreshed histories of every interval."""
+        try:
+            with timed("precompute_archive"):
+                bars, _ = archive_histories(ARCHIVE_PATH, self.symbols, self.intervals)
+        except Exception:
+            logger.exception("Writing the history archive failed")
+            return
+        logger.info("Published %d bars to %s", bars, ARCHIVE_PATH)
+
+    def run(self):
+        """Runs the schedule in the calling thread until stop() is called."""
+        if self.warm:
+            for interval in self.intervals:
+                if self._stop.is_set():
+                    return
+                self.run_once(interval)
+        due = self.due_times()
+        while not self._stop.is_set():
+            market, interval = min(due, key=due.get)
+            wait = (due[(market, interval)] - self.now()).total_seconds()
+            if wait > 0 and self._stop.wait(wait):
+                return
+            self.run_once(interval, market)
+            due[(market, interval)] = self.next_refresh(interval, due[(market, interval)], market)
+
+    def start(self):
+        """Starts the schedule on a daemon thread."""
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self.run, name="precompute-scheduler", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def ensure_scheduler():
+    """
+    Starts the process-wide scheduler once when PRECOMPUTE_SCHEDULER is set and returns it
+    (None when disabled).
+    """
+    global _scheduler
+    if os.environ.get("PRECOMPUTE_SCHEDULER", "") in ("", "0", "false", "False"):
+        return None
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = PrecomputeScheduler().start()
+    return _scheduler
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Refresh histories and projections after every bar close.")
+    parser.add_argument("--symbols", nargs="+", help="Symbols to refresh (default: stock_options and ETF_CONFIG)")
+    parser.add_argument("--intervals", nargs="+", default=list(DEFAULT_INTERVALS))
+    parser.add_argument("--settle", type=int, default=SETTLE_SECONDS, help="Seconds to wait after each bar close")
+    parser.add_argument("--once", action="store_true", help="Refresh every interval once and exit")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    configure_from_env()
+
+    scheduler = PrecomputeScheduler(args.symbols, args.intervals, settle=args.settle)
+    if args.once:
+        for interval in args.intervals:
+            scheduler.run_once(interval)
+        return
+    try:
+        scheduler.run()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+# price_series.py
+import numpy as np
+import pandas as pd
+
+from projection_engine import interval_step
+
+
+def date_format_for(interval):
+    """Returns the display format used for an interval's dates."""
+    return '%d-%b-%Y %H:%M' if interval == "1h" else '%d-%b-%Y'
+
+
+def format_dates(dates, date_format):
+    """Formats a datetime64 array for display; only call this at the display edge."""
+    return pd.DatetimeIndex(dates).strftime(date_format).tolist()
+
+
+class PriceSeries:
+    """
+    Close prices of one instrument as two aligned arrays: dates (datetime64, local wall time
+    of the exchange, oldest first) and closes (float64).
+    """
+
+    __slots__ = ("dates", "closes")
+
+    def __init__(self, dates, closes):
+        self.dates = np.asarray(dates)
+        self.closes = np.asarray(closes, dtype=np.float64)
+
+    @classmethod
+    def from_frame(cls, frame):
+        """Builds a series from a history DataFrame without copying the closes."""
+        index = frame.index
+        if getattr(index, "tz", None) is not None:
+            index = index.tz_localize(None)
+        return cls(index.to_numpy(), frame['Close'].to_numpy(dtype=np.float64))
+
+    def __len__(self):
+        return len(self.closes)
+
+    def tail(self, count):
+        """Returns the last 'count' bars as a view."""
+        return PriceSeries(self.dates[-count:], self.closes[-count:])
+
+    def to_records(self, date_format):
+        """Returns the legacy list of {'date', 'close'} dictionaries."""
+        return [{'date': date, 'close': close}
+                for date, close in zip(format_dates(self.dates, date_format), self.closes.tolist())]
+
+
+class Projection:
+    """
+    One projected price path: the date where the matched pattern was found and the projected
+    dates/closes arrays, starting with the last actual bar.
+    """
+
+    __slots__ = ("interval", "match_date", "dates", "closes")
+
+    def __init__(self, interval, match_date, dates, closes):
+        self.interval = interval
+        self.match_date = match_date
+        self.dates = np.asarray(dates)
+        self.closes = np.asarray(closes, dtype=np.float64)
+
+    def __len__(self):
+        return len(self.closes)
+
+    @property
+    def label(self):
+        match_date = pd.Timestamp(self.match_date).strftime(date_format_for(self.interval))
+        return f"Future Projection (Match Date: {match_date})"
+
+    def to_dict(self):
+        """Returns the legacy {'label', 'data'} dictionary."""
+        date_format = date_format_for(self.interval)
+        return {'label': self.label, 'data': PriceSeries(self.dates, self.closes).to_records(date_format)}
+
+
+def build_projections(series, interval, match_indices, paths):
+    """
+    Turns projected price paths (see projection_engine.project_closes) of a PriceSeries into
+    Projection objects. Future dates are spaced by one bar of the interval in wall time.
+    """
+    if not len(paths):
+        return []
+    step = np.timedelta64(interval_step(interval))
+    future_dates = series.dates[-1] + step * np.arange(paths.shape[1])
+    return [Projection(interval, series.dates[match_index], future_dates, path)
+            for match_index, path in zip(np.asarray(match_indices).tolist(), paths)]
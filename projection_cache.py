@@ -0,0 +1,167 @@
+# projection_cache.py
+import hashlib
+import os
+import threading
+
+import numpy as np
+from cachetools import LRUCache
+
+# Bytes of result arrays kept in memory before the least recently used results are dropped
+MAX_CACHE_BYTES = int(os.environ.get("PROJECTION_CACHE_BYTES", 64 * 2 ** 20))
+# When set, results are also written to this directory and survive restarts
+CACHE_DIR = os.environ.get("PROJECTION_CACHE_DIR") or None
+
+
+def _frozen(result):
+    """Makes the result arrays read-only, since every cache hit hands out the same arrays."""
+    result = {name: np.asarray(value) for name, value in result.items()}
+    for value in result.values():
+        value.flags.writeable = False
+    return result
+
+
+def _result_size(result):
+    return sum(np.asarray(value).nbytes for value in result.values()) or 1
+
+
+class _SizedLRU(LRUCache):
+    """LRUCache that counts its evictions."""
+
+    def __init__(self, maxsize, getsizeof=None):
+        super().__init__(maxsize, getsizeof)
+        self.evictions = 0
+
+    def popitem(self):
+        self.evictions += 1
+        return super().popitem()
+
+
+def projection_key(symbol, interval, frame, kind, **params):
+    """
+    Returns the cache key of a computation on a history frame or PriceSeries. It changes with
+    the last bar (wall-time timestamp and close) and the number of bars, so a new or updated
+    bar invalidates every result computed before it without any explicit invalidation. A
+    frame and a PriceSeries of the same history get the same key.
+    """
+    last_bar = ""
+    if len(frame):
+        if hasattr(frame, "closes"):
+            stamp, close = frame.dates[-1], frame.closes[-1]
+        else:
+            stamp, close = frame.index[-1].tz_localize(None).to_datetime64(), frame['Close'].iloc[-1]
+        last_bar = f"{np.datetime_as_string(stamp, unit='s')}|{float(close)!r}"
+    parts = [kind, symbol, interval, str(len(frame)), last_bar]
+    parts.extend(f"{name}={params[name]!r}" for name in sorted(params))
+    return hashlib.blake2b("\x1f".join(parts).encode(), digest_size=16).hexdigest()
+
+
+class ProjectionCache:
+    """
+    Two-tier cache for projection results, which are dicts of NumPy arrays: an in-memory LRU
+    bounded by the arrays' bytes and an optional directory of .npz files.
+    Counters: 'hits' (memory), 'disk_hits', 'misses' and 'evictions'.
+    """
+
+    def __init__(self, max_bytes=MAX_CACHE_BYTES, directory=CACHE_DIR):
+        self.directory = directory
+        self._memory = _SizedLRU(max_bytes, getsizeof=_result_size)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.npz")
+
+    def _read_disk(self, key):
+        if self.directory is None:
+            return None
+        try:
+            with np.load(self._path(key), allow_pickle=False) as data:
+                return _frozen({name: data[name] for name in data.files})
+        except (OSError, ValueError):
+            return None
+
+    def _write_disk(self, key, result):
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp.npz"
+        np.savez(tmp_path, **result)
+        os.replace(tmp_path, path)
+
+    def get(self, key):
+        """Returns the cached result for key, or None."""
+        with self._lock:
+            result = self._memory.get(key)
+            if result is not None:
+                self.hits += 1
+                return result
+        result = self._read_disk(key)
+        with self._lock:
+            if result is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._store(key, result)
+        return result
+
+    def _store(self, key, result):
+        try:
+            self._memory[key] = result
+        except ValueError:
+            # Larger than the whole memory tier; only the disk tier keeps it
+            pass
+
+    def put(self, key, result):
+        """Stores a dict of arrays under key in both tiers."""
+        result = _frozen(result)
+        with self._lock:
+            self._store(key, result)
+        if self.directory is not None:
+            try:
+                self._write_disk(key, result)
+            except OSError:
+                pass
+        return result
+
+    def get_or_compute(self, key, compute):
+        """Returns the cached result for key, computing and storing it on a miss."""
+        result = self.get(key)
+        if result is None:
+            result = self.put(key, compute())
+        return result
+
+    def clear(self):
+        """Empties the memory tier; files of the disk tier are kept."""
+        with self._lock:
+            # MutableMapping.clear() goes through popitem(), which is not an eviction
+            evictions = self._memory.evictions
+            self._memory.clear()
+            self._memory.evictions = evictions
+
+    def stats(self):
+        """Returns the hit/miss counters and the size of the memory tier."""
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'evictions': self._memory.evictions,
+                'entries': len(self._memory),
+                'bytes': self._memory.currsize,
+            }
+
+
+_projection_cache = ProjectionCache()
+
+
+def get_projection_cache():
+    """Returns the process-wide projection cache."""
+    return _projection_cache
+
+
+def set_projection_cache(cache):
+    """Replaces the process-wide projection cache and returns the old one."""
+    global _projection_cache
+    previous, _projection_cache = _projection_cache, cache
+    return previous
@@ -0,0 +1,147 @@
+# projection_engine.py
+import numpy as np
+from datetime import timedelta
+
+# Pattern lengths tried by the matcher, longest first
+PATTERN_LENGTHS = (8, 7, 6)
+# Number of bars following a match that are turned into forward returns
+FORWARD_LENGTH = 13
+# A pattern length is only used if it occurs more than twice (including the current bar)
+MIN_MATCHES = 3
+
+
+def up_down_sequence(closes):
+    """
+    Returns a uint8 array with 1 (Up) where a close is >= the previous close and 0 (Down)
+    otherwise. The array has len(closes) - 1 entries and is ordered oldest first.
+    """
+    closes = np.asarray(closes, dtype=np.float64)
+    return (closes[1:] >= closes[:-1]).astype(np.uint8)
+
+
+def pattern_occurrences(rev_sequence, length):
+    """
+    Returns the sorted start positions of every (possibly overlapping) occurrence of the
+    current pattern, i.e. the first 'length' entries of the newest-first U/D sequence.
+    """
+    rev_sequence = np.asarray(rev_sequence)
+    if length > len(rev_sequence) or length <= 0:
+        return np.empty(0, dtype=np.intp)
+    windows = np.lib.stride_tricks.sliding_window_view(rev_sequence, length)
+    return np.flatnonzero((windows == rev_sequence[:length]).all(axis=1))
+
+
+def non_overlapping(positions, length):
+    """
+    Keeps occurrences the way a left-to-right regex scan would: after a match at p the
+    scan resumes at p + length, so overlapping occurrences are dropped.
+    """
+    positions = np.asarray(positions, dtype=np.intp)
+    if len(positions) < 2 or np.all(np.diff(positions) >= length):
+        return positions
+    kept = []
+    next_free = 0
+    for pos in positions.tolist():
+        if pos >= next_free:
+            kept.append(pos)
+            next_free = pos + length
+    return np.array(kept, dtype=np.intp)
+
+
+def select_matches(occurrences, min_matches=MIN_MATCHES, limit=None):
+    """
+    Combines per-length occurrences into the ordered list of matches used for projections.
+
+    occurrences is an iterable of (length, sorted positions) pairs, longest pattern first.
+    Lengths with fewer than min_matches non-overlapping occurrences are ignored, the current
+    pattern itself (position 0) is skipped and a position keeps the first length it matched.
+    Returns (positions, lengths) arrays in insertion order, truncated to 'limit' entries.
+    """
+    positions = []
+    lengths = []
+    seen = set()
+    for length, found in occurrences:
+        if limit is not None and len(positions) >= limit:
+            break
+        found = non_overlapping(found, length)
+        if len(found) < min_matches:
+            continue
+        for pos in found[1:].tolist():
+            if pos not in seen:
+                seen.add(pos)
+                positions.append(pos)
+                lengths.append(length)
+    if limit is not None:
+        positions, lengths = positions[:limit], lengths[:limit]
+    return np.array(positions, dtype=np.intp), np.array(lengths, dtype=np.intp)
+
+
+def find_matches(rev_sequence, pattern_lengths=PATTERN_LENGTHS, min_matches=MIN_MATCHES, limit=None,
+                 index=None):
+    """
+    Finds the pattern matches of a newest-first U/D sequence (see select_matches). When a
+    pattern_index.PatternIndex built on the same sequence is given, occurrences are looked up
+    in it instead of scanning the sequence once per pattern length.
+    """
+    if index is not None:
+        occurrences = ((length, index.occurrences(length)) for length in pattern_lengths)
+    else:
+        occurrences = ((length, pattern_occurrences(rev_sequence, length)) for length in pattern_lengths)
+    return select_matches(occurrences, min_matches=min_matches, limit=limit)
+
+
+def forward_percentage_differences(rev_closes, positions, forward_length=FORWARD_LENGTH):
+    """
+    Returns a (len(positions), forward_length) array of the percentage moves that followed
+    each match, computed on newest-first closes. Row i holds the moves from bar positions[i]
+    towards the present, matching print_difference_data. Like pandas' iloc, negative bar
+    positions wrap around to the oldest bars.
+    """
+    rev_closes = np.asarray(rev_closes, dtype=np.float64)
+    positions = np.asarray(positions, dtype=np.intp)
+    n = len(rev_closes)
+    current = positions[:, None] - np.arange(forward_length)[None, :]
+    cur = rev_closes[current % n]
+    nxt = rev_closes[(current - 1) % n]
+    return (nxt - cur) / cur * 100
+
+
+def compound_paths(last_close, returns):
+    """
+    Turns a (lines, steps) array of fractional returns into (lines, steps + 1) price paths
+    starting at last_close.
+    """
+    returns = np.asarray(returns, dtype=np.float64)
+    factors = np.empty((returns.shape[0], returns.shape[1] + 1))
+    factors[:, 0] = last_close
+    factors[:, 1:] = 1 + returns
+    return np.multiply.accumulate(factors, axis=1)
+
+
+def project_closes(closes, future_points=10, num_lines=5, pattern_lengths=PATTERN_LENGTHS,
+                   forward_length=FORWARD_LENGTH, min_matches=MIN_MATCHES, index=None):
+    """
+    Runs the full pattern projection on an oldest-first float64 close array. 'index' may be a
+    pattern_index.PatternIndex built from the same closes and reused across calls.
+
+    Returns (match_indices, paths): match_indices are oldest-first bar indices of the
+    matched patterns and paths is a (len(match_indices), steps + 1) array of projected
+    prices starting at the last close, with steps = min(future_points, forward_length).
+    """
+    closes = np.ascontiguousarray(closes, dtype=np.float64)
+    rev_closes = closes[::-1]
+    rev_sequence = up_down_sequence(closes)[::-1]
+    positions, _ = find_matches(rev_sequence, pattern_lengths, min_matches, limit=num_lines, index=index)
+    steps = min(future_points, forward_length)
+    pct = forward_percentage_differences(rev_closes, positions, forward_length)[:, :steps]
+    paths = compound_paths(rev_closes[0], pct / 100)
+    return len(closes) - 1 - positions, paths
+
+
+def interval_step(interval):
+    """Returns the timedelta between consecutive projected points for an interval."""
+    if interval == "1h":
+        return timedelta(hours=1)
+    if interval == "1wk":
+        return timedelta(weeks=1)
+    return timedelta(days=1)
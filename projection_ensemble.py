@@ -0,0 +1,157 @@
+# projection_ensemble.py
+import numpy as np
+
+from projection_engine import FORWARD_LENGTH, MIN_MATCHES, PATTERN_LENGTHS, find_matches, up_down_sequence
+
+DEFAULT_PERCENTILES = (5, 25, 50, 75, 95)
+# Simulated paths generated at once; bounds the memory of a run regardless of n_paths
+CHUNK_SIZE = 65_536
+# Histogram bins per step used to read the percentiles off the simulated paths
+HISTOGRAM_BINS = 4096
+
+
+def match_returns(closes, future_points=10, pattern_lengths=PATTERN_LENGTHS, forward_length=FORWARD_LENGTH,
+                  min_matches=MIN_MATCHES, index=None):
+    """
+    Returns (match_indices, returns) for every historical match of the current pattern, not
+    just the first num_lines: match_indices are oldest-first bar indices and returns is a
+    (matches, steps) array of the fractional moves that followed each match, with
+    steps = min(future_points, forward_length). Matches too recent to have 'steps' bars after
+    them are left out instead of wrapping around to the oldest bars.
+    """
+    closes = np.ascontiguousarray(closes, dtype=np.float64)
+    steps = min(future_points, forward_length)
+    rev_sequence = up_down_sequence(closes)[::-1]
+    positions, _ = find_matches(rev_sequence, pattern_lengths, min_matches, index=index)
+    positions = positions[positions >= steps]
+    # The bars after newest-first position p are p - 1, p - 2, ... in oldest-first order
+    start = len(closes) - 1 - positions
+    window = start[:, None] + np.arange(steps + 1)[None, :]
+    prices = closes[window]
+    return start, prices[:, 1:] / prices[:, :-1] - 1
+
+
+def _bounds(log_returns, method):
+    """Returns per-step (low, high) limits of the cumulative log return any path can reach."""
+    if method == "path":
+        cumulative = np.cumsum(log_returns, axis=1)
+        return cumulative.min(axis=0), cumulative.max(axis=0)
+    return np.cumsum(log_returns.min(axis=0)), np.cumsum(log_returns.max(axis=0))
+
+
+def _histogram_percentiles(counts, low, width, percentiles):
+    """Reads percentiles off per-step histograms, interpolating linearly inside a bin."""
+    steps, bins = counts.shape
+    cdf = np.cumsum(counts, axis=1)
+    result = np.empty((len(percentiles), steps))
+    for step in range(steps):
+        targets = np.asarray(percentiles, dtype=np.float64) / 100 * cdf[step, -1]
+        found = np.minimum(np.searchsorted(cdf[step], targets, side="left"), bins - 1)
+        before = np.where(found > 0, cdf[step, found - 1], 0)
+        inside = (targets - before) / np.maximum(counts[step, found], 1)
+        result[:, step] = low[step] + (found + np.clip(inside, 0, 1)) * width[step]
+    return result
+
+
+def simulate_ensemble(last_close, returns, n_paths=100_000, percentiles=DEFAULT_PERCENTILES, thresholds=(0.0,),
+                      method="path", seed=None, chunk_size=CHUNK_SIZE, bins=HISTOGRAM_BINS):
+    """
+    Bootstraps price paths from a (matches, steps) array of fractional forward returns.
+
+    method="path" resamples whole match paths, which only needs the number of draws per
+    match; method="step" draws every step from a different match, mixing the matches'
+    moves. Step paths are generated chunk_size at a time and reduced to per-step histograms,
+    so memory does not grow with n_paths.
+
+    Returns a dict of arrays, every one with steps + 1 columns starting at last_close:
+        'percentiles'  the requested percentiles
+        'bands'        (len(percentiles), steps + 1) price percentiles
+        'mean'         mean simulated price
+        'prob_above'   (len(thresholds), steps + 1) share of paths above last_close * (1 + t)
+        'paths'        number of simulated paths
+    Percentiles are accurate to one histogram bin (1/bins of the reachable range).
+    """
+    if method not in ("path", "step"):
+        raise ValueError(f"Unknown method {method!r}, expected 'path' or 'step'")
+    returns = np.asarray(returns, dtype=np.float64)
+    matches, steps = returns.shape
+    percentiles = np.asarray(percentiles, dtype=np.float64)
+    thresholds = np.log1p(np.asarray(thresholds, dtype=np.float64))
+    if not matches or not steps or n_paths <= 0:
+        raise ValueError("Need at least one match with forward returns and one path")
+
+    log_returns = np.log1p(returns)
+    low, high = _bounds(log_returns, method)
+    width = np.maximum(high - low, 1e-12) / bins
+    rng = np.random.default_rng(seed)
+    columns = np.arange(steps)
+    offsets = (columns * bins)[None, :]
+
+    counts = np.zeros(steps * bins, dtype=np.int64)
+    above = np.zeros((len(thresholds), steps), dtype=np.int64)
+    total = np.zeros(steps)
+
+    def accumulate(cumulative, weights=None):
+        slot = ((cumulative - low) / width).astype(np.intp)
+        np.clip(slot, 0, bins - 1, out=slot)
+        if weights is None:
+            counts[:] += np.bincount((slot + offsets).ravel(), minlength=steps * bins)
+            above[:] += (cumulative[None, :, :] > thresholds[:, None, None]).sum(axis=1)
+            total[:] += np.exp(cumulative).sum(axis=0)
+        else:
+            repeated = np.repeat(weights, steps)
+            counts[:] += np.bincount((slot + offsets).ravel(), weights=repeated,
+                                     minlength=steps * bins).astype(np.int64)
+            above[:] += ((cumulative[None, :, :] > thresholds[:, None, None]) * weights[None, :, None]).sum(axis=1)
+            total[:] += weights @ np.exp(cumulative)
+
+    if method == "path":
+        # Drawing whole paths with replacement only decides how often each match is used,
+        # so sample those counts directly instead of materialising n_paths rows
+        weights = rng.multinomial(n_paths, np.full(matches, 1 / matches))
+        accumulate(np.cumsum(log_returns, axis=1), weights)
+    else:
+        for done in range(0, n_paths, chunk_size):
+            size = min(chunk_size, n_paths - done)
+            sampled = log_returns[rng.integers(matches, size=(size, steps)), columns]
+            accumulate(np.cumsum(sampled, axis=1))
+
+    bands = np.empty((len(percentiles), steps + 1))
+    bands[:, 0] = last_close
+    bands[:, 1:] = last_close * np.exp(_histogram_percentiles(counts.reshape(steps, bins), low, width, percentiles))
+    mean = np.concatenate(([last_close], last_close * total / n_paths))
+    prob_above = np.empty((len(thresholds), steps + 1))
+    prob_above[:, 0] = (thresholds < 0).astype(np.float64)
+    prob_above[:, 1:] = above / n_paths
+    return {
+        'percentiles': percentiles,
+        'bands': bands,
+        'mean': mean,
+        'prob_above': prob_above,
+        'paths': n_paths,
+    }
+
+
+def ensemble_projection(closes, future_points=10, n_paths=100_000, percentiles=DEFAULT_PERCENTILES,
+                        thresholds=(0.0,), method="path", seed=None, pattern_lengths=PATTERN_LENGTHS,
+                        forward_length=FORWARD_LENGTH, min_matches=MIN_MATCHES, index=None):
+    """
+    Runs simulate_ensemble over the forward returns of every historical match of an
+    oldest-first close array. The result also holds 'match_indices'; when there are no
+    usable matches the bands, mean and probabilities are empty (0 columns).
+    """
+    closes = np.ascontiguousarray(closes, dtype=np.float64)
+    match_indices, returns = match_returns(closes, future_points, pattern_lengths, forward_length,
+                                           min_matches, index=index)
+    if not len(match_indices):
+        return {
+            'match_indices': match_indices,
+            'percentiles': np.asarray(percentiles, dtype=np.float64),
+            'bands': np.empty((len(percentiles), 0)),
+            'mean': np.empty(0),
+            'prob_above': np.empty((len(thresholds), 0)),
+            'paths': 0,
+        }
+    result = simulate_ensemble(closes[-1], returns, n_paths, percentiles, thresholds, method, seed)
+    result['match_indices'] = match_indices
+    return result
@@ -0,0 +1,179 @@
+# similarity_search.py
+import numpy as np
+
+from projection_engine import FORWARD_LENGTH, MIN_MATCHES, compound_paths, forward_percentage_differences, \
+    up_down_sequence
+
+# Pattern lengths tried by the similarity search, longest first
+SIMILAR_PATTERN_LENGTHS = (50, 40, 30, 20, 13, 8)
+# Default tolerance per metric: the share of U/D entries that may differ ('hamming') or the
+# largest relative distance between return windows ('returns'; a flat window is at 1.0)
+DEFAULT_TOLERANCE = {"hamming": 0.2, "returns": 0.8}
+# Match modes offered by the analysis tabs
+MATCH_MODES = {
+    "exact": "Exact U/D pattern (8-6 bars)",
+    "hamming": "Near U/D pattern (up to 50 bars, Hamming distance)",
+    "returns": "Similar returns (up to 50 bars, Euclidean distance)",
+}
+WORD_BITS = 64
+
+
+def _pack_word(sequence, bits, count):
+    """
+    Returns 'count' uint64 words where word p holds sequence[p:p + bits] (bits <= 64), entry j
+    in bit j. Windows are built by doubling, so packing costs log2(bits) passes.
+    """
+    block = sequence.astype(np.uint64)
+    width = 1
+    packed = None
+    done = 0
+    remaining = bits
+    while True:
+        if remaining & 1:
+            part = block[done:done + count] << np.uint64(done)
+            packed = part if packed is None else packed | part
+            done += width
+        remaining >>= 1
+        if not remaining:
+            return packed
+        block = block[:-width] | (block[width:] << np.uint64(width))
+        width *= 2
+
+
+def pack_windows(sequence, length):
+    """
+    Bit-packs every 'length'-long window of a U/D sequence: returns a (windows, words) uint64
+    array whose row p holds sequence[p:p + length], 64 entries per word.
+    """
+    sequence = np.asarray(sequence, dtype=np.uint8)
+    count = len(sequence) - length + 1
+    words = (length + WORD_BITS - 1) // WORD_BITS
+    if length <= 0 or count <= 0:
+        return np.zeros((0, max(words, 1)), dtype=np.uint64)
+    packed = np.empty((count, words), dtype=np.uint64)
+    for word in range(words):
+        first = word * WORD_BITS
+        packed[:, word] = _pack_word(sequence[first:], min(WORD_BITS, length - first), count)
+    return packed
+
+
+def hamming_distances(rev_sequence, length, start=0):
+    """
+    Returns the number of entries in which every 'length'-long window of a newest-first U/D
+    sequence differs from the window at 'start' (the current pattern by default).
+    """
+    packed = pack_windows(rev_sequence, length)
+    if not len(packed):
+        return np.empty(0, dtype=np.intp)
+    distances = np.bitwise_count(packed ^ packed[start]).sum(axis=1, dtype=np.intp)
+    return distances
+
+
+def return_distances(rev_returns, length, start=0):
+    """
+    Returns the Euclidean distance between every 'length'-long window of newest-first returns
+    and the window at 'start', relative to the norm of that window: 0 is an identical move
+    and a flat window is at 1. Uses running sums of squares and one matrix-vector product,
+    so no window is copied.
+    """
+    rev_returns = np.asarray(rev_returns, dtype=np.float64)
+    count = len(rev_returns) - length + 1
+    if length <= 0 or count <= 0:
+        return np.empty(0, dtype=np.float64)
+    windows = np.lib.stride_tricks.sliding_window_view(rev_returns, length)
+    query = windows[start].copy()
+    squares = np.concatenate(([0.0], np.cumsum(rev_returns ** 2)))
+    window_norms = squares[length:] - squares[:count]
+    query_norm = float(query @ query)
+    if query_norm == 0:
+        return np.where(window_norms > 0, np.inf, 0.0)
+    squared = np.maximum(window_norms - 2 * (windows @ query) + query_norm, 0)
+    return np.sqrt(squared / query_norm)
+
+
+def similarity_distances(closes, length, metric="hamming"):
+    """
+    Returns the normalized distance of every newest-first window of an oldest-first close
+    array to the current pattern: the share of differing U/D entries ('hamming') or the
+    relative distance of the returns ('returns').
+    """
+    closes = np.ascontiguousarray(closes, dtype=np.float64)
+    if metric == "hamming":
+        return hamming_distances(up_down_sequence(closes)[::-1], length) / length
+    if metric == "returns":
+        rev_closes = closes[::-1]
+        return return_distances(rev_closes[:-1] / rev_closes[1:] - 1, length)
+    raise ValueError(f"Unknown metric {metric!r}, expected 'hamming' or 'returns'")
+
+
+def select_similar(distances, length, tolerance, min_position=0, limit=None):
+    """
+    Returns the positions within 'tolerance' of the current pattern, closest first (most
+    recent first among equal distances). A window overlapping one already kept is dropped,
+    like the non-overlapping scan of the exact matcher. Positions below max(length,
+    min_position) overlap the current pattern or lack forward bars and are ignored.
+    """
+    candidates = np.flatnonzero(distances <= tolerance)
+    candidates = candidates[candidates >= max(length, min_position)]
+    candidates = candidates[np.lexsort((candidates, distances[candidates]))]
+    occupied = np.zeros(len(distances) + length, dtype=bool)
+    kept = []
+    for pos in candidates.tolist():
+        if occupied[pos:pos + length].any():
+            continue
+        occupied[pos:pos + length] = True
+        kept.append(pos)
+        if limit is not None and len(kept) >= limit:
+            break
+    return np.array(kept, dtype=np.intp)
+
+
+def find_similar_matches(closes, pattern_lengths=SIMILAR_PATTERN_LENGTHS, metric="hamming", tolerance=None,
+                         min_matches=MIN_MATCHES, limit=None, min_position=0):
+    """
+    Finds near matches of the current pattern of an oldest-first close array, trying the
+    longest pattern first like projection_engine.select_matches. A length is used when it
+    has at least min_matches - 1 matches besides the current pattern; a position keeps the
+    first length it matched. Returns (positions, lengths, distances) arrays with newest-first
+    positions.
+    """
+    tolerance = DEFAULT_TOLERANCE[metric] if tolerance is None else tolerance
+    positions = []
+    lengths = []
+    distances = []
+    seen = set()
+    for length in pattern_lengths:
+        if limit is not None and len(positions) >= limit:
+            break
+        distance = similarity_distances(closes, length, metric)
+        found = select_similar(distance, length, tolerance, min_position,
+                               None if limit is None else max(limit, min_matches - 1))
+        if len(found) < min_matches - 1:
+            continue
+        for pos in found.tolist():
+            if pos not in seen:
+                seen.add(pos)
+                positions.append(pos)
+                lengths.append(length)
+                distances.append(float(distance[pos]))
+    if limit is not None:
+        positions, lengths, distances = positions[:limit], lengths[:limit], distances[:limit]
+    return (np.array(positions, dtype=np.intp), np.array(lengths, dtype=np.intp),
+            np.array(distances, dtype=np.float64))
+
+
+def project_similar(closes, future_points=10, num_lines=5, pattern_lengths=SIMILAR_PATTERN_LENGTHS,
+                    metric="hamming", tolerance=None, forward_length=FORWARD_LENGTH, min_matches=MIN_MATCHES):
+    """
+    Same as projection_engine.project_closes, with the matches found by find_similar_matches.
+    Matches without 'steps' later bars are skipped instead of wrapping around to the oldest
+    bars. Returns (match_indices, paths).
+    """
+    closes = np.ascontiguousarray(closes, dtype=np.float64)
+    steps = min(future_points, forward_length)
+    positions, _, _ = find_similar_matches(closes, pattern_lengths, metric, tolerance, min_matches,
+                                           limit=num_lines, min_position=steps)
+    rev_closes = closes[::-1]
+    pct = forward_percentage_differences(rev_closes, positions, forward_length)[:, :steps]
+    paths = compound_paths(rev_closes[0], pct / 100)
+    return len(closes) - 1 - positions, paths
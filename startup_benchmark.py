@@ -0,0 +1,152 @@
+# startup_benchmark.py
+"""
+Measures cold start of the app: import time of modules in fresh interpreters (python -X
+importtime) and the time until the first run of streamlit_app.py has rendered (the first
+meaningful paint on the server).
+
+    python startup_benchmark.py --runs 5 --budget 1.5 --json startup.json
+
+With --budget the exit status is 1 when the median first paint takes longer, so the check
+can guard against imports creeping back into the startup path.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+DEFAULT_MODULES = ["streamlit", "predefined_tab", "data_utils", "fetch_client", "backtest_tab",
+                   "three_d_predictions_tab", "etf_tab"]
+# Modules the first paint should not need; reported when the first run imported them
+HEAVY_MODULES = ["yfinance", "pandas", "pyarrow", "plotly.graph_objects", "scipy", "data_utils", "chart_utils",
+                 "backtest_tab", "three_d_predictions_tab", "etf_tab"]
+APP_SCRIPT = "streamlit_app.py"
+# The measured interpreters run in the app's directory, wherever the benchmark is started from
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+_FIRST_PAINT_CODE = """
+import json, sys, time
+from streamlit.testing.v1 import AppTest
+before = set(sys.modules)
+started = time.perf_counter()
+app = AppTest.from_file({script!r}, default_timeout=300).run()
+seconds = time.perf_counter() - started
+print(json.dumps({{'seconds': seconds, 'exceptions': len(app.exception),
+                  'loaded': sorted(set(sys.modules) - before)}}))
+"""
+
+
+def _environment():
+    """
+    Environment of the measured interpreters. DATA_PROVIDER is passed through, so the default
+    (yfinance) configuration is measured unless it is set; the first paint downloads nothing.
+    """
+    return dict(os.environ)
+
+
+def parse_importtime(stderr):
+    """
+    Parses python -X importtime output into {module: (self seconds, cumulative seconds)} and
+    {top-level module: [modules it imported directly]}. Children are listed before their
+    parent, indented by two more spaces.
+    """
+    times = {}
+    children = {}
+    pending = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        if not self_us.strip().isdigit():
+            continue
+        module = name.strip()
+        times[module] = (int(self_us) / 1e6, int(cumulative_us) / 1e6)
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth == 0:
+            children[module], pending = pending, []
+        elif depth == 1:
+            pending.append(module)
+    return times, children
+
+
+def import_time(module, cwd=APP_DIR):
+    """
+    Imports 'module' in a fresh interpreter and returns {'module', 'seconds', 'slowest'}:
+    its cumulative import time and the ten slowest modules it imported directly.
+    """
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], cwd=cwd,
+                            env=_environment(), capture_output=True, text=True)
+    if result.returncode:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr[-2000:]}")
+    times, children = parse_importtime(result.stderr)
+    slowest = sorted(((times[name][1], name) for name in children.get(module, [])), reverse=True)[:10]
+    return {
+        'module': module,
+        'seconds': times[module][1] if module in times else 0.0,
+        'slowest': [(name, seconds) for seconds, name in slowest],
+    }
+
+
+def first_paint(script=APP_SCRIPT, cwd=APP_DIR):
+    """
+    Runs the app script once in a fresh interpreter (streamlit's AppTest) and returns
+    {'seconds', 'exceptions', 'heavy'}: the time of the first run, including every import it
+    triggers, and the HEAVY_MODULES it loaded.
+    """
+    script = os.path.join(cwd, script)
+    result = subprocess.run([sys.executable, "-c", _FIRST_PAINT_CODE.format(script=script)], cwd=cwd,
+                            env=_environment(), capture_output=True, text=True)
+    if result.returncode:
+        raise RuntimeError(f"Running {script} failed:\n{result.stderr[-2000:]}")
+    run = json.loads(result.stdout.strip().splitlines()[-1])
+    loaded = set(run.pop('loaded'))
+    run['heavy'] = [module for module in HEAVY_MODULES if module in loaded]
+    return run
+
+
+def run_startup_benchmark(modules=DEFAULT_MODULES, runs=5, script=APP_SCRIPT, cwd=APP_DIR):
+    """Returns {'imports': [...], 'first_paint': {...}} with median times over 'runs' cold starts."""
+    imports = []
+    for module in modules:
+        samples = [import_time(module, cwd) for _ in range(runs)]
+        median = statistics.median(sample['seconds'] for sample in samples)
+        imports.append({'module': module, 'seconds': median, 'slowest': samples[-1]['slowest']})
+        slowest = ", ".join(f"{name} {seconds * 1000:.0f}" for name, seconds in samples[-1]['slowest'][:4])
+        print(f"import {module:<28} {median * 1000:>8.1f} ms   ({slowest})")
+
+    paints = [first_paint(script, cwd) for _ in range(runs)]
+    paint = {
+        'seconds': statistics.median(run['seconds'] for run in paints),
+        'exceptions': max(run['exceptions'] for run in paints),
+        'heavy': paints[-1]['heavy'],
+    }
+    print(f"first paint of {script:<20} {paint['seconds'] * 1000:>8.1f} ms   "
+          f"(heavy modules loaded: {', '.join(paint['heavy']) or 'none'})")
+    return {'imports': imports, 'first_paint': paint}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure cold-start import time and the app's first paint.")
+    parser.add_argument("--modules", nargs="+", default=DEFAULT_MODULES)
+    parser.add_argument("--runs", type=int, default=5, help="Cold starts per measurement (the median is reported)")
+    parser.add_argument("--script", default=APP_SCRIPT)
+    parser.add_argument("--budget", type=float, help="Fail when the median first paint takes more seconds")
+    parser.add_argument("--json", help="Write the results to this JSON file")
+    args = parser.parse_args(argv)
+
+    results = run_startup_benchmark(args.modules, args.runs, args.script)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    if results['first_paint']['exceptions']:
+        print("The first run raised an exception")
+        return 1
+    if args.budget is not None and results['first_paint']['seconds'] > args.budget:
+        print(f"First paint exceeds the budget of {args.budget:.2f} s")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
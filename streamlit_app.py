@@ -1,75 +1,60 @@
+import importlib
+import os
 import streamlit as st
-from predefined_tab import render_predefined_tab
-from custom_tab import render_custom_tab
-from backtest_tab import render_backtest_tab
-from three_d_predictions_tab import render_3d_predictions_tab, plot_3d_predictions
-from data_utils import get_stock_data, generate_future_projections_pattern
-from chart_utils import plot_stock_chart
-import etf_config  # Contains ETF_CONFIG
+from projection_cache import get_projection_cache
+from instrumentation import dump, enabled, snapshot
 
 st.title("Instrument Analysis App")
 
-# Create main tabs
-tab1, tab2, tab3, tab4 = st.tabs([
-    "Predefined Stocks",
-    "Custom Stock Search",
-    "Backtest Predictions",
-    "3D Predictions"
-])
-
-with tab1:
-    render_predefined_tab()
-with tab2:
-    render_custom_tab()
-with tab3:
-    render_backtest_tab()
-with tab4:
-    render_3d_predictions_tab()
-
-# ETF-Specific 3D Predictions & Normal Charts
-if hasattr(etf_config, "ETF_CONFIG") and etf_config.ETF_CONFIG:
-    st.header("ETF 3D Predictions & Projections")
-
-    etf_dict = etf_config.ETF_CONFIG
-    etf_names = list(etf_dict.keys())
-
-    # Create tabs for each ETF
-    etf_tabs_container = st.tabs(etf_names)
-    
-    for i, etf_name in enumerate(etf_names):
-        with etf_tabs_container[i]:
-            st.subheader(f"3D Predictions for {etf_name}")
-            stocks_with_labels = etf_dict[etf_name]  # Format: [{"id": ..., "label": ...}]
-
-            # Generate and show 3D Prediction Chart
-            fig_3d = plot_3d_predictions(
-                stocks_with_labels,
-                period="1y",
-                interval="1d",
-                actual_points=10,
-                pred_points=5,
-                num_pred_lines=5
-            )
-            st.plotly_chart(fig_3d, key=f"{etf_name}_3d_chart")
-
-            # Generate Normal Projection Charts for each instrument
-            for index, stock_data in enumerate(stocks_with_labels):
-                stock = stock_data["id"]
-                label = stock_data["label"]
-
-                st.subheader(f"Projections for {label} ({stock})")
-
-                # Fetch historical data
-                stock_history = get_stock_data(stock, interval="1d")
-
-                # Generate future projections
-                future_predictions = generate_future_projections_pattern(stock, interval="1d", future_points=5, num_lines=5)
-
-                # Generate and display 2D projection chart with a unique key
-                fig_2d = plot_stock_chart(stock_history, future_predictions, date_format="%d-%b-%Y")
-                
-                # Add a unique key using stock ID + index to avoid duplicates
-                st.plotly_chart(fig_2d, key=f"{stock}_projection_{index}")
+# DATA_PROVIDER switches the data source, e.g. to local files or synthetic data for offline runs
+if os.environ.get("DATA_PROVIDER"):
+    from data_providers import configure_from_env
+    configure_from_env()
+
+# With PRECOMPUTE_SCHEDULER=1 histories and projections are refreshed after every bar close
+# in the background, so the sections below only read from the caches
+if os.environ.get("PRECOMPUTE_SCHEDULER"):
+    from precompute_scheduler import ensure_scheduler
+    ensure_scheduler()
+
+# Stage timers and counters are collected process-wide when PIPELINE_METRICS is set; the
+# checkbox only shows them in this session
+show_diagnostics = st.sidebar.checkbox("Show diagnostics", value=enabled())
+
+# Sections render lazily: only the selected one runs on a rerun, unlike st.tabs which
+# executes every tab's code whichever is visible. Each section's module (and the pandas,
+# yfinance and plotly code behind it) is imported the first time the section is opened.
+SECTIONS = {
+    "Predefined Stocks": ("predefined_tab", "render_predefined_tab"),
+    "Custom Stock Search": ("custom_tab", "render_custom_tab"),
+    "Backtest Predictions": ("backtest_tab", "render_backtest_tab"),
+    "3D Predictions": ("three_d_predictions_tab", "render_3d_predictions_tab"),
+    "ETF Baskets": ("etf_tab", "render_etf_tab"),
+    "Change Heat Map": ("heatmap_tab", "render_heatmap_tab"),
+}
+section = st.radio("Section", list(SECTIONS), horizontal=True, label_visibility="collapsed", key="section")
+module_name, render_name = SECTIONS[section]
+getattr(importlib.import_module(module_name), render_name)()
+
+# Projection cache counters for this session's process
+cache_stats = get_projection_cache().stats()
+st.sidebar.caption(f"Projection cache: {cache_stats['hits'] + cache_stats['disk_hits']} hits, "
+                   f"{cache_stats['misses']} misses, {cache_stats['entries']} entries "
+                   f"({cache_stats['bytes'] / 2 ** 20:.1f} MB)")
+
+if show_diagnostics:
+    metrics = snapshot()
+    st.sidebar.subheader("Diagnostics")
+    if metrics['timers']:
+        import pandas as pd
+        timers = pd.DataFrame.from_dict(metrics['timers'], orient='index')
+        st.sidebar.dataframe(timers.sort_values('total', ascending=False).round(4))
+    st.sidebar.json(metrics['counters'])
+    if not enabled():
+        st.sidebar.caption("Metrics are collected when the app runs with PIPELINE_METRICS=1.")
+    # The JSON dump is built (and logged) only when asked for, not on every rerun
+    elif st.sidebar.button("Prepare metrics download"):
+        st.sidebar.download_button("Download metrics", dump(), file_name="metrics.json")
 
 if __name__ == "__main__":
     st.write("Ready to analyze instruments!")
@@ -0,0 +1,71 @@
+# synthetic_data.py
+import numpy as np
+import pandas as pd
+
+# Earliest bar date strftime can still format
+_EARLIEST = np.datetime64("0001-01-01T00:00:00", "s")
+
+
+def synthetic_index(n_bars, interval="1d", end="2024-12-31", tz="America/New_York"):
+    """
+    Returns n_bars timestamps ending at 'end': consecutive hours for 1h, business days for
+    1d and Mondays for 1wk. Raises ValueError when the history would start before year 1.
+    """
+    steps = np.arange(n_bars - 1, -1, -1, dtype=np.int64)
+    end_day = np.datetime64(end, "D")
+    if interval == "1h":
+        stamps = np.datetime64(end, "h") - steps.astype("timedelta64[h]")
+    elif interval == "1wk":
+        monday = end_day - ((end_day.astype(np.int64) - 4) % 7).astype("timedelta64[D]")
+        stamps = monday - (steps * 7).astype("timedelta64[D]")
+    else:
+        stamps = np.busday_offset(end_day, -steps, roll="backward")
+    stamps = stamps.astype("datetime64[s]")
+    if n_bars and stamps[0] < _EARLIEST:
+        raise ValueError(f"{n_bars} bars of {interval} do not fit the calendar")
+    # Nanosecond timestamps like yfinance when they fit, seconds for longer histories
+    unit = "ns" if not n_bars or stamps[0] >= np.datetime64("1678-01-01", "s") else "s"
+    index = pd.DatetimeIndex(stamps.astype(f"datetime64[{unit}]"))
+    # Daily and weekly bars sit at local midnight; hourly bars are spaced in UTC to avoid DST gaps
+    if interval == "1h":
+        index = index.tz_localize("UTC").tz_convert(tz)
+    else:
+        index = index.tz_localize(tz, ambiguous=np.zeros(n_bars, dtype=bool), nonexistent="shift_forward")
+    index.name = "Datetime" if interval == "1h" else "Date"
+    return index
+
+
+def make_ohlc_frame(n_bars, interval="1d", seed=0, end="2024-12-31", start_price=100.0, volatility=None,
+                    tz="America/New_York"):
+    """
+    Returns a deterministic random-walk OHLC DataFrame shaped like yfinance's history()
+    output with auto_adjust=False: a tz-aware index named Date/Datetime and the columns
+    Open, High, Low, Close, Adj Close, Volume, Dividends and Stock Splits.
+    The same (n_bars, interval, seed) always produces the same frame; see synthetic_index
+    for the dates.
+    """
+    rng = np.random.default_rng(seed)
+    if volatility is None:
+        volatility = {"1h": 0.003, "1wk": 0.025}.get(interval, 0.012)
+
+    returns = rng.normal(0.0002, volatility, n_bars)
+    close = start_price * np.exp(np.cumsum(returns))
+    open_ = np.empty(n_bars)
+    open_[:1] = start_price
+    open_[1:] = close[:-1] * (1 + rng.normal(0, volatility / 4, max(n_bars - 1, 0)))
+    wick = np.abs(rng.normal(0, volatility / 2, (2, n_bars)))
+    high = np.maximum(open_, close) * (1 + wick[0])
+    low = np.minimum(open_, close) * (1 - wick[1])
+    volume = rng.integers(100_000, 10_000_000, n_bars)
+
+    index = synthetic_index(n_bars, interval, end, tz)
+    return pd.DataFrame({
+        "Open": open_,
+        "High": high,
+        "Low": low,
+        "Close": close,
+        "Adj Close": close,
+        "Volume": volume,
+        "Dividends": 0.0,
+        "Stock Splits": 0.0,
+    }, index=index)
@@ -0,0 +1,38 @@
+import numpy as np
+import pytest
+
+from backtest_engine import walk_forward
+from projection_engine import project_closes
+
+
+def stepped_closes(bars, seed):
+    rng = np.random.default_rng(seed)
+    return (100 + np.cumsum(rng.integers(-2, 3, bars))).astype(np.float64)
+
+
+@pytest.mark.parametrize("seed", range(3))
+@pytest.mark.parametrize("future_points, num_lines", [(5, 5), (10, 3), (20, 8)])
+def test_walk_forward_equals_project_closes_on_truncated_closes(seed, future_points, num_lines):
+    closes = stepped_closes(1200, seed)
+    cutoffs = np.array([1, 2, 9, 10, 150, 600, 1195, 1200])
+
+    result = walk_forward(closes, cutoffs, future_points=future_points, num_lines=num_lines)
+
+    steps = min(future_points, 13)
+    for row, cutoff in enumerate(cutoffs):
+        match_indices, paths = project_closes(closes[:cutoff], future_points=future_points, num_lines=num_lines)
+        found = len(match_indices)
+        np.testing.assert_array_equal(result['match_indices'][row, :found], match_indices)
+        assert (result['match_indices'][row, found:] == -1).all()
+        np.testing.assert_array_equal(result['predicted'][row, :found], paths.reshape(found, steps + 1))
+        assert np.isnan(result['predicted'][row, found:]).all()
+        actual = closes[cutoff - 1:cutoff + future_points]
+        np.testing.assert_array_equal(result['actual'][row, :len(actual)], actual)
+        assert np.isnan(result['actual'][row, len(actual):]).all()
+
+
+def test_walk_forward_rejects_cutoffs_outside_the_series():
+    with pytest.raises(ValueError):
+        walk_forward(stepped_closes(50, 0), [0, 10])
+    with pytest.raises(ValueError):
+        walk_forward(stepped_closes(50, 0), [51])
@@ -0,0 +1,40 @@
+import numpy as np
+import pandas as pd
+
+from change_table import change_colors, percentage_changes, step_changes
+
+
+def per_cell_color(val):
+    """The per-cell Styler function prepare_table used before change_colors."""
+    intensity = min(abs(val) / 5, 1)
+    if val > 0:
+        return f'background-color: rgba(0, 255, 0, {intensity})'
+    else:
+        return f'background-color: rgba(255, 0, 0, {intensity})'
+
+
+def test_change_colors_match_the_per_cell_styles():
+    rng = np.random.default_rng(0)
+    values = np.concatenate((rng.normal(0, 3, 5000).round(2), rng.normal(0, 3, 5000),
+                             [0.0, -0.0, 5.0, -5.0, 5.01, 1e-7, -1e-12, 123.456]))
+    assert change_colors(values).tolist() == [per_cell_color(value) for value in values.tolist()]
+
+
+def test_change_colors_leave_missing_changes_unstyled():
+    assert change_colors(np.array([np.nan, 1.0]))[0] == ""
+
+
+def test_step_changes_match_pct_change():
+    rng = np.random.default_rng(1)
+    closes = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, (3, 2000)), axis=1))
+    expected = np.vstack([(pd.Series(row).pct_change(fill_method=None) * 100).to_numpy()[1:] for row in closes])
+    np.testing.assert_array_equal(step_changes(closes), expected)
+    np.testing.assert_array_equal(step_changes(closes).round(2), expected.round(2))
+
+
+def test_percentage_changes_over_horizons():
+    closes = np.array([[100.0, 110.0, 99.0, 121.0], [np.nan, np.nan, 50.0, 40.0]])
+    changes = percentage_changes(closes, horizons=(1, 3, 4))
+    np.testing.assert_allclose(changes[0, :2], [(121 / 99 - 1) * 100, 21.0])
+    assert np.isnan(changes[0, 2]) and np.isnan(changes[1, 1])
+    np.testing.assert_allclose(changes[1, 0], -20.0)
@@ -0,0 +1,127 @@
+import pytest
+
+from data_providers import SyntheticProvider
+from fetch_client import FetchClient, FetchError
+
+
+class FakeTime:
+    """Clock and sleep for the client: sleeping advances the clock and is recorded."""
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def clock(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class FlakyProvider:
+    """Synthetic histories that fail the first 'failures' requests of each symbol."""
+
+    def __init__(self, failures=0, broken=(), batch_fails=False, batch_drops=()):
+        self.synthetic = SyntheticProvider(bars={"1d": 100})
+        self.failures = failures
+        self.broken = set(broken)
+        self.batch_fails = batch_fails
+        self.batch_drops = set(batch_drops)
+        self.attempts = {}
+        self.batches = []
+
+    def history(self, symbol, interval, period=None, start=None, auto_adjust=False, timeout=None):
+        self.attempts[symbol] = self.attempts.get(symbol, 0) + 1
+        if symbol in self.broken or self.attempts[symbol] <= self.failures:
+            raise ConnectionError(f"connection reset for {symbol}")
+        return self.synthetic.history(symbol, interval, period, start)
+
+    def download(self, symbols, interval, period=None, start=None, auto_adjust=False, timeout=None):
+        self.batches.append(list(symbols))
+        if self.batch_fails:
+            raise ConnectionError("batch download failed")
+        return {symbol: self.synthetic.history(symbol, interval, period, start)
+                for symbol in symbols if symbol not in self.batch_drops and symbol not in self.broken}
+
+
+def make_client(provider, fake_time, **kwargs):
+    return FetchClient(history=provider.history, download=provider.download, sleep=fake_time.sleep,
+                       clock=fake_time.clock, jitter=lambda: 1.0, **kwargs)
+
+
+def test_retries_with_exponential_backoff():
+    fake_time = FakeTime()
+    provider = FlakyProvider(failures=2)
+    client = make_client(provider, fake_time, base_delay=0.5, max_delay=8.0)
+
+    df = client.history("SYN", "1d", period="max")
+
+    assert len(df) == 100
+    assert provider.attempts["SYN"] == 3
+    assert fake_time.sleeps == [0.5, 1.0]
+
+
+def test_backoff_is_capped_and_jittered():
+    client = FetchClient(base_delay=0.5, max_delay=2.0, jitter=lambda: 0.5)
+    assert [client.backoff(attempt) for attempt in range(5)] == [0.25, 0.5, 1.0, 1.0, 1.0]
+
+
+def test_gives_up_after_the_last_retry():
+    fake_time = FakeTime()
+    provider = FlakyProvider(broken=["SYN"])
+    client = make_client(provider, fake_time, retries=3)
+
+    with pytest.raises(FetchError, match="connection reset"):
+        client.history("SYN", "1d", period="max")
+    assert provider.attempts["SYN"] == 4
+    assert len(fake_time.sleeps) == 3
+
+
+def test_gives_up_when_the_next_retry_would_pass_the_deadline():
+    fake_time = FakeTime()
+    provider = FlakyProvider(broken=["SYN"])
+    client = make_client(provider, fake_time, retries=10, base_delay=1.0, max_delay=8.0, deadline=5.0)
+
+    with pytest.raises(FetchError):
+        client.history("SYN", "1d", period="max")
+    # Backoffs of 1, 2 and then 4 seconds: the third would end after the 5-second deadline
+    assert fake_time.sleeps == [1.0, 2.0]
+
+
+def test_history_many_downloads_in_batches():
+    fake_time = FakeTime()
+    provider = FlakyProvider()
+    client = make_client(provider, fake_time, batch_size=2)
+    symbols = ["A", "B", "C", "D", "E"]
+
+    frames, errors = client.history_many(symbols, "1d", period="max")
+
+    assert provider.batches == [["A", "B"], ["C", "D"], ["E"]]
+    assert sorted(frames) == symbols and errors == {}
+    assert provider.attempts == {}
+
+
+def test_history_many_fetches_symbols_a_batch_left_out_one_by_one():
+    fake_time = FakeTime()
+    provider = FlakyProvider(batch_drops=["B"], broken=["C"])
+    client = make_client(provider, fake_time, retries=1)
+
+    frames, errors = client.history_many(["A", "B", "C"], "1d", period="max")
+
+    assert sorted(frames) == ["A", "B"]
+    assert list(errors) == ["C"]
+    assert provider.attempts == {"B": 1, "C": 2}
+
+
+def test_history_many_falls_back_to_single_fetches_when_the_batch_fails():
+    fake_time = FakeTime()
+    provider = FlakyProvider(batch_fails=True)
+    client = make_client(provider, fake_time, retries=1)
+
+    frames, errors = client.history_many(["A", "B"], "1d", period="max")
+
+    assert sorted(frames) == ["A", "B"] and errors == {}
+    # The batch was retried once before falling back
+    assert len(provider.batches) == 2
+    assert provider.attempts == {"A": 1, "B": 1}
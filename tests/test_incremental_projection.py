@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+
+from incremental_projection import IncrementalProjection, clear_states, incremental_projection
+from price_series import PriceSeries
+from projection_engine import project_closes
+
+
+def hourly_series(bars, seed=0):
+    rng = np.random.default_rng(seed)
+    closes = 100 + np.cumsum(rng.integers(-2, 3, bars)).astype(np.float64)
+    dates = np.datetime64("2024-01-01T00:00") + np.arange(bars).astype("timedelta64[h]")
+    return PriceSeries(dates, closes)
+
+
+def assert_same_projection(state, closes, future_points=10, num_lines=5):
+    expected_indices, expected_paths = project_closes(closes, future_points=future_points, num_lines=num_lines)
+    match_indices, paths = state.project(future_points, num_lines)
+    np.testing.assert_array_equal(match_indices, expected_indices)
+    np.testing.assert_array_equal(paths, expected_paths)
+
+
+def test_sync_follows_a_sliding_window_with_a_forming_bar():
+    full = hourly_series(1500)
+    window = 600
+    state = IncrementalProjection()
+    for end in range(window, len(full)):
+        # The last bar is still forming: first seen at a provisional close, then at its final one
+        forming = full.closes[:end + 1].copy()
+        forming[-1] += 0.5
+        start = end + 1 - window
+        state.sync(PriceSeries(full.dates[start:end + 1], forming[start:]))
+        assert_same_projection(state, forming[start:])
+        state.sync(PriceSeries(full.dates[start:end + 1], full.closes[start:end + 1]))
+        assert_same_projection(state, full.closes[start:end + 1])
+        assert len(state) == window
+
+
+def test_append_and_replace_last():
+    full = hourly_series(400, seed=3)
+    state = IncrementalProjection(full.closes[:200], full.dates[:200])
+    for end in range(200, len(full)):
+        state.append(full.closes[end] - 1.0, full.dates[end])
+        assert_same_projection(state, np.append(full.closes[:end], full.closes[end] - 1.0), 13, 12)
+        state.replace_last(full.closes[end])
+        assert_same_projection(state, full.closes[:end + 1], 13, 12)
+    assert state.dates[-1] == full.dates[-1]
+
+
+def test_sync_rebuilds_when_the_history_was_adjusted():
+    full = hourly_series(500, seed=5)
+    state = IncrementalProjection()
+    state.sync(full)
+    # A split rescales every close, so the state no longer continues the series
+    adjusted = PriceSeries(full.dates, full.closes / 2)
+    state.sync(adjusted)
+    assert_same_projection(state, adjusted.closes)
+    # A series starting before the state's first bar is rebuilt as well
+    state.sync(full.tail(300))
+    state.sync(full)
+    assert_same_projection(state, full.closes)
+
+
+@pytest.mark.parametrize("future_points, num_lines", [(10, 5), (4, 8)])
+def test_incremental_projection_equals_project_closes(future_points, num_lines):
+    clear_states()
+    full = hourly_series(900, seed=9)
+    for end in range(700, len(full), 7):
+        series = PriceSeries(full.dates[end - 700:end], full.closes[end - 700:end])
+        match_indices, paths = incremental_projection("SYN", "1h", series, future_points, num_lines)
+        expected_indices, expected_paths = project_closes(series.closes, future_points, num_lines)
+        np.testing.assert_array_equal(match_indices, expected_indices)
+        np.testing.assert_array_equal(paths, expected_paths)
+    clear_states()
@@ -0,0 +1,61 @@
+from market_data import MarketData
+from synthetic_data import make_ohlc_frame
+
+
+class CountingLoader:
+    def __init__(self):
+        self.calls = []
+        self.frame = make_ohlc_frame(50, "1d", seed=1)
+
+    def __call__(self, symbol, interval, period=None):
+        self.calls.append(symbol)
+        return self.frame
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_last_bar_stamps_are_kept_until_a_history_changes():
+    loader, clock = CountingLoader(), FakeClock()
+    market_data = MarketData(loader=loader, clock=clock)
+    stamps = market_data.last_bar_stamps(["A", "B"], "1d")
+    assert stamps == (("A", str(loader.frame.index[-1])), ("B", str(loader.frame.index[-1])))
+
+    market_data.last_bar_stamps(["A", "B"], "1d")
+    market_data.history = None  # a memoized call must not read the histories again
+    assert market_data.last_bar_stamps(["A", "B"], "1d") == stamps
+    del market_data.history
+
+    # A refreshed history (e.g. from the precompute scheduler) may have a new last bar
+    loader.frame = make_ohlc_frame(51, "1d", seed=1)
+    market_data.refresh("A", "1d")
+    assert market_data.last_bar_stamps(["A", "B"], "1d")[0] == ("A", str(loader.frame.index[-1]))
+
+
+def test_last_bar_stamps_expire_after_one_bar():
+    loader, clock = CountingLoader(), FakeClock()
+    market_data = MarketData(loader=loader, clock=clock)
+    market_data.last_bar_stamps(["A"], "1h")
+    market_data.last_bar_stamps(["A"], "1h")
+    clock.now += 3600
+    market_data.last_bar_stamps(["A"], "1h")
+    assert loader.calls == ["A", "A"]
+
+
+def test_failed_loads_are_not_memoized():
+    clock = FakeClock()
+    attempts = []
+
+    def loader(symbol, interval, period=None):
+        attempts.append(symbol)
+        raise ConnectionError("provider unavailable")
+
+    market_data = MarketData(loader=loader, clock=clock)
+    assert market_data.last_bar_stamps(["A"], "1d") == (("A", None),)
+    market_data.last_bar_stamps(["A"], "1d")
+    assert attempts == ["A", "A"]
@@ -0,0 +1,125 @@
+import pandas as pd
+import pytest
+
+from ohlc_store import OHLCStore, _merge
+from synthetic_data import make_ohlc_frame
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class StandInProvider:
+    """Serves the first 'available' bars of a synthetic history and records every request."""
+
+    def __init__(self, bars=600):
+        self.full = make_ohlc_frame(bars, "1d", seed=7)
+        self.available = bars
+        self.calls = []
+        self.fail = False
+
+    def fetch(self, symbol, interval, period=None, start=None, auto_adjust=False):
+        self.calls.append({'period': period, 'start': start})
+        if self.fail:
+            raise ConnectionError("provider unavailable")
+        df = self.full.iloc[:self.available]
+        return df if start is None else df[df.index >= start]
+
+
+@pytest.fixture
+def provider():
+    return StandInProvider()
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def store(tmp_path, provider, clock):
+    return OHLCStore(str(tmp_path), fetch=provider.fetch, min_refresh=60, clock=clock)
+
+
+def test_first_read_fetches_the_full_period(store, provider):
+    provider.available = 500
+    df = store.history("SYN", "1d", period="max")
+
+    pd.testing.assert_frame_equal(df, provider.full.iloc[:500], check_freq=False)
+    assert provider.calls == [{'period': "max", 'start': None}]
+    assert store.read("SYN", "1d")[0] is not None
+
+
+def test_refresh_only_downloads_bars_from_the_last_stored_one(store, provider, clock):
+    provider.available = 500
+    store.history("SYN", "1d", period="max")
+    last_stored = provider.full.index[499]
+
+    provider.available = 510
+    clock.now += 61
+    df = store.history("SYN", "1d", period="max")
+
+    assert provider.calls[-1] == {'period': None, 'start': last_stored}
+    pd.testing.assert_frame_equal(df, provider.full.iloc[:510], check_freq=False)
+    # The merged history was written back, so a new store instance reads it from disk
+    assert len(OHLCStore(store.root, offline=True).history("SYN", "1d", period="max")) == 510
+
+
+def test_recent_fetch_is_served_without_a_request(store, provider, clock):
+    store.history("SYN", "1d", period="max")
+    clock.now += 30
+    store.history("SYN", "1d", period="max")
+
+    assert len(provider.calls) == 1
+
+
+def test_failed_refresh_serves_the_stored_copy(store, provider, clock):
+    provider.available = 500
+    store.history("SYN", "1d", period="max")
+    provider.fail = True
+    clock.now += 61
+
+    df = store.history("SYN", "1d", period="max")
+    assert len(df) == 500
+    assert len(provider.calls) == 2
+
+
+def test_failed_full_fetch_serves_the_shorter_stored_copy(store, provider, clock):
+    store.history("SYN", "1d", period="1y")
+    stored = store.read("SYN", "1d")[0]
+    provider.fail = True
+
+    # The stored copy does not reach back far enough for 'max', so a full history is requested
+    df = store.history("SYN", "1d", period="max")
+    assert provider.calls[-1] == {'period': "max", 'start': None}
+    pd.testing.assert_frame_equal(df, stored)
+
+
+def test_failed_first_fetch_raises(store, provider):
+    provider.fail = True
+    with pytest.raises(ConnectionError):
+        store.history("SYN", "1d", period="max")
+
+
+def test_merge_replaces_the_forming_bar():
+    full = make_ohlc_frame(20, "1d", seed=1)
+    stored = full.iloc[:10].copy()
+    stored.iloc[-1, stored.columns.get_loc("Close")] = -1.0  # still forming when it was stored
+    merged = _merge(stored, full.iloc[9:])
+
+    pd.testing.assert_frame_equal(merged, full, check_freq=False)
+    assert merged.index.is_unique and merged.index.is_monotonic_increasing
+
+
+def test_merge_keeps_one_timezone():
+    stored = make_ohlc_frame(10, "1d", seed=1, tz="UTC")
+    newer = make_ohlc_frame(3, "1d", seed=2, end="2025-01-03", tz="Asia/Tokyo")
+    merged = _merge(stored, newer)
+
+    assert str(merged.index.tz) == "Asia/Tokyo"
+    assert merged.index.dtype.kind == "M"
+    assert len(merged) == 13
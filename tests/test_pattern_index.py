@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+
+from pattern_index import PatternIndex
+from projection_engine import pattern_occurrences
+
+
+def random_sequence(length, seed, p_up=0.5):
+    return (np.random.default_rng(seed).random(length) < p_up).astype(np.uint8)
+
+
+@pytest.mark.parametrize("seed", range(4))
+@pytest.mark.parametrize("size", [1, 9, 257, 3000])
+def test_occurrences_match_the_scan(seed, size):
+    sequence = random_sequence(size, seed)
+    index = PatternIndex(sequence)
+    for length in range(1, 13):
+        np.testing.assert_array_equal(index.occurrences(length), pattern_occurrences(sequence, length))
+
+
+@pytest.mark.parametrize("sequence", [np.ones(500, dtype=np.uint8), np.tile([1, 0, 0], 200).astype(np.uint8),
+                                      random_sequence(2000, 11, p_up=0.9)])
+def test_occurrences_match_the_scan_on_repetitive_sequences(sequence):
+    # Long runs make large suffix array blocks, which the block search has to grow past
+    index = PatternIndex(sequence)
+    for length in (1, 6, 7, 8, 64, 65, 300):
+        np.testing.assert_array_equal(index.occurrences(length), pattern_occurrences(sequence, length))
+
+
+def test_occurrences_at_any_start():
+    sequence = random_sequence(400, 3)
+    index = PatternIndex(sequence)
+    for start in (0, 1, 57, 392):
+        for length in (6, 8):
+            window = sequence[start:start + length]
+            windows = np.lib.stride_tricks.sliding_window_view(sequence, length)
+            expected = np.flatnonzero((windows == window).all(axis=1))
+            np.testing.assert_array_equal(index.occurrences_at(start, length), expected)
+            np.testing.assert_array_equal(index.occurrences_at(start, length, min_position=start),
+                                          expected[expected >= start])
+            np.testing.assert_array_equal(index.find(window), expected)
+
+
+def test_from_closes_indexes_the_newest_first_sequence():
+    closes = 100 + np.cumsum(np.random.default_rng(5).integers(-2, 3, 800)).astype(np.float64)
+    rev_sequence = (closes[1:] >= closes[:-1]).astype(np.uint8)[::-1]
+    index = PatternIndex.from_closes(closes)
+    for length in (6, 7, 8):
+        np.testing.assert_array_equal(index.occurrences(length), pattern_occurrences(rev_sequence, length))
@@ -0,0 +1,18 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from precompute_scheduler import market_of, next_bar_close
+
+
+@pytest.mark.parametrize("symbol, market", [("^BSESN", "India"), ("^NSEI", "India"), ("RELIANCE.BO", "India"),
+                                            ("^N225", "Tokyo"), ("7203.T", "Tokyo"), ("BTC-USD", "Crypto"),
+                                            ("AAPL", "US")])
+def test_market_of(symbol, market):
+    assert market_of(symbol) == market
+
+
+def test_sensex_closes_on_the_india_session():
+    # 15:30 in Kolkata is 10:00 UTC
+    now = datetime(2026, 10, 13, 6, 0, tzinfo=timezone.utc)
+    assert next_bar_close("1d", now, market_of("^BSESN")) == datetime(2026, 10, 13, 10, 0, tzinfo=timezone.utc)
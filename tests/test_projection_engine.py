@@ -0,0 +1,68 @@
+import re
+
+import numpy as np
+import pytest
+
+from projection_engine import project_closes
+
+
+def legacy_projection(closes, future_points=10, num_lines=5):
+    """The regex matcher the app shipped with, on a plain list of oldest-first closes."""
+    result_string = ''.join('U' if closes[i] >= closes[i - 1] else 'D' for i in range(1, len(closes)))
+    rev_closes = closes[::-1]
+    result_string = result_string[::-1]
+
+    index_dict = {}
+    for iteration in range(8, 5, -1):
+        string_to_match = result_string[0:iteration]
+        matches = [match.start() for match in re.finditer(string_to_match, result_string)]
+        if len(matches) > 2:
+            for matched_index in matches[1:]:
+                if matched_index not in index_dict:
+                    index_dict[matched_index] = len(string_to_match)
+
+    match_indices, paths = [], []
+    for key in list(index_dict)[:num_lines]:
+        # Python's negative indexing wraps like the iloc lookups of print_difference_data
+        returns = [((rev_closes[count - 1] - rev_closes[count]) / rev_closes[count]) * 100 / 100
+                   for count in range(key, key - 13, -1)][:future_points]
+        prices = [rev_closes[0]]
+        for r in returns:
+            prices.append(prices[-1] * (1 + r))
+        match_indices.append(len(closes) - 1 - key)
+        paths.append(prices)
+    return match_indices, paths
+
+
+def stepped_closes(bars, seed):
+    """Closes on a whole-number grid, so equal consecutive closes (ties) are common."""
+    rng = np.random.default_rng(seed)
+    return (100 + np.cumsum(rng.integers(-2, 3, bars))).astype(np.float64)
+
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("bars", [12, 150, 1500])
+@pytest.mark.parametrize("future_points, num_lines", [(10, 5), (20, 3), (4, 12)])
+def test_matches_the_legacy_regex_matcher(seed, bars, future_points, num_lines):
+    closes = stepped_closes(bars, seed)
+    expected_indices, expected_paths = legacy_projection(closes.tolist(), future_points, num_lines)
+
+    match_indices, paths = project_closes(closes, future_points=future_points, num_lines=num_lines)
+
+    assert match_indices.tolist() == expected_indices
+    steps = min(future_points, 13)
+    np.testing.assert_array_equal(paths, np.array(expected_paths).reshape(len(expected_indices), steps + 1))
+
+
+@pytest.mark.parametrize("block", [[10.0, 10.0, 11.0, 11.0, 10.0], [10.0, 10.0, 11.0, 10.0, 10.0, 10.0, 11.0]])
+def test_equal_closes_and_overlapping_matches(block):
+    # Flat bars count as up moves; repeating blocks produce overlapping occurrences and
+    # positions found again by a shorter pattern length
+    closes = np.tile(block, 8)
+    expected_indices, expected_paths = legacy_projection(closes.tolist())
+
+    match_indices, paths = project_closes(closes)
+
+    assert expected_indices
+    assert match_indices.tolist() == expected_indices
+    np.testing.assert_array_equal(paths, np.array(expected_paths))
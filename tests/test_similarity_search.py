@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+
+from similarity_search import hamming_distances, pack_windows, return_distances, select_similar, \
+    similarity_distances
+
+
+def brute_force_hamming(sequence, length, start=0):
+    query = sequence[start:start + length]
+    return np.array([np.count_nonzero(sequence[p:p + length] != query)
+                     for p in range(len(sequence) - length + 1)])
+
+
+def brute_force_returns(returns, length, start=0):
+    query = returns[start:start + length]
+    norm = np.linalg.norm(query)
+    distances = [np.linalg.norm(returns[p:p + length] - query) for p in range(len(returns) - length + 1)]
+    if norm == 0:
+        return np.where(np.array(distances) > 0, np.inf, 0.0)
+    return np.array(distances) / norm
+
+
+@pytest.mark.parametrize("seed", range(3))
+@pytest.mark.parametrize("length", [1, 8, 13, 50, 63, 64, 65, 130])
+def test_hamming_distances_match_brute_force(seed, length):
+    sequence = (np.random.default_rng(seed).random(700) < 0.5).astype(np.uint8)
+    for start in (0, 5):
+        np.testing.assert_array_equal(hamming_distances(sequence, length, start),
+                                      brute_force_hamming(sequence, length, start))
+
+
+@pytest.mark.parametrize("length", [1, 64, 65, 200])
+def test_pack_windows_holds_each_window(length):
+    sequence = (np.random.default_rng(1).random(300) < 0.5).astype(np.uint8)
+    packed = pack_windows(sequence, length)
+    for p in (0, 1, len(sequence) - length):
+        bits = np.zeros(packed.shape[1] * 64, dtype=np.uint8)
+        bits[:length] = sequence[p:p + length]
+        expected = np.packbits(bits.reshape(-1, 64), axis=1, bitorder="little").view("<u8").ravel()
+        np.testing.assert_array_equal(packed[p], expected)
+
+
+@pytest.mark.parametrize("seed", range(3))
+@pytest.mark.parametrize("length", [1, 8, 20, 50])
+def test_return_distances_match_brute_force(seed, length):
+    returns = np.random.default_rng(seed).normal(0, 0.01, 600)
+    for start in (0, 7):
+        np.testing.assert_allclose(return_distances(returns, length, start),
+                                   brute_force_returns(returns, length, start), rtol=1e-7, atol=1e-7)
+
+
+def test_return_distances_of_a_flat_window():
+    returns = np.concatenate((np.zeros(10), np.random.default_rng(2).normal(0, 0.01, 50), np.zeros(10)))
+    np.testing.assert_array_equal(return_distances(returns, 5), brute_force_returns(returns, 5))
+
+
+def test_similarity_distances_use_the_newest_first_series():
+    closes = 100 + np.cumsum(np.random.default_rng(4).normal(0, 1, 400))
+    rev_closes = closes[::-1]
+    rev_sequence = (rev_closes[:-1] >= rev_closes[1:]).astype(np.uint8)
+    np.testing.assert_array_equal(similarity_distances(closes, 20, "hamming"),
+                                  brute_force_hamming(rev_sequence, 20) / 20)
+    np.testing.assert_allclose(similarity_distances(closes, 20, "returns"),
+                               brute_force_returns(rev_closes[:-1] / rev_closes[1:] - 1, 20), rtol=1e-7, atol=1e-7)
+    with pytest.raises(ValueError):
+        similarity_distances(closes, 20, "cosine")
+
+
+def test_select_similar_keeps_the_closest_non_overlapping_windows():
+    distances = np.array([0.0, 0.1, 0.1, 0.3, 0.05, 0.05, 0.2, 0.9, 0.05, 0.1, 0.0, 0.4])
+    # Positions 0 and 1 overlap the current pattern, 5 overlaps the more recent 4 and 9 overlaps 8
+    np.testing.assert_array_equal(select_similar(distances, 2, 0.2), [10, 4, 8, 2, 6])
@@ -1,55 +1,70 @@
 import streamlit as st
-import yfinance as yf
-import pandas as pd
 import numpy as np
 import plotly.graph_objects as go
-from datetime import datetime
-from data_utils import generate_future_projections_pattern
+from data_utils import generate_projection_series
+from market_data import get_history, bar_seconds, last_bar_stamps
+from batch_projections import project_basket
 from etf_config import ETF_CONFIG
+from instrumentation import instrumented
+from chart_utils import CHART_DECIMALS
 
+@instrumented("fetch_and_normalize")
 def fetch_and_normalize(stock, period="1y", interval="1d"):
     """
     Fetch historical data for a given stock and normalize its Close prices so that the first value is 1.
-    Returns a DataFrame and the initial price.
+    Returns the normalized closes (a NumPy array, oldest first) and the initial price; the
+    cached history is read without copying the frame.
     If no data is found, returns (None, None).
     """
-    ticker = yf.Ticker(stock)
-    df = ticker.history(period=period, interval=interval, auto_adjust=True)
-    df = df.sort_index()
+    df = get_history(stock, interval, period=period, auto_adjust=True)
     if df.empty or "Close" not in df.columns:
         return None, None
-    initial = df["Close"].iloc[0]
-    df["Normalized"] = df["Close"] / initial
-    df = df.reset_index()
-    return df, initial
-
-def plot_3d_predictions(stocks, period="1y", interval="1d", actual_points=10, pred_points=5, num_pred_lines=5):
+    if not df.index.is_monotonic_increasing:
+        df = df.sort_index()
+    closes = df["Close"].to_numpy(dtype=np.float64)
+    initial = closes[0]
+    return closes / initial, initial
+
+@instrumented("plot_3d_predictions")
+def plot_3d_predictions(stocks, period="1y", interval="1d", actual_points=10, pred_points=5, num_pred_lines=5,
+                        basket=None):
+    """
+    Builds the 3D chart for a list of {'id', 'label'} stocks. 'basket' may hold the results of
+    batch_projections.project_basket for these stocks; otherwise the whole basket is fetched and
+    projected in parallel here.
+    """
     if not isinstance(stocks, list):
         st.error("Invalid stock list. Expected a list of dictionaries with 'id' and 'label'.")
         return None
 
+    if basket is None:
+        basket, _ = project_basket([stock["id"] for stock in stocks], interval,
+                                   future_points=pred_points, num_lines=num_pred_lines)
+
     offsets = {stock["id"]: idx * 0.3 for idx, stock in enumerate(stocks)}
     default_colors = {"GOOG": "blue", "AAPL": "red", "NFLX": "green", "MSFT": "orange", "AMZN": "purple"}
     fig = go.Figure()
+    # Reference lines and labels of every stock, each drawn by a single trace
+    reference_x, reference_y, reference_z = [], [], []
+    label_points = []
 
     for stock_data in stocks:
         stock = stock_data["id"]
         label = stock_data["label"]
-        df, initial = fetch_and_normalize(stock, period, interval)
-        if df is None:
+        normalized, initial = fetch_and_normalize(stock, period, interval)
+        if normalized is None:
             st.warning(f"No data found for {stock} ({label}). Skipping.")
             continue
 
-        n = len(df)
+        n = len(normalized)
         if n < actual_points:
             st.warning(f"Not enough data for {stock} ({label}). Skipping.")
             continue
 
-        df_actual = df.iloc[-actual_points:]
         x_actual = np.arange(actual_points)
         y_offset = offsets.get(stock, 0)
         y_actual = np.full(actual_points, y_offset)
-        z_actual = df_actual["Normalized"].values * 2.5  # Exaggerate movement
+        z_actual = np.round(normalized[-actual_points:] * 2.5, CHART_DECIMALS)  # Exaggerate movement
 
         last_price = z_actual[-1]  # Get last actual price
 
@@ -63,48 +78,58 @@ def plot_3d_predictions(stocks, period="1y", interval="1d", actual_points=10, pr
             name=f"{label} Actual"
         ))
 
-        # Label at last actual point
-        fig.add_trace(go.Scatter3d(
-            x=[x_actual[-1]],
-            y=[y_actual[-1]],
-            z=[z_actual[-1]],
-            mode="text",
-            text=[label],
-            textposition="top center",
-            showlegend=False
-        ))
-
-        # Generate predictions
-        pred = generate_future_projections_pattern(stock, interval, future_points=pred_points, num_lines=num_pred_lines)
+        # Label at last actual point (all labels are drawn by one trace below)
+        label_points.append((x_actual[-1], y_actual[-1], z_actual[-1], label))
+
+        # Predictions come from the basket; symbols that failed there are projected here
+        if stock in basket:
+            pred = basket[stock]["projections"]
+        else:
+            pred = generate_projection_series(stock, interval, future_points=pred_points,
+                                              num_lines=num_pred_lines)
+        # All prediction lines of a stock are drawn as one trace, broken by NaN gaps
+        pred_x, pred_z = [], []
         for pred_line in pred:
-            pred_data = pred_line["data"]
-            z_pred = np.array([item["close"] for item in pred_data]) / initial * 2.5
+            z_pred = np.round(pred_line.closes / initial * 2.5, CHART_DECIMALS)
             L = len(z_pred)
-            x_pred = np.arange(actual_points - 1, actual_points - 1 + L)
-            y_pred = np.full(L, y_offset)
-
+            pred_x.extend([np.arange(actual_points - 1, actual_points - 1 + L), [np.nan]])
+            pred_z.extend([z_pred, [np.nan]])
+        if pred_x:
+            x_pred = np.concatenate(pred_x[:-1])
             fig.add_trace(go.Scatter3d(
                 x=x_pred,
-                y=y_pred,
-                z=z_pred,
+                y=np.full(len(x_pred), y_offset),
+                z=np.concatenate(pred_z[:-1]),
                 mode="lines",
                 line=dict(color=default_colors.get(stock, "gray"), width=4, dash="dot"),
                 showlegend=False
             ))
 
         # **Add Red Horizontal Line**
-        x_line = np.arange(actual_points - 1, actual_points - 1 + pred_points)
-        y_line = np.full(pred_points, y_offset)
-        z_line = np.full(pred_points, last_price)
+        reference_x.extend([np.arange(actual_points - 1, actual_points - 1 + pred_points), [np.nan]])
+        reference_y.extend([np.full(pred_points, y_offset), [np.nan]])
+        reference_z.extend([np.full(pred_points, last_price), [np.nan]])
 
+    if reference_x:
         fig.add_trace(go.Scatter3d(
-            x=x_line,
-            y=y_line,
-            z=z_line,
+            x=np.concatenate(reference_x[:-1]),
+            y=np.concatenate(reference_y[:-1]),
+            z=np.concatenate(reference_z[:-1]),
             mode="lines",
             line=dict(color="#bbbbbb", width=2),  # Light gray reference line
             showlegend=False  # Hides from legend
         ))
+    if label_points:
+        x_label, y_label, z_label, labels = zip(*label_points)
+        fig.add_trace(go.Scatter3d(
+            x=x_label,
+            y=y_label,
+            z=z_label,
+            mode="text",
+            text=labels,
+            textposition="top center",
+            showlegend=False
+        ))
 
     fig.update_layout(
         width=1000,
@@ -122,6 +147,19 @@ def plot_3d_predictions(stocks, period="1y", interval="1d", actual_points=10, pr
 
     return fig
 
+@st.cache_data(ttl=bar_seconds("1d"), show_spinner="Building 3D chart...")
+def cached_plot_3d_predictions(stocks, last_bars, period="1y", interval="1d", actual_points=10, pred_points=5,
+                               num_pred_lines=5):
+    """
+    plot_3d_predictions memoized across reruns, so revisiting the tab does not rebuild the
+    chart; 'last_bars' (see market_data.last_bar_stamps) only keys the memo, so a new bar
+    rebuilds it. Returns (fig, {stock: error message}).
+    """
+    basket, errors = project_basket([stock["id"] for stock in stocks], interval, future_points=pred_points,
+                                    num_lines=num_pred_lines)
+    fig = plot_3d_predictions(stocks, period, interval, actual_points, pred_points, num_pred_lines, basket=basket)
+    return fig, errors
+
 def render_3d_predictions_tab():
     st.header("3D Predictions Comparison")
     st.write("Below is the 3D prediction chart for the 1-day interval. For each stock, the last 10 periods of actual data (solid line) are shown, and predictions for the next 5 periods (dotted lines) are overlaid. Stocks are normalized so they all start at 1 and are separated by a small offset.")
@@ -136,7 +174,11 @@ def render_3d_predictions_tab():
     ]
     
     st.subheader("Interval: 1d")
-    fig = plot_3d_predictions(stocks, period="1y", interval="1d", actual_points=10, pred_points=5, num_pred_lines=5)
+    last_bars = last_bar_stamps([stock["id"] for stock in stocks], "1d")
+    fig, errors = cached_plot_3d_predictions(stocks, last_bars)
+    if any(error != "No data found" for error in errors.values()):
+        # Failed or timed-out fetches are retried on the next rerun
+        cached_plot_3d_predictions.clear(stocks, last_bars)
     st.plotly_chart(fig)
 
 if __name__ == "__main__":